@@ -1,68 +1,249 @@
-from machine import Pin, PWM
-from time import sleep
+from machine import Pin, PWM, Timer
+from time import sleep_ms, ticks_ms, ticks_diff
+from array import array
+import asyncio
+import math
+
+# ========================================
+# CURVAS PRECALCULADAS
+# ========================================
+
+# Cada curva es una tabla de TAM_TABLA + 1 puntos con el progreso de la
+# rampa escalado a 0-1024; se calculan una sola vez al importar
+TAM_TABLA = 64
+
+def _tabla(funcion):
+    return array('H', [int(funcion(i / TAM_TABLA) * 1024 + 0.5) for i in range(TAM_TABLA + 1)])
+
+CURVAS = {
+    "lineal": _tabla(lambda x: x),                        # Aceleración constante
+    "suave": _tabla(lambda x: math.sin(x * math.pi / 2)),  # Curva seno
+    "rapido": _tabla(math.sqrt),                          # Rápida al inicio, lenta al final
+}
+
+# ========================================
+# GESTOR DE CANALES PWM
+# ========================================
+
+class GestorPWM:
+    """
+    Dueño único de los pines PWM
+
+    Cada pin se configura una sola vez y se reutiliza; en los caminos
+    calientes sólo se cambia el duty. reservar() anota también los pines
+    usados para otra cosa (entradas, relés) para detectar choques al
+    arrancar. asignaciones cuenta los PWM creados: con el sistema andando
+    no debería crecer.
+    """
+
+    def __init__(self, freq=1000):
+        self.freq = freq
+        self._pwms = {}
+        self._usos = {}
+        self.asignaciones = 0
+        self.conflictos = []
+
+    def reservar(self, pin_numero, uso):
+        """Anotar el uso de un pin; retorna False (y avisa) si ya tenía otro"""
+        previo = self._usos.get(pin_numero)
+        if previo is not None and previo != uso:
+            self.conflictos.append((pin_numero, previo, uso))
+            print(f"⚠️ Pin {pin_numero} en conflicto: {previo} / {uso}")
+            return False
+        self._usos[pin_numero] = uso
+        return True
+
+    def verificar(self):
+        """Lanzar una excepción si al arrancar quedó algún pin en conflicto"""
+        if self.conflictos:
+            detalle = ", ".join(f"{pin} ({previo} / {uso})" for pin, previo, uso in self.conflictos)
+            raise Exception(f"Pines en conflicto: {detalle}")
+
+    def canal(self, pin_numero, uso="pwm", duty=0):
+        """PWM del pin; se crea (y cuenta) sólo la primera vez"""
+        pwm = self._pwms.get(pin_numero)
+        if pwm is None:
+            self.reservar(pin_numero, uso)
+            pwm = PWM(Pin(pin_numero))
+            pwm.freq(self.freq)
+            pwm.duty(duty)
+            self._pwms[pin_numero] = pwm
+            self.asignaciones += 1
+        return pwm
+
+    def apagar(self, pin_numero):
+        """Duty a 0 sin liberar el canal"""
+        pwm = self._pwms.get(pin_numero)
+        if pwm:
+            pwm.duty(0)
+
+    def liberar(self):
+        """Liberar todos los canales (sólo al terminar el programa)"""
+        for pwm in self._pwms.values():
+            pwm.deinit()
+        self._pwms.clear()
+
+    def reporte(self):
+        print(f"📊 PWM: {len(self._pwms)} canales, {self.asignaciones} asignaciones, "
+              f"{len(self.conflictos)} conflictos")
+
+# Gestor compartido por todo el programa
+gestor = GestorPWM()
+
+# ========================================
+# MOTOR DE RAMPAS NO BLOQUEANTE
+# ========================================
+
+class _Canal:
+    """Estado de un canal PWM dentro del motor de rampas"""
+
+    def __init__(self, pwm, duty):
+        self.pwm = pwm
+        self.duty = duty      # Duty aplicado realmente
+        self.origen = duty
+        self.destino = duty
+        self.inicio = 0
+        self.duracion = 0
+        self.tabla = CURVAS["lineal"]
+        self.activa = False
+
+class MotorRampas:
+    """
+    Rampas PWM para varios canales a la vez, sin bloquear
+
+    Cada canal recuerda su duty real, así una rampa nueva (o un cambio de
+    destino a mitad de camino) arranca desde donde está. paso() avanza todos
+    los canales; se llama desde una tarea asyncio (tarea()) o un Timer
+    (iniciar_timer()).
+    """
+
+    def __init__(self, gestor_pwm=None):
+        self.gestor = gestor_pwm or gestor
+        self._canales = {}
+
+    def canal(self, pin_numero):
+        """PWM del pin, pedido una sola vez al gestor"""
+        c = self._canales.get(pin_numero)
+        if c is None:
+            pwm = self.gestor.canal(pin_numero)
+            c = _Canal(pwm, pwm.duty())
+            self._canales[pin_numero] = c
+        return c.pwm
+
+    def adoptar(self, pwm_obj):
+        """Registrar un PWM creado fuera del motor; retorna su clave"""
+        for clave, c in self._canales.items():
+            if c.pwm is pwm_obj:
+                return clave
+        self._canales[pwm_obj] = _Canal(pwm_obj, pwm_obj.duty())
+        return pwm_obj
+
+    def duty(self, clave):
+        """Duty actual del canal"""
+        return self._canales[clave].duty
+
+    def en_rampa(self, clave):
+        return self._canales[clave].activa
+
+    def fijar(self, clave, duty):
+        """Aplicar un duty inmediatamente (cancela la rampa del canal)"""
+        if clave not in self._canales:
+            self.canal(clave)
+        c = self._canales[clave]
+        c.activa = False
+        c.destino = duty
+        if duty != c.duty:
+            c.pwm.duty(duty)
+            c.duty = duty
+
+    def rampa(self, clave, destino, tiempo_ms, tipo="lineal"):
+        """
+        Iniciar (o redirigir) una rampa desde el duty actual
+
+        Parámetros:
+        - clave: Número de pin (o PWM adoptado)
+        - destino: Duty final (0-1023)
+        - tiempo_ms: Duración de la rampa
+        - tipo: "lineal", "suave", "rapido"
+        """
+        if clave not in self._canales:
+            self.canal(clave)
+        c = self._canales[clave]
+        c.origen = c.duty
+        c.destino = destino
+        c.inicio = ticks_ms()
+        c.duracion = max(1, tiempo_ms)
+        c.tabla = CURVAS[tipo]
+        c.activa = True
+
+    def paso(self):
+        """Avanzar todas las rampas activas; retorna cuántas siguen activas"""
+        ahora = ticks_ms()
+        activas = 0
+        for c in self._canales.values():
+            if not c.activa:
+                continue
+            transcurrido = ticks_diff(ahora, c.inicio)
+            if transcurrido >= c.duracion:
+                duty = c.destino
+                c.activa = False
+            else:
+                indice = transcurrido * TAM_TABLA // c.duracion
+                duty = c.origen + ((c.destino - c.origen) * c.tabla[indice] >> 10)
+                activas += 1
+            if duty != c.duty:
+                c.pwm.duty(duty)
+                c.duty = duty
+        return activas
+
+    async def tarea(self, periodo_ms=20):
+        """Tarea asyncio que avanza las rampas"""
+        while True:
+            self.paso()
+            await asyncio.sleep_ms(periodo_ms)
+
+    def iniciar_timer(self, periodo_ms=20, timer_id=0):
+        """Avanzar las rampas desde un Timer periódico"""
+        self._timer = Timer(timer_id)
+        self._timer.init(period=periodo_ms, mode=Timer.PERIODIC, callback=lambda t: self.paso())
+        return self._timer
+
+    def esperar(self, clave, periodo_ms=20):
+        """Avanzar bloqueando hasta que termine la rampa del canal"""
+        while self.en_rampa(clave):
+            self.paso()
+            sleep_ms(periodo_ms)
+
+# Motor compartido por las funciones de compatibilidad
+rampas = MotorRampas()
+
+# ========================================
+# FUNCIONES DE COMPATIBILIDAD (BLOQUEANTES)
+# ========================================
 
 def acelerar_pwm(pin_numero, velocidad_inicial=0, velocidad_final=1023, tiempo_total=2.0, tipo="lineal"):
     """
     Acelera PWM gradualmente desde velocidad inicial hasta final
-    
+
     Parámetros:
     - pin_numero: Número del pin GPIO
     - velocidad_inicial: Valor PWM inicial (0-1023)
-    - velocidad_final: Valor PWM final (0-1023)  
+    - velocidad_final: Valor PWM final (0-1023)
     - tiempo_total: Tiempo total de aceleración en segundos
     - tipo: "lineal", "suave", "rapido"
-    
-    Retorna: Objeto PWM configurado al valor final
+
+    Retorna: Objeto PWM configurado al valor final (siempre el mismo por pin)
+
+    Para no bloquear usar rampas.rampa() con rampas.tarea() o un Timer.
     """
-    
-    # Crear objeto PWM
-    pwm = PWM(Pin(pin_numero))
-    pwm.freq(1000)  # Frecuencia 1kHz
-    
-    # Calcular pasos
-    diferencia = velocidad_final - velocidad_inicial
-    pasos = 50  # Número de pasos para suavidad
-    incremento = diferencia / pasos
-    delay = tiempo_total / pasos
-    
-    print(f"🚀 Acelerando PWM Pin {pin_numero}")
-    print(f"   {velocidad_inicial} → {velocidad_final} en {tiempo_total}s")
-    
-    # Establecer velocidad inicial
-    pwm.duty(velocidad_inicial)
-    
-    # Acelerar gradualmente
-    for paso in range(pasos + 1):
-        if tipo == "lineal":
-            # Aceleración lineal constante
-            valor = velocidad_inicial + (incremento * paso)
-            
-        elif tipo == "suave":
-            # Aceleración suave (curva seno)
-            import math
-            progreso = paso / pasos
-            factor_suave = math.sin(progreso * math.pi / 2)
-            valor = velocidad_inicial + (diferencia * factor_suave)
-            
-        elif tipo == "rapido":
-            # Aceleración rápida al inicio, lenta al final
-            import math
-            progreso = paso / pasos
-            factor_rapido = math.sqrt(progreso)
-            valor = velocidad_inicial + (diferencia * factor_rapido)
-        
-        # Aplicar valor PWM
-        pwm.duty(int(valor))
-        
-        # Mostrar progreso cada 10 pasos
-        if paso % 10 == 0:
-            porcentaje = (paso / pasos) * 100
-            print(f"   {porcentaje:3.0f}% - PWM: {int(valor)}")
-        
-        sleep(delay)
-    
+    print(f"🚀 Acelerando PWM Pin {pin_numero}: {velocidad_inicial} → {velocidad_final} en {tiempo_total}s")
+
+    rampas.fijar(pin_numero, velocidad_inicial)
+    rampas.rampa(pin_numero, velocidad_final, int(tiempo_total * 1000), tipo)
+    rampas.esperar(pin_numero)
+
     print(f"✅ Aceleración completada - PWM: {velocidad_final}")
-    return pwm
+    return rampas.canal(pin_numero)
 
 # ========================================
 # FUNCIÓN DE DESACELERACIÓN
@@ -71,36 +252,20 @@ def acelerar_pwm(pin_numero, velocidad_inicial=0, velocidad_final=1023, tiempo_t
 def desacelerar_pwm(pwm_obj, velocidad_final=0, tiempo_total=1.0):
     """
     Desacelera PWM gradualmente hasta velocidad final
-    
+
     Parámetros:
     - pwm_obj: Objeto PWM ya creado
     - velocidad_final: Valor PWM final (generalmente 0)
     - tiempo_total: Tiempo de desaceleración
-    
+
     Retorna: Valor final aplicado
     """
-    
-    # Obtener velocidad actual (aproximada)
-    velocidad_actual = 1023  # Asumir máxima si no se puede leer
-    
-    diferencia = velocidad_actual - velocidad_final
-    pasos = 30
-    incremento = diferencia / pasos
-    delay = tiempo_total / pasos
-    
-    print(f"🛑 Desacelerando PWM")
-    print(f"   {velocidad_actual} → {velocidad_final} en {tiempo_total}s")
-    
-    # Desacelerar gradualmente
-    for paso in range(pasos + 1):
-        valor = velocidad_actual - (incremento * paso)
-        pwm_obj.duty(int(valor))
-        
-        if paso % 10 == 0:
-            porcentaje = (paso / pasos) * 100
-            print(f"   {porcentaje:3.0f}% - PWM: {int(valor)}")
-        
-        sleep(delay)
-    
+    # Parte del duty real del canal (antes se asumía 1023)
+    clave = rampas.adoptar(pwm_obj)
+    print(f"🛑 Desacelerando PWM: {rampas.duty(clave)} → {velocidad_final} en {tiempo_total}s")
+
+    rampas.rampa(clave, velocidad_final, int(tiempo_total * 1000))
+    rampas.esperar(clave)
+
     print(f"✅ Desaceleración completada - PWM: {velocidad_final}")
     return velocidad_final
@@ -0,0 +1,245 @@
+# ========================================
+# ACUSES DE RECIBO Y RETRANSMISIÓN
+# ========================================
+#
+# El +OK del módulo LoRa sólo dice que la trama salió por la antena. Para
+# saber que llegó, el receptor contesta cada trama con una trama CMD_ACK
+# que lleva el mismo número de secuencia:
+#
+#   transmisor                       receptor
+#   AT+SEND seq=7 ─────────────────▶ procesar (si seq 7 es nueva)
+#              ◀───────────────── ACK seq=7 (siempre, también duplicados)
+#
+# Si el acuse no llega dentro del RTO se retransmite con el mismo número;
+# el receptor reconoce el duplicado, lo vuelve a acusar y no lo procesa
+# (un POWER retransmitido no alterna dos veces). El RTO sale del RTT
+# medido (Jacobson/Karels, en ms enteros) y sólo se mide con tramas que
+# no se retransmitieron (Karn).
+#
+# Al reiniciarse el transmisor la secuencia no vuelve a 0 sino a un valor
+# al azar, y el receptor olvida el último número de un origen pasado
+# VIGENCIA_MS: así el primer comando después de un reinicio no se toma por
+# una retransmisión del último de antes.
+
+if __name__ == "__main__":
+    try:
+        import simulacion   # Host: machine y time simulados
+        simulacion.instalar()
+    except ImportError:
+        pass
+
+from array import array
+from time import ticks_ms, ticks_diff, ticks_add, sleep_ms
+import asyncio
+import urandom
+
+from metricas import Latencias
+
+class Acuses:
+    """
+    Lado del transmisor: secuencia, espera del acuse y RTO adaptativo
+
+    Parámetros:
+    - rto_inicial_ms: RTO antes de la primera medición (SF12 tarda ~0.9 s
+      en cada sentido)
+    - rto_min_ms, rto_max_ms: Límites del RTO
+    - intentos: Transmisiones por trama antes de darla por perdida
+    - seq_inicial: Primer número de secuencia (None = al azar)
+    """
+
+    # Margen mínimo sobre el SRTT: con un RTT muy estable RTTVAR tiende a 0
+    # y el acuse llegaría justo al vencer el RTO
+    MARGEN_MS = 50
+
+    def __init__(self, rto_inicial_ms=3000, rto_min_ms=200, rto_max_ms=10000, intentos=4,
+                 seq_inicial=None):
+        self.rto_min_ms = rto_min_ms
+        self.rto_max_ms = rto_max_ms
+        self.intentos = intentos
+
+        # Al azar: tras un reinicio no repite el último número de antes
+        self.seq = urandom.getrandbits(8) if seq_inicial is None else seq_inicial
+        self._esperado = -1
+        self.confirmado = False
+
+        # Estimador de RTT (ms); srtt = 0 hasta la primera muestra
+        self.srtt_ms = 0
+        self.rttvar_ms = 0
+        self.rto_ms = rto_inicial_ms
+        self._rtt_ms = 0            # Espera del último acuse
+
+        # Estadísticas
+        self.entregados = 0
+        self.sin_acuse = 0
+        self.retransmisiones = 0
+        self.tardios = 0            # Acuses que no eran de la trama en vuelo
+        self.rtt = Latencias()      # ms desde el +OK hasta el acuse
+
+    def nueva(self):
+        """Número de secuencia para una trama nueva (queda en espera de acuse)"""
+        seq = self.seq
+        self.seq = (seq + 1) & 0xFF
+        self._esperado = seq
+        self.confirmado = False
+        return seq
+
+    def confirmar(self, seq):
+        """Llamar al recibir un CMD_ACK; True si era el de la trama en vuelo"""
+        if seq != self._esperado or self.confirmado:
+            self.tardios += 1
+            return False
+        self.confirmado = True
+        return True
+
+    def medir(self, rtt_ms):
+        """Sumar una muestra de RTT y recalcular el RTO"""
+        if not self.srtt_ms:
+            self.srtt_ms = rtt_ms
+            self.rttvar_ms = rtt_ms // 2
+        else:
+            self.rttvar_ms += (abs(self.srtt_ms - rtt_ms) - self.rttvar_ms) // 4
+            self.srtt_ms += (rtt_ms - self.srtt_ms) // 8
+        self.rtt.registrar(rtt_ms)
+        self._calcular_rto()
+
+    def _calcular_rto(self):
+        """RTO = SRTT + max(MARGEN_MS, 4·RTTVAR), dentro de los límites"""
+        rto = self.srtt_ms + max(self.MARGEN_MS, 4 * self.rttvar_ms)
+        self.rto_ms = max(self.rto_min_ms, min(self.rto_max_ms, rto))
+
+    def reiniciar(self, rto_ms):
+        """Olvidar el RTT medido (cambiaron los parámetros de radio)"""
+        self.srtt_ms = 0
+        self.rttvar_ms = 0
+        self.rto_ms = max(self.rto_min_ms, min(self.rto_max_ms, rto_ms))
+
+    def retroceder(self):
+        """Sin acuse: duplicar el RTO (hasta el máximo) antes de retransmitir"""
+        self.retransmisiones += 1
+        self.rto_ms = min(self.rto_ms * 2, self.rto_max_ms)
+
+    async def esperar(self, parser_at):
+        """
+        Esperar el acuse de la trama en vuelo hasta un RTO; True si llegó
+
+        El acuse llega como +RCV: se alimenta el parser AT mientras tanto,
+        igual que comando_async() espera el +OK.
+        """
+        inicio = ticks_ms()
+        limite = ticks_add(inicio, self.rto_ms)
+        while not self.confirmado and ticks_diff(limite, ticks_ms()) > 0:
+            parser_at.alimentar()
+            if not self.confirmado:
+                await asyncio.sleep_ms(1)
+        return self._resultado(inicio)
+
+    def esperar_bloqueante(self, parser_at):
+        """Igual que esperar(), sin asyncio"""
+        inicio = ticks_ms()
+        limite = ticks_add(inicio, self.rto_ms)
+        while not self.confirmado and ticks_diff(limite, ticks_ms()) > 0:
+            parser_at.alimentar()
+            if not self.confirmado:
+                sleep_ms(1)
+        return self._resultado(inicio)
+
+    def _resultado(self, inicio):
+        self._rtt_ms = ticks_diff(ticks_ms(), inicio)
+        return self.confirmado
+
+    def entregada(self, intento):
+        """
+        Registrar una trama acusada
+
+        El RTT sólo se mide si no hubo retransmisión (no se sabe a cuál
+        respondió el acuse). Igual se descarta el retroceso: el enlace
+        volvió a funcionar y la trama siguiente no debe esperar un RTO
+        inflado por las pérdidas de ésta.
+        """
+        self.entregados += 1
+        if intento == 0:
+            self.medir(self._rtt_ms)
+        elif self.srtt_ms:
+            self._calcular_rto()
+
+    def tasa(self):
+        """Porcentaje de tramas acusadas sobre las terminadas"""
+        total = self.entregados + self.sin_acuse
+        return (self.entregados / total * 100) if total > 0 else 0
+
+    def mostrar(self):
+        """Entrega de punta a punta, retransmisiones y estado del RTO"""
+        p50, p90, p99 = self.rtt.percentiles()
+        print(f"   Entregados (con acuse): {self.entregados} | Sin acuse: {self.sin_acuse} | Tasa: {self.tasa():.1f}%")
+        print(f"   Retransmisiones: {self.retransmisiones} | Acuses tardíos: {self.tardios}")
+        print(f"   RTT: p50={p50} ms p99={p99} ms | SRTT={self.srtt_ms} ms RTO={self.rto_ms} ms")
+
+class FiltroDuplicados:
+    """
+    Lado del receptor: última secuencia procesada de cada origen
+
+    Con un solo comando en vuelo por transmisor alcanza con recordar el
+    último número: una retransmisión repite ese número. El número vence a
+    los vigencia_ms sin tramas de ese origen; tiene que superar la ventana
+    de retransmisión del transmisor (intentos con el RTO duplicándose hasta
+    rto_max_ms: 3 + 6 + 10 + 10 s en el peor caso).
+    """
+
+    VIGENCIA_MS = 30000
+
+    def __init__(self, capacidad=4, vigencia_ms=VIGENCIA_MS):
+        self.vigencia_ms = vigencia_ms
+        self._origenes = array('l', [-1] * capacidad)
+        self._ultimos = array('h', [-1] * capacidad)
+        self._marcas = array('L', [0] * capacidad)
+        self.duplicados = 0
+        self.vencidos = 0   # Mismo número pero pasada la vigencia: trama nueva
+
+    def nueva(self, origen, seq):
+        """True si la trama no se procesó antes (y la anota)"""
+        origenes = self._origenes
+        ahora = ticks_ms()
+        libre = -1
+        for i in range(len(origenes)):
+            if origenes[i] == origen:
+                vigente = ticks_diff(ahora, self._marcas[i]) < self.vigencia_ms
+                self._marcas[i] = ahora
+                if self._ultimos[i] == seq:
+                    if vigente:
+                        self.duplicados += 1
+                        return False
+                    self.vencidos += 1
+                self._ultimos[i] = seq
+                return True
+            if origenes[i] < 0 and libre < 0:
+                libre = i
+        # Origen nuevo (si no hay lugar se reemplaza el primero)
+        i = libre if libre >= 0 else 0
+        origenes[i] = origen
+        self._ultimos[i] = seq
+        self._marcas[i] = ahora
+        return True
+
+# Prueba en el host: python acuses.py
+if __name__ == "__main__":
+    filtro = FiltroDuplicados()
+    tx = Acuses(seq_inicial=250)
+
+    # Retransmisiones dentro de la ventana: se acusan pero no se procesan
+    for _ in range(10):
+        seq = tx.nueva()
+        assert filtro.nueva(1, seq)
+        sleep_ms(3000)
+        assert not filtro.nueva(1, seq)
+    print(f"✅ 10 tramas, {filtro.duplicados} retransmisiones descartadas (seq final {seq})")
+
+    # Reinicio del transmisor: la secuencia arranca al azar, no en 0
+    reiniciado = Acuses()
+    print(f"   tras el reinicio seq={reiniciado.seq} (antes del reinicio: {seq})")
+
+    # Peor caso: arranca justo en el último número. Dentro de la vigencia
+    # se toma por retransmisión; pasada, es una trama nueva
+    assert not filtro.nueva(1, seq)
+    sleep_ms(FiltroDuplicados.VIGENCIA_MS)
+    assert filtro.nueva(1, seq) and filtro.vencidos == 1
+    print(f"✅ Mismo número pasados {FiltroDuplicados.VIGENCIA_MS} ms: trama nueva")
@@ -1,10 +1,176 @@
-from machine import Pin, PWM
+from machine import Pin, Timer
+from array import array
+import asyncio
 import time
+from PWM import gestor
 
 # Configurar el pin 27 para el buzzer
 buzzer_pin = Pin(27, Pin.OUT)
 led_pin=Pin(14, Pin.OUT)
-buzzer_pwm = PWM(buzzer_pin)
+buzzer_pwm = gestor.canal(27, "buzzer")
+
+# ========================================
+# SECUENCIAS PRECOMPILADAS
+# ========================================
+
+# Cada paso es un entero (frecuencia << 16) | duración_ms; frecuencia 0 es
+# silencio. Se arman una sola vez al importar.
+
+def compilar(notas, duraciones, pausa_ms=0):
+    """
+    Empaquetar notas en un array
+
+    Parámetros:
+    - notas: Frecuencias en Hz (0 = silencio)
+    - duraciones: Segundos por nota (o uno solo para todas)
+    - pausa_ms: Silencio después de cada nota
+    """
+    pasos = []
+    for i, nota in enumerate(notas):
+        d = duraciones[i] if isinstance(duraciones, (list, tuple)) else duraciones
+        pasos.append(nota << 16 | int(d * 1000))
+        if pausa_ms:
+            pasos.append(pausa_ms)
+    return array('L', pasos)
+
+# Frecuencias de notas musicales (Do, Re, Mi, Fa, Sol, La, Si, Do)
+MELODIA = compilar([262, 294, 330, 349, 392, 440, 494, 523], 0.3, pausa_ms=50)
+
+MARIO = compilar(
+    [659, 659, 0, 659, 0, 523, 659, 0, 784,
+     392, 0, 523, 0, 392, 0, 330, 0, 440,
+     0, 494, 0, 466, 440, 0, 392, 659, 784, 880],
+    [0.15, 0.15, 0.15, 0.15, 0.15, 0.15, 0.15, 0.15, 0.3,
+     0.3, 0.15, 0.3, 0.15, 0.3, 0.15, 0.3, 0.15, 0.3,
+     0.15, 0.3, 0.15, 0.15, 0.3, 0.15, 0.3, 0.15, 0.15, 0.15],
+    pausa_ms=50)
+
+ALARMA = compilar([2000, 1000] * 10, 0.15)
+
+# Prioridades: una secuencia sólo interrumpe a otra de prioridad menor o igual
+PRIORIDAD_MELODIA = 0
+PRIORIDAD_AVISO = 1
+PRIORIDAD_ALARMA = 2
+
+# ========================================
+# REPRODUCTOR EN SEGUNDO PLANO
+# ========================================
+
+class Reproductor:
+    """
+    Toca secuencias sin bloquear
+
+    paso() avanza la secuencia cuando vence la nota actual; se llama desde
+    el planificador, desde tarea() (asyncio) o desde un Timer de un disparo
+    por nota (usar_timer()).
+    """
+
+    def __init__(self, pwm, duty=512):
+        self.pwm = pwm
+        self.duty = duty
+        self.secuencia = None
+        self.prioridad = -1
+        self._indice = 0
+        self._repeticiones = 0
+        self._fin_nota = 0
+        self._timer = None
+        self._cb = self._al_vencer  # Bound method creado una sola vez
+
+        self.interrumpidas = 0
+        self.rechazadas = 0
+
+    def tocar(self, secuencia, prioridad=PRIORIDAD_MELODIA, repeticiones=1):
+        """
+        Empezar una secuencia
+
+        Retorna False si suena otra de mayor prioridad. repeticiones=0 la
+        repite hasta detener().
+        """
+        if self.secuencia is not None:
+            if prioridad < self.prioridad:
+                self.rechazadas += 1
+                return False
+            self.interrumpidas += 1
+        self.secuencia = secuencia
+        self.prioridad = prioridad
+        self._repeticiones = repeticiones
+        self._indice = 0
+        self._siguiente(time.ticks_ms())
+        return True
+
+    def detener(self, prioridad=PRIORIDAD_ALARMA):
+        """Cortar la secuencia actual si su prioridad no supera la dada"""
+        if self.secuencia is not None and self.prioridad <= prioridad:
+            self._terminar()
+
+    def sonando(self):
+        return self.secuencia is not None
+
+    def _terminar(self):
+        self.pwm.duty(0)
+        self.secuencia = None
+        self.prioridad = -1
+        if self._timer:
+            self._timer.deinit()
+
+    def _siguiente(self, ahora):
+        """Pasar a la nota actual (o terminar)"""
+        if self._indice >= len(self.secuencia):
+            self._repeticiones -= 1
+            if self._repeticiones == 0:
+                self._terminar()
+                return
+            self._indice = 0
+        paso = self.secuencia[self._indice]
+        self._indice += 1
+
+        frecuencia = paso >> 16
+        duracion = paso & 0xFFFF
+        if frecuencia:
+            self.pwm.freq(frecuencia)
+            self.pwm.duty(self.duty)
+        else:
+            self.pwm.duty(0)
+        self._fin_nota = time.ticks_add(ahora, duracion)
+        if self._timer:
+            self._timer.init(period=max(1, duracion), mode=Timer.ONE_SHOT, callback=self._cb)
+
+    def paso(self):
+        """Avanzar si venció la nota; retorna True mientras suena"""
+        if self.secuencia is None:
+            return False
+        ahora = time.ticks_ms()
+        if time.ticks_diff(ahora, self._fin_nota) >= 0:
+            self._siguiente(ahora)
+        return self.secuencia is not None
+
+    def _al_vencer(self, _timer):
+        if self.secuencia is not None:
+            self._siguiente(time.ticks_ms())
+
+    def usar_timer(self, timer_id=2):
+        """Avanzar con un Timer de un disparo por nota, sin sondeo"""
+        self._timer = Timer(timer_id)
+
+    async def tarea(self, periodo_max_ms=20):
+        """Avanzar desde asyncio; duerme hasta la próxima nota"""
+        while True:
+            if self.paso():
+                restante = time.ticks_diff(self._fin_nota, time.ticks_ms())
+                await asyncio.sleep_ms(max(1, min(restante, periodo_max_ms)))
+            else:
+                await asyncio.sleep_ms(periodo_max_ms)
+
+    def esperar(self):
+        """Bloquear hasta que termine (compatibilidad con las funciones viejas)"""
+        while self.paso():
+            time.sleep_ms(max(1, time.ticks_diff(self._fin_nota, time.ticks_ms())))
+
+reproductor = Reproductor(buzzer_pwm)
+
+# ========================================
+# FUNCIONES (BLOQUEANTES)
+# ========================================
 
 def beep_simple(duration=0.5):
     """Sonido simple encendido/apagado"""
@@ -30,38 +196,22 @@ def play_note(frequency, duration):
 
 def play_melody():
     """Tocar una melodía simple"""
-    # Frecuencias de notas musicales (Do, Re, Mi, Fa, Sol, La, Si, Do)
-    melody = [262, 294, 330, 349, 392, 440, 494, 523]
-    
     print("Tocando melodía...")
-    for note in melody:
-        play_note(note, 0.3)
+    reproductor.tocar(MELODIA)
+    reproductor.esperar()
 
 def play_mario_theme():
     """Tema clásico de Mario Bros (fragmento)"""
-    mario_notes = [
-        659, 659, 0, 659, 0, 523, 659, 0, 784,
-        392, 0, 523, 0, 392, 0, 330, 0, 440,
-        0, 494, 0, 466, 440, 0, 392, 659, 784, 880
-    ]
-    
-    mario_durations = [
-        0.15, 0.15, 0.15, 0.15, 0.15, 0.15, 0.15, 0.15, 0.3,
-        0.3, 0.15, 0.3, 0.15, 0.3, 0.15, 0.3, 0.15, 0.3,
-        0.15, 0.3, 0.15, 0.15, 0.3, 0.15, 0.3, 0.15, 0.15, 0.15
-    ]
-    
     print("Tocando tema de Mario...")
-    for i in range(len(mario_notes)):
-        play_note(mario_notes[i], mario_durations[i])
+    reproductor.tocar(MARIO)
+    reproductor.esperar()
 
 def alarm():
     """Sonido de alarma alternante"""
     print("¡ALARMA!")
-    for i in range(10):
-        beep_tone(2000, 0.15)
-        beep_tone(1000, 0.15)
-        
+    reproductor.tocar(ALARMA, PRIORIDAD_ALARMA)
+    reproductor.esperar()
+
 def buzz_on():
     """Encender buzzer continuo"""
     buzzer_pin.on()
@@ -73,6 +223,7 @@ def buzz_off():
 
 def cleanup():
     """Limpiar y apagar buzzer"""
+    reproductor.detener()
     buzzer_pwm.duty(0)
     buzzer_pin.off()
     print("Buzzer apagado")
@@ -90,4 +241,3 @@ if __name__ == "__main__":
         print("\nInterrumpido por el usuario")
     finally:
         cleanup()
-
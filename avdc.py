@@ -1,33 +1,144 @@
 from machine import ADC, Pin
+from array import array
+import asyncio
 import time
- 
+from banco_reles import BancoReles
+from calibracion_adc import CalibracionADC, medir_cuentas
+
 # === CONFIGURACIÓN ADC (GPIO34) ===
 adc = ADC(Pin(34))
 adc.atten(ADC.ATTN_11DB)         # Para leer hasta ~3.6V
 adc.width(ADC.WIDTH_12BIT)      # Resolución 12 bits (0-4095)
- 
+
 # === CONFIGURACIÓN DEL RELÉ ===
 # IN5 del módulo de 8 relés conectado al GPIO26 del ESP32
-rele = Pin(26, Pin.OUT)
-rele.value(1)  # Inicialmente desactivado (relé OFF si se activa con LOW)
- 
+# Activo en LOW: el banco lo deja desactivado (HIGH) al crearlo
+banco = BancoReles(((26, True),))
+RELE_PANEL = 0
+
 # === CONFIGURACIÓN DEL DIVISOR DE VOLTAJE ===
-# R1 = 68kΩ, R2 = 20kΩ → factor = (R1 + R2)/R2 = 4
-factor = 4.7
- 
+# R1 = 68kΩ, R2 = 20kΩ → factor nominal = (R1 + R2)/R2 = 4.4. El ADC del
+# ESP32 no es lineal cerca de los extremos: la conversión usa la tabla de
+# calibración guardada en flash (por defecto, el factor 4.7 que se usaba).
+calibracion = CalibracionADC.cargar()
+
+# === MUESTREO FILTRADO ===
+class MuestreadorADC:
+    """
+    Ráfagas de lecturas con mediana, media móvil e histéresis
+
+    Cada paso() lee una ráfaga en un array('H') fijo, toma la mediana
+    (descarta picos) y la promedia con las últimas medianas. El relé se
+    activa por encima de umbral_alto_mv y se desactiva por debajo de
+    umbral_bajo_mv, así no vibra alrededor de un único umbral. valor y
+    milivoltios quedan publicados como enteros (sin crear objetos).
+    """
+
+    def __init__(self, adc, banco, rele, calibracion, muestras=15, ventana=8,
+                 umbral_alto_mv=3600, umbral_bajo_mv=3400):
+        """
+        Parámetros:
+        - adc: ADC ya configurado (12 bits)
+        - banco, rele: Banco de relés y el índice del relé a controlar
+        - calibracion: CalibracionADC para pasar cuentas a mV
+        - muestras: Lecturas por ráfaga (impar, para la mediana)
+        - ventana: Medianas en la media móvil
+        - umbral_alto_mv/umbral_bajo_mv: Histéresis del relé
+        """
+        self.adc = adc
+        self.banco = banco
+        self.rele = rele
+        self.convertir = calibracion.convertir
+        self.umbral_alto_mv = umbral_alto_mv
+        self.umbral_bajo_mv = umbral_bajo_mv
+
+        self._rafaga = array('H', [0] * muestras)
+        self._ventana = array('H', [0] * ventana)
+        self._pos = 0
+        self._llenas = 0
+        self._suma = 0
+
+        # Último valor publicado
+        self.valor = 0          # Cuentas filtradas (0-4095)
+        self.milivoltios = 0    # Tensión del panel
+        self.activo = False
+        self.conmutaciones = 0
+
+    def _mediana(self):
+        """Leer una ráfaga y ordenarla en su lugar (inserción); retorna la mediana"""
+        buf = self._rafaga
+        leer = self.adc.read
+        n = len(buf)
+        for i in range(n):
+            buf[i] = leer()
+        for i in range(1, n):
+            x = buf[i]
+            j = i - 1
+            while j >= 0 and buf[j] > x:
+                buf[j + 1] = buf[j]
+                j -= 1
+            buf[j + 1] = x
+        return buf[n >> 1]
+
+    def paso(self):
+        """Una ráfaga: filtrar, publicar y aplicar la histéresis; retorna mV"""
+        mediana = self._mediana()
+        ventana = self._ventana
+        self._suma += mediana - ventana[self._pos]
+        ventana[self._pos] = mediana
+        self._pos = (self._pos + 1) % len(ventana)
+        if self._llenas < len(ventana):
+            self._llenas += 1
+
+        self.valor = self._suma // self._llenas
+        mv = self.convertir(self.valor)
+        self.milivoltios = mv
+
+        if not self.activo and mv > self.umbral_alto_mv:
+            self.activo = True
+        elif self.activo and mv < self.umbral_bajo_mv:
+            self.activo = False
+        else:
+            return mv
+        self.conmutaciones += 1
+        print(f"🔋 Panel {mv} mV: relé {'ACTIVADO' if self.activo else 'DESACTIVADO'}")
+        self.banco.poner(self.rele, self.activo)
+        self.banco.aplicar()
+        return mv
+
+    async def tarea(self, periodo_ms=100):
+        """Muestrear periódicamente sin bloquear"""
+        while True:
+            self.paso()
+            await asyncio.sleep_ms(periodo_ms)
+
+panel = MuestreadorADC(adc, banco, RELE_PANEL, calibracion)
+
+# === LECTURA (sin pausa, para el planificador) ===
+def leer_panel():
+    """Una ráfaga filtrada; retorna el voltaje en mV"""
+    return panel.paso()
+
+# === CALIBRACIÓN ===
+def calibrar(mv_medido):
+    """
+    Agregar un punto: medir el panel con el multímetro y pasar los mV
+
+    Con un punto la conversión es una recta desde 0 V; con dos (uno bajo y
+    uno alto) ya es la recta ajustada a la placa, offset incluido, y más
+    puntos corrigen los extremos.
+    """
+    cuentas = medir_cuentas(adc)
+    calibracion.agregar_punto(cuentas, mv_medido)
+    calibracion.guardar()
+    print(f"✅ Punto de calibración: {cuentas} cuentas = {mv_medido} mV")
+
 # === BUCLE PRINCIPAL ===
 def Adc():
-    valor_adc = adc.read()
-    voltaje_adc = valor_adc * (3.3 / 4095)
-    voltaje_real = voltaje_adc * factor
- 
-    print("Voltaje real:", round(voltaje_real, 2), "V")
- 
-    if voltaje_real > 3.5:
-        rele.value(0)  # ACTIVAR relé (LOW)
-    else:
-        rele.value(1)  # DESACTIVAR relé (HIGH)
- 
+    mv = leer_panel()
+    print("Voltaje real:", mv / 1000, "V")
     time.sleep(0.5)
-while True:
-    Adc()
\ No newline at end of file
+
+if __name__ == "__main__":
+    while True:
+        Adc()
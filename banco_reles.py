@@ -0,0 +1,290 @@
+# ========================================
+# BANCO DE RELÉS CON ESCRITURA POR LOTES
+# ========================================
+#
+# Todos los relés de un módulo en una sola máscara de bits (bit i = relé i
+# activado). Los cambios se anotan y aplicar() los lleva al hardware con
+# una escritura W1TC/W1TS por registro, ya traducidos a nivel eléctrico
+# (activo en LOW o en HIGH según el relé).
+
+import asyncio
+from time import ticks_ms, ticks_diff, ticks_add
+from array import array
+
+try:
+    from machine import Pin, mem32
+except ImportError:  # Host: registro simulado
+    Pin = None
+    mem32 = None
+
+# Registros GPIO del ESP32 (pines 0-31)
+GPIO_OUT = 0x3FF44004
+GPIO_OUT_W1TS = 0x3FF44008   # Escribir 1 pone esos pines en HIGH
+GPIO_OUT_W1TC = 0x3FF4400C   # Escribir 1 pone esos pines en LOW
+
+class RegistroFalso:
+    """Imita machine.mem32 para los registros GPIO_OUT en el host"""
+
+    def __init__(self):
+        self.salida = 0
+        self.escrituras = 0
+
+    def __getitem__(self, direccion):
+        return self.salida
+
+    def __setitem__(self, direccion, valor):
+        self.escrituras += 1
+        if direccion == GPIO_OUT_W1TS:
+            self.salida |= valor
+        elif direccion == GPIO_OUT_W1TC:
+            self.salida &= ~valor
+        else:
+            self.salida = valor
+
+class BancoReles:
+    """
+    Relés de un módulo como una máscara de bits
+
+    activar()/desactivar()/pulso() sólo cambian la máscara deseada;
+    aplicar() (una vez por tick, o en seguida si hace falta) escribe las
+    diferencias y vence los pulsos. Los enclavamientos son grupos de relés
+    que nunca pueden estar todos activados: un pedido que los completaría
+    se rechaza.
+
+    Entre apagar un relé enclavado y encender su par pasa al menos
+    tiempo_muerto_ms (los contactos tardan en abrir): aplicar() apaga en
+    seguida y deja el encendido para una llamada posterior, sin dormir.
+    Sólo se espera si el par estuvo encendido dentro de esa ventana (una
+    inversión); un encendido desde reposo sale en seguida.
+    """
+
+    def __init__(self, reles, registro=None, tiempo_muerto_ms=20):
+        """
+        Parámetros:
+        - reles: Pines GPIO (0-31) o tuplas (pin, activo_bajo)
+        - registro: machine.mem32 o un RegistroFalso
+        - tiempo_muerto_ms: Espera entre apagar un relé enclavado y encender
+          su par. 20 ms cubre lo que tarda en abrir un relé o contactor
+          chico (5-15 ms) con margen; subirlo para contactores más grandes
+        """
+        self.registro = registro if registro is not None else (mem32 if mem32 is not None else RegistroFalso())
+
+        pines = []
+        self._bajo = 0   # Relés activos en LOW (bit lógico)
+        for i, rele in enumerate(reles):
+            pin, activo_bajo = rele if isinstance(rele, tuple) else (rele, False)
+            if not 0 <= pin <= 31:
+                raise ValueError(f"Pin {pin} fuera de GPIO_OUT (0-31)")
+            pines.append(pin)
+            if activo_bajo:
+                self._bajo |= 1 << i
+        self.pines = tuple(pines)
+        self._bits_pin = tuple(1 << p for p in pines)
+        self.todos = (1 << len(pines)) - 1
+
+        self.deseado = 0     # Máscara lógica pedida
+        self.aplicado = 0    # Máscara lógica escrita en el hardware
+        self._enclavamientos = []
+        self._pulsos = 0     # Relés con pulso en curso
+        self._fin_pulso = array('L', [0] * len(pines))
+
+        # Tiempo muerto: pares de cada relé, relés enclavados apagados hace
+        # menos de tiempo_muerto_ms y el instante en que se apagó cada uno
+        self.tiempo_muerto_ms = tiempo_muerto_ms
+        self._pares = array('L', [0] * len(pines))
+        self._enclavados = 0
+        self._recientes = 0
+        self._apagado_ms = array('L', [0] * len(pines))
+        self._en_espera = 0  # Encendidos ya postergados (para contarlos una vez)
+
+        # Estadísticas
+        self.escrituras = 0
+        self.bloqueos = 0
+        self.diferidos = 0   # Encendidos postergados por el tiempo muerto
+
+        # Configurar como salida, ya en reposo
+        if Pin is not None:
+            for i, pin in enumerate(pines):
+                Pin(pin, Pin.OUT, value=1 if self._bajo >> i & 1 else 0)
+
+    # ---- Enclavamientos ----
+
+    def enclavar(self, *reles):
+        """Declarar un grupo de relés que no pueden estar activados juntos"""
+        m = 0
+        for i in reles:
+            m |= 1 << i
+        self._enclavamientos.append(m)
+        for i in reles:
+            self._pares[i] |= m & ~(1 << i)
+        self._enclavados |= m
+
+    def permitido(self, mascara):
+        """¿La máscara respeta todos los enclavamientos?"""
+        for grupo in self._enclavamientos:
+            if mascara & grupo == grupo:
+                return False
+        return True
+
+    # ---- Pedidos (sólo cambian la máscara) ----
+
+    def fijar(self, mascara):
+        """Pedir la máscara completa; retorna False si viola un enclavamiento"""
+        if not self.permitido(mascara):
+            self.bloqueos += 1
+            return False
+        self.deseado = mascara
+        self._pulsos &= mascara
+        return True
+
+    def activar(self, i):
+        return self.fijar(self.deseado | 1 << i)
+
+    def desactivar(self, i):
+        return self.fijar(self.deseado & ~(1 << i))
+
+    def poner(self, i, estado):
+        return self.activar(i) if estado else self.desactivar(i)
+
+    def toggle(self, i):
+        return self.poner(i, not self.activo(i))
+
+    def activo(self, i):
+        """Estado pedido del relé i"""
+        return bool(self.deseado >> i & 1)
+
+    def pulso(self, i, duracion_ms):
+        """Activar el relé i y desactivarlo en duracion_ms (lo vence aplicar())"""
+        if not self.activar(i):
+            return False
+        self._fin_pulso[i] = ticks_add(ticks_ms(), duracion_ms)
+        self._pulsos |= 1 << i
+        return True
+
+    # ---- Escritura ----
+
+    def _pines_de(self, mascara):
+        """Máscaras de pines a poner en HIGH y en LOW para activar 'mascara'"""
+        alto = bajo = 0
+        i = 0
+        while mascara:
+            if mascara & 1:
+                if self._bajo >> i & 1:
+                    bajo |= self._bits_pin[i]
+                else:
+                    alto |= self._bits_pin[i]
+            mascara >>= 1
+            i += 1
+        return alto, bajo
+
+    def _bloqueados(self):
+        """Relés que no pueden encenderse todavía (pares de los recientes)"""
+        ahora = ticks_ms()
+        bloqueados = 0
+        recientes = self._recientes
+        i = 0
+        while recientes:
+            if recientes & 1:
+                if ticks_diff(ahora, self._apagado_ms[i]) >= self.tiempo_muerto_ms:
+                    self._recientes &= ~(1 << i)
+                else:
+                    bloqueados |= self._pares[i]
+            recientes >>= 1
+            i += 1
+        return bloqueados
+
+    def _apagados(self, mascara):
+        """Anotar el apagado de relés encendidos: sus pares esperan tiempo_muerto_ms"""
+        mascara &= self._enclavados
+        if mascara and self.tiempo_muerto_ms:
+            self._recientes |= mascara
+            ahora = ticks_ms()
+            i = 0
+            while mascara:
+                if mascara & 1:
+                    self._apagado_ms[i] = ahora
+                mascara >>= 1
+                i += 1
+
+    def pendiente(self):
+        """¿Queda algo pedido sin escribir (por ejemplo, por el tiempo muerto)?"""
+        return self.deseado != self.aplicado
+
+    def _vencer_pulsos(self):
+        ahora = ticks_ms()
+        pulsos = self._pulsos
+        i = 0
+        while pulsos:
+            if pulsos & 1 and ticks_diff(ahora, self._fin_pulso[i]) >= 0:
+                self.deseado &= ~(1 << i)
+                self._pulsos &= ~(1 << i)
+            pulsos >>= 1
+            i += 1
+
+    def aplicar(self):
+        """
+        Llevar la máscara pedida al hardware
+
+        Primero se apagan los relés que salen y después se encienden los que
+        entran. Un relé cuyo par enclavado se apagó hace menos de
+        tiempo_muerto_ms queda pendiente: lo enciende una llamada posterior
+        (una vez por tick, ver tarea()). Retorna True si hubo que escribir.
+        """
+        if self._pulsos:
+            self._vencer_pulsos()
+        apagar = self.aplicado & ~self.deseado
+        encender = self.deseado & ~self.aplicado
+        if not (apagar or encender):
+            return False
+
+        if encender & self._enclavados:
+            if apagar:
+                self._apagados(apagar)
+            if self._recientes:
+                bloqueados = encender & self._bloqueados()
+                if bloqueados:
+                    encender &= ~bloqueados
+                    if bloqueados & ~self._en_espera:
+                        self.diferidos += 1
+                    self._en_espera = bloqueados
+                    if not (apagar or encender):
+                        return False
+        elif apagar:
+            self._apagados(apagar)
+
+        registro = self.registro
+        if apagar:
+            alto, bajo = self._pines_de(apagar)
+            if alto:
+                registro[GPIO_OUT_W1TC] = alto
+            if bajo:
+                registro[GPIO_OUT_W1TS] = bajo
+        if encender:
+            alto, bajo = self._pines_de(encender)
+            if alto:
+                registro[GPIO_OUT_W1TS] = alto
+            if bajo:
+                registro[GPIO_OUT_W1TC] = bajo
+        self.aplicado = (self.aplicado & ~apagar) | encender
+        self._en_espera &= ~encender
+        self.escrituras += 1
+        return True
+
+    def apagar_todo(self):
+        """Desactivar todos los relés ya, sin importar el estado anotado"""
+        self._apagados(self.aplicado)
+        self.deseado = 0
+        self._pulsos = 0
+        alto, bajo = self._pines_de(self.todos)
+        if alto:
+            self.registro[GPIO_OUT_W1TC] = alto
+        if bajo:
+            self.registro[GPIO_OUT_W1TS] = bajo
+        self.aplicado = 0
+        self.escrituras += 1
+
+    async def tarea(self, periodo_ms=10):
+        """Aplicar los cambios y vencer los pulsos una vez por tick"""
+        while True:
+            self.aplicar()
+            await asyncio.sleep_ms(periodo_ms)
@@ -3,8 +3,10 @@ ZMFO40 con librería Adafruit Fingerprint para MicroPython
 Adaptación para usar con sensor ZMFO40 v1.8
 """
 
+import asyncio
 import machine
 import time
+from array import array
 
 class AdafruitFingerprint:
     """Librería Adafruit adaptada para ZMFO40 en MicroPython"""
@@ -45,8 +47,30 @@ class AdafruitFingerprint:
     FINGERPRINT_DELETE = 0x0C
     FINGERPRINT_EMPTY = 0x0D
     FINGERPRINT_TEMPLATECOUNT = 0x1D
+    FINGERPRINT_MATCH = 0x03
+    FINGERPRINT_LOAD = 0x07
+    FINGERPRINT_UPLOAD = 0x08
+    FINGERPRINT_DOWNLOAD = 0x09
+    FINGERPRINT_READINDEXTABLE = 0x1F
 
-    def __init__(self, uart_num=2, baudrate=57600, tx_pin=17, rx_pin=16, password=0x0, address=0xFFFFFFFF):
+    # Ubicaciones de la base de datos (0-0xA3, igual que fingerSearch)
+    CAPACIDAD = 0xA4
+
+    # Cabecera del volcado binario de la base de datos
+    _MAGIC_VOLCADO = b"ZMF1"
+
+    # Tamaños de paquete: cabecera (start code + address + tipo + length)
+    # y máximo con 256 bytes de datos + checksum
+    _TAM_CABECERA = 9
+    _TAM_MAX_PAQUETE = 9 + 256 + 2
+
+    # Datos por paquete al transferir templates (valor de fábrica del sensor)
+    _TAM_DATOS = 128
+
+    # Comandos sin parámetros del camino rápido (se construyen una sola vez)
+    _CMD_GETIMAGE = bytes((FINGERPRINT_GETIMAGE,))
+
+    def __init__(self, uart_num=2, baudrate=57600, tx_pin=17, rx_pin=16, password=0x0, address=0xFFFFFFFF, probe_timeout_ms=3000):
         """
         Inicializar sensor ZMFO40 con protocolo Adafruit
         
@@ -57,80 +81,214 @@ class AdafruitFingerprint:
             rx_pin: Pin RX del ESP32
             password: Contraseña del sensor
             address: Dirección del sensor
+            probe_timeout_ms: Espera máxima de la verificación inicial
         """
         self.address = address
+        self.baudrate = baudrate
         self.password = password
         
+        # Buffers preasignados para no crear listas en cada paquete
+        self._tx = bytearray(self._TAM_MAX_PAQUETE)
+        self._tx_mv = memoryview(self._tx)
+        self._rx = bytearray(self._TAM_MAX_PAQUETE)
+        self._rx_mv = memoryview(self._rx)
+        self._cmd = bytearray(8)
+        self._cmd_mv = memoryview(self._cmd)
+        self._descarte = bytearray(16)  # Bytes viejos que se tiran antes de enviar
+        self._rx_reset()
+        
+        # StreamReader para las versiones async (se crea al primer uso)
+        self._reader = None
+        
+        # Cache de templates opcional (ver CacheHuellas)
+        self.cache = None
+        
+        # Start code y address son fijos
+        self._tx[0] = 0xEF
+        self._tx[1] = 0x01
+        self._tx[2] = (address >> 24) & 0xFF
+        self._tx[3] = (address >> 16) & 0xFF
+        self._tx[4] = (address >> 8) & 0xFF
+        self._tx[5] = address & 0xFF
+        
         # Configurar UART
         self.uart = machine.UART(uart_num, baudrate=baudrate, tx=tx_pin, rx=rx_pin, timeout=1000)
         print(f"📡 UART configurado: TX={tx_pin}, RX={rx_pin}, Baudrate={baudrate}")
         
         # Verificar conexión
-        if self.verifyPassword():
+        if self.verifyPassword(probe_timeout_ms):
             print("✅ ZMFO40 conectado con protocolo Adafruit")
         else:
             raise Exception("❌ No se pudo conectar al ZMFO40")
 
     def _write_packet(self, packet_type, data):
-        """Escribir paquete al sensor"""
-        # Limpiar buffer
-        while self.uart.any():
-            self.uart.read()
-        
-        packet = []
+        """
+        Escribir paquete al sensor usando el buffer de transmisión preasignado
         
-        # Start code
-        packet.extend([0xEF, 0x01])
+        Lo que quedaba en la UART se descarta en un buffer aparte: la vista
+        de la última respuesta (ver _read_packet) sigue siendo válida.
+        """
+        # Limpiar buffer (sin crear objetos ni pisar el buffer de recepción)
+        descarte = self._descarte
+        while self.uart.any():
+            self.uart.readinto(descarte, min(self.uart.any(), len(descarte)))
         
-        # Address (4 bytes)
-        packet.extend([
-            (self.address >> 24) & 0xFF,
-            (self.address >> 16) & 0xFF,
-            (self.address >> 8) & 0xFF,
-            self.address & 0xFF
-        ])
+        tx = self._tx
+        n = len(data)
         
+        # Start code y address ya están escritos en __init__
         # Packet type
-        packet.append(packet_type)
+        tx[6] = packet_type
         
         # Length
-        length = len(data) + 2
-        packet.extend([(length >> 8) & 0xFF, length & 0xFF])
+        length = n + 2
+        tx[7] = (length >> 8) & 0xFF
+        tx[8] = length & 0xFF
         
-        # Data
-        packet.extend(data)
-        
-        # Checksum
-        checksum = packet_type + ((length >> 8) & 0xFF) + (length & 0xFF)
-        for byte in data:
+        # Data + checksum en una sola pasada
+        checksum = packet_type + tx[7] + tx[8]
+        for i in range(n):
+            byte = data[i]
+            tx[9 + i] = byte
             checksum += byte
-        packet.extend([(checksum >> 8) & 0xFF, checksum & 0xFF])
+        tx[9 + n] = (checksum >> 8) & 0xFF
+        tx[10 + n] = checksum & 0xFF
         
         # Enviar
-        self.uart.write(bytes(packet))
+        self.uart.write(self._tx_mv[:11 + n])
+
+    def _rx_reset(self):
+        """Preparar el buffer de recepción para un paquete nuevo"""
+        self._rx_len = 0
+        self._rx_total = 0
+
+    def _rx_falta(self):
+        """Bytes que faltan para completar la cabecera o el paquete actual"""
+        if self._rx_total:
+            return self._rx_total - self._rx_len
+        return self._TAM_CABECERA - self._rx_len
+
+    def _rx_avanzar(self, leidos):
+        """
+        Registrar bytes recién leídos en el buffer de recepción
+        
+        Verifica start code, longitud y checksum en el propio buffer.
+        
+        Retorna: tamaño total del paquete si está completo, 0 si faltan bytes
+        """
+        rx = self._rx
+        n = self._rx_len + leidos
+        
+        if not self._rx_total:
+            # Resincronizar con el start code si llegaron bytes basura
+            while n and (rx[0] != 0xEF or (n > 1 and rx[1] != 0x01)):
+                for i in range(1, n):
+                    rx[i - 1] = rx[i]
+                n -= 1
+            
+            if n >= self._TAM_CABECERA:
+                # Verificar longitud
+                length = (rx[7] << 8) | rx[8]
+                if length < 2 or self._TAM_CABECERA + length > self._TAM_MAX_PAQUETE:
+                    self._rx_reset()
+                    raise Exception(f"Longitud de paquete inválida: {length}")
+                self._rx_total = self._TAM_CABECERA + length
+        
+        self._rx_len = n
+        total = self._rx_total
+        if not total or n < total:
+            return 0
+        
+        # Verificar checksum
+        checksum = 0
+        for i in range(6, total - 2):
+            checksum += rx[i]
+        if (checksum & 0xFFFF) != ((rx[total - 2] << 8) | rx[total - 1]):
+            self._rx_reset()
+            raise Exception("Checksum inválido")
+        return total
+
+    def _rx_recibir(self):
+        """
+        Leer los bytes disponibles en el buffer de recepción
+        
+        Nunca lee más allá del paquete actual, así los bytes del siguiente
+        paquete quedan en la UART.
+        
+        Retorna: tamaño total del paquete si está completo, 0 si faltan bytes
+        """
+        total = 0
+        while not total:
+            disponible = self.uart.any()
+            if not disponible:
+                break
+            
+            # Pedir sólo lo que falta de la cabecera o del paquete
+            n = self._rx_len
+            falta = self._rx_falta()
+            if disponible < falta:
+                falta = disponible
+            leidos = self.uart.readinto(self._rx_mv[n:n + falta], falta)
+            if not leidos:
+                break
+            total = self._rx_avanzar(leidos)
+        return total
 
-    def _read_packet(self, timeout=3):
-        """Leer paquete del sensor"""
-        packet = []
-        start_time = time.time()
+    def _read_packet(self, timeout_ms=3000):
+        """
+        Leer paquete del sensor
+        
+        Retorna: (tipo de paquete, memoryview con los datos). La vista apunta
+        al buffer de recepción y sólo es válida hasta el siguiente paquete.
+        """
+        self._rx_reset()
+        deadline = time.ticks_add(time.ticks_ms(), timeout_ms)
         
-        while (time.time() - start_time) < timeout:
+        while time.ticks_diff(deadline, time.ticks_ms()) > 0:
             if self.uart.any():
-                data = self.uart.read()
-                packet.extend(data)
-                
-                # Verificar si tenemos paquete completo
-                if len(packet) >= 12:
-                    # Verificar start code
-                    if packet[0] == 0xEF and packet[1] == 0x01:
-                        length = (packet[7] << 8) | packet[8]
-                        if len(packet) >= (9 + length):
-                            return packet[6], packet[9:9+length-2]
-            time.sleep(0.01)
+                total = self._rx_recibir()
+                if total:
+                    return self._rx[6], self._rx_mv[self._TAM_CABECERA:total - 2]
+            time.sleep_ms(1)
         
         raise Exception("Timeout leyendo respuesta")
 
-    def verifyPassword(self):
+    async def _read_packet_async(self, timeout_ms=3000):
+        """
+        Leer paquete del sensor sin bloquear a las demás tareas
+        
+        La tarea duerme en el StreamReader hasta que llega un byte, en lugar
+        de consultar uart.any() periódicamente.
+        
+        Retorna: lo mismo que _read_packet
+        """
+        if self._reader is None:
+            self._reader = asyncio.StreamReader(self.uart)
+        
+        self._rx_reset()
+        deadline = time.ticks_add(time.ticks_ms(), timeout_ms)
+        
+        while True:
+            total = self._rx_recibir()
+            if total:
+                return self._rx[6], self._rx_mv[self._TAM_CABECERA:total - 2]
+            
+            restante = time.ticks_diff(deadline, time.ticks_ms())
+            if restante <= 0:
+                raise Exception("Timeout leyendo respuesta")
+            
+            # Esperar el siguiente byte; el resto se lee sin esperar
+            n = self._rx_len
+            try:
+                leidos = await asyncio.wait_for_ms(self._reader.readinto(self._rx_mv[n:n + 1]), restante)
+            except asyncio.TimeoutError:
+                raise Exception("Timeout leyendo respuesta")
+            if leidos:
+                total = self._rx_avanzar(leidos)
+                if total:
+                    return self._rx[6], self._rx_mv[self._TAM_CABECERA:total - 2]
+
+    def verifyPassword(self, timeout_ms=3000):
         """Verificar contraseña del sensor"""
         data = [
             self.FINGERPRINT_VERIFYPASSWORD,
@@ -144,35 +302,51 @@ class AdafruitFingerprint:
         self._write_packet(self.FINGERPRINT_COMMANDPACKET, data)
         
         try:
-            packet_type, response = self._read_packet()
+            packet_type, response = self._read_packet(timeout_ms)
             return response[0] == self.FINGERPRINT_OK
         except:
             return False
 
     def getImage(self):
         """Capturar imagen de huella"""
-        data = [self.FINGERPRINT_GETIMAGE]
-        self._write_packet(self.FINGERPRINT_COMMANDPACKET, data)
+        self._write_packet(self.FINGERPRINT_COMMANDPACKET, self._CMD_GETIMAGE)
         
         packet_type, response = self._read_packet()
         return response[0]
 
+    def _buffer2_pisado(self, slot):
+        """Avisar a la cache si un comando escribe el CharBuffer2"""
+        if slot == 2 and self.cache:
+            self.cache.buffer_pisado()
+
+    def _send_image2Tz(self, slot):
+        """Enviar comando IMAGE2TZ"""
+        self._buffer2_pisado(slot)
+        cmd = self._cmd
+        cmd[0] = self.FINGERPRINT_IMAGE2TZ
+        cmd[1] = slot
+        self._write_packet(self.FINGERPRINT_COMMANDPACKET, self._cmd_mv[:2])
+
     def image2Tz(self, slot=1):
         """Convertir imagen a template"""
-        data = [self.FINGERPRINT_IMAGE2TZ, slot]
-        self._write_packet(self.FINGERPRINT_COMMANDPACKET, data)
+        self._send_image2Tz(slot)
         
         packet_type, response = self._read_packet()
         return response[0]
 
-    def fingerSearch(self, slot=1):
-        """Buscar huella en base de datos"""
-        # Usar toda la base de datos (0-162)
-        data = [self.FINGERPRINT_SEARCH, slot, 0x00, 0x00, 0x00, 0xA3]
-        self._write_packet(self.FINGERPRINT_COMMANDPACKET, data)
-        
-        packet_type, response = self._read_packet()
-        
+    def _send_fingerSearch(self, slot):
+        """Enviar comando SEARCH sobre toda la base de datos (0-162)"""
+        cmd = self._cmd
+        cmd[0] = self.FINGERPRINT_SEARCH
+        cmd[1] = slot
+        cmd[2] = 0x00
+        cmd[3] = 0x00
+        cmd[4] = 0x00
+        cmd[5] = 0xA3
+        self._write_packet(self.FINGERPRINT_COMMANDPACKET, self._cmd_mv[:6])
+
+    def _search_result(self, response):
+        """Interpretar respuesta de SEARCH: (código, id, confianza)"""
         if response[0] == self.FINGERPRINT_OK:
             finger_id = (response[1] << 8) | response[2]
             confidence = (response[3] << 8) | response[4]
@@ -180,8 +354,38 @@ class AdafruitFingerprint:
         else:
             return response[0], None, None
 
+    def fingerSearch(self, slot=1):
+        """Buscar huella en base de datos"""
+        self._send_fingerSearch(slot)
+        
+        packet_type, response = self._read_packet()
+        return self._search_result(response)
+
+    # Versiones async: esperan la respuesta sin bloquear el bucle de asyncio
+    async def getImageAsync(self):
+        """Capturar imagen de huella (async)"""
+        self._write_packet(self.FINGERPRINT_COMMANDPACKET, self._CMD_GETIMAGE)
+        
+        packet_type, response = await self._read_packet_async()
+        return response[0]
+
+    async def image2TzAsync(self, slot=1):
+        """Convertir imagen a template (async)"""
+        self._send_image2Tz(slot)
+        
+        packet_type, response = await self._read_packet_async()
+        return response[0]
+
+    async def fingerSearchAsync(self, slot=1):
+        """Buscar huella en base de datos (async)"""
+        self._send_fingerSearch(slot)
+        
+        packet_type, response = await self._read_packet_async()
+        return self._search_result(response)
+
     def createModel(self):
         """Crear modelo desde dos templates"""
+        self._buffer2_pisado(2)
         data = [self.FINGERPRINT_REGMODEL]
         self._write_packet(self.FINGERPRINT_COMMANDPACKET, data)
         
@@ -193,7 +397,16 @@ class AdafruitFingerprint:
         data = [self.FINGERPRINT_STORE, slot, (location >> 8) & 0xFF, location & 0xFF]
         self._write_packet(self.FINGERPRINT_COMMANDPACKET, data)
         
-        packet_type, response = self._read_packet()
+        try:
+            packet_type, response = self._read_packet()
+        except Exception:
+            # Sin respuesta no se sabe si guardó: mejor olvidar la ubicación
+            if self.cache:
+                self.cache.invalidar(location)
+            raise
+        # La ubicación sólo cambió si el sensor lo confirma
+        if response[0] == self.FINGERPRINT_OK and self.cache:
+            self.cache.invalidar(location)
         return response[0]
 
     def deleteModel(self, location, count=1):
@@ -205,7 +418,17 @@ class AdafruitFingerprint:
         ]
         self._write_packet(self.FINGERPRINT_COMMANDPACKET, data)
         
-        packet_type, response = self._read_packet()
+        try:
+            packet_type, response = self._read_packet()
+        except Exception:
+            # Sin respuesta pudo haber borrado: la cache no debe reconocer
+            # a un usuario borrado
+            if self.cache:
+                self.cache.invalidar(location, count)
+            raise
+        # Si el borrado falla los templates siguen en el sensor y en la cache
+        if response[0] == self.FINGERPRINT_OK and self.cache:
+            self.cache.invalidar(location, count)
         return response[0]
 
     def emptyDatabase(self):
@@ -213,9 +436,93 @@ class AdafruitFingerprint:
         data = [self.FINGERPRINT_EMPTY]
         self._write_packet(self.FINGERPRINT_COMMANDPACKET, data)
         
+        packet_type, response = self._read_packet()
+        if response[0] == self.FINGERPRINT_OK and self.cache:
+            self.cache.vaciar()
+        return response[0]
+
+    def loadModel(self, location, slot=2):
+        """Cargar un modelo guardado en el CharBuffer indicado"""
+        self._buffer2_pisado(slot)
+        data = [self.FINGERPRINT_LOAD, slot, (location >> 8) & 0xFF, location & 0xFF]
+        self._write_packet(self.FINGERPRINT_COMMANDPACKET, data)
+        
+        packet_type, response = self._read_packet()
+        return response[0]
+
+    def _upload_stream(self, slot, escribir):
+        """
+        Subir un CharBuffer llamando a escribir(tipo, datos) por cada paquete
+        
+        Los datos son una vista del buffer de recepción, sin copias.
+        Retorna: código de respuesta del comando
+        """
+        data = [self.FINGERPRINT_UPLOAD, slot]
+        self._write_packet(self.FINGERPRINT_COMMANDPACKET, data)
+        
+        packet_type, response = self._read_packet()
+        if response[0] != self.FINGERPRINT_OK:
+            return response[0]
+        
+        # El sensor envía paquetes de datos hasta el paquete final
+        while True:
+            packet_type, response = self._read_packet()
+            escribir(packet_type, response)
+            if packet_type == self.FINGERPRINT_ENDDATAPACKET:
+                return self.FINGERPRINT_OK
+
+    def uploadModel(self, slot=1):
+        """
+        Subir el template de un CharBuffer al ESP32
+        
+        Retorna: bytes del template, o None si el sensor rechaza el comando
+        """
+        template = bytearray()
+        if self._upload_stream(slot, lambda tipo, datos: template.extend(datos)) != self.FINGERPRINT_OK:
+            return None
+        return bytes(template)
+
+    def _download_start(self, slot):
+        """Pedir al sensor que reciba un template en el CharBuffer indicado"""
+        self._buffer2_pisado(slot)
+        data = [self.FINGERPRINT_DOWNLOAD, slot]
+        self._write_packet(self.FINGERPRINT_COMMANDPACKET, data)
+        
         packet_type, response = self._read_packet()
         return response[0]
 
+    def downloadModel(self, template, slot=2):
+        """Bajar un template desde el ESP32 a un CharBuffer"""
+        result = self._download_start(slot)
+        if result != self.FINGERPRINT_OK:
+            return result
+        
+        # Enviar en paquetes de _TAM_DATOS bytes; el último marca el final
+        vista = memoryview(template)
+        total = len(template)
+        for inicio in range(0, total, self._TAM_DATOS):
+            fin = min(inicio + self._TAM_DATOS, total)
+            if fin == total:
+                tipo = self.FINGERPRINT_ENDDATAPACKET
+            else:
+                tipo = self.FINGERPRINT_DATAPACKET
+            self._write_packet(tipo, vista[inicio:fin])
+        return self.FINGERPRINT_OK
+
+    def matchModel(self):
+        """
+        Comparar CharBuffer1 con CharBuffer2 (1:1)
+        
+        Retorna: (código, puntaje)
+        """
+        data = [self.FINGERPRINT_MATCH]
+        self._write_packet(self.FINGERPRINT_COMMANDPACKET, data)
+        
+        packet_type, response = self._read_packet()
+        if response[0] == self.FINGERPRINT_OK:
+            return response[0], (response[1] << 8) | response[2]
+        return response[0], 0
+
     # Funciones de alto nivel estilo Adafruit
     def get_fingerprint(self):
         """Obtener y buscar huella (estilo Adafruit)"""
@@ -238,8 +545,11 @@ class AdafruitFingerprint:
         if self.image2Tz(1) != self.FINGERPRINT_OK:
             return None
         
-        # Buscar en base de datos
-        result, finger_id, confidence = self.fingerSearch(1)
+        # Buscar en base de datos (primero en la cache, si hay)
+        if self.cache:
+            result, finger_id, confidence = self.cache.buscar(1)
+        else:
+            result, finger_id, confidence = self.fingerSearch(1)
         
         if result == self.FINGERPRINT_OK:
             print(f"✅ Huella encontrada: ID {finger_id}, Confianza {confidence}")
@@ -248,39 +558,79 @@ class AdafruitFingerprint:
             print("❌ Huella no encontrada")
             return None
 
-    def enroll_finger(self, location):
-        """Registrar nueva huella (estilo Adafruit)"""
-        print(f"📝 Registrando huella en posición {location}")
+    async def get_fingerprint_async(self):
+        """
+        Obtener y buscar huella sin bloquear las demás tareas
         
-        # Primera imagen
-        print("1. Coloca el dedo...")
+        No pasa por self.cache a propósito: CacheHuellas compara con
+        llamadas bloqueantes (MATCH, y DOWNLOAD por candidato de RAM) que
+        frenarían a las demás tareas. Siempre usa la búsqueda 1:N.
+        """
+        # Intentar capturar imagen
         for i in range(10):
-            result = self.getImage()
+            result = await self.getImageAsync()
             if result == self.FINGERPRINT_OK:
                 break
             elif result == self.FINGERPRINT_NOFINGER:
-                time.sleep(0.5)
+                await asyncio.sleep_ms(100)
                 continue
             else:
-                raise Exception(f"Error capturando imagen: {result}")
+                return None
+        else:
+            return None
         
-        if self.image2Tz(1) != self.FINGERPRINT_OK:
-            raise Exception("Error convirtiendo primera imagen")
+        # Convertir imagen
+        if await self.image2TzAsync(1) != self.FINGERPRINT_OK:
+            return None
         
-        time.sleep(1)
+        # Buscar en base de datos (sin cache, ver arriba)
+        result, finger_id, confidence = await self.fingerSearchAsync(1)
         
-        for i in range(10):
+        if result == self.FINGERPRINT_OK:
+            print(f"✅ Huella encontrada: ID {finger_id}, Confianza {confidence}")
+            return True
+        else:
+            print("❌ Huella no encontrada")
+            return None
+
+    def _capture(self, slot, nombre, intentos=10, espera_ms=500):
+        """Esperar el dedo, capturar y convertir la imagen al CharBuffer"""
+        for i in range(intentos):
             result = self.getImage()
             if result == self.FINGERPRINT_OK:
                 break
             elif result == self.FINGERPRINT_NOFINGER:
-                time.sleep(0.5)
+                time.sleep_ms(espera_ms)
                 continue
             else:
-                raise Exception(f"Error capturando segunda imagen: {result}")
+                raise Exception(f"Error capturando {nombre}: {result}")
+        else:
+            raise Exception(f"No se detectó el dedo para la {nombre}")
+        
+        if self.image2Tz(slot) != self.FINGERPRINT_OK:
+            raise Exception(f"Error convirtiendo {nombre}")
+
+    def _wait_removal(self, timeout_ms=5000):
+        """Esperar a que se retire el dedo (en lugar de una pausa fija)"""
+        deadline = time.ticks_add(time.ticks_ms(), timeout_ms)
+        while time.ticks_diff(deadline, time.ticks_ms()) > 0:
+            if self.getImage() == self.FINGERPRINT_NOFINGER:
+                return True
+            time.sleep_ms(50)
+        return False
+
+    def enroll_finger(self, location):
+        """Registrar nueva huella (estilo Adafruit)"""
+        print(f"📝 Registrando huella en posición {location}")
+        
+        # Primera imagen
+        print("1. Coloca el dedo...")
+        self._capture(1, "primera imagen")
         
-        if self.image2Tz(2) != self.FINGERPRINT_OK:
-            raise Exception("Error convirtiendo segunda imagen")
+        print("2. Retira el dedo y vuelve a colocarlo...")
+        if not self._wait_removal():
+            raise Exception("No se retiró el dedo")
+        self._capture(2, "segunda imagen")
         
         # Crear y guardar modelo
         if self.createModel() != self.FINGERPRINT_OK:
@@ -293,22 +643,550 @@ class AdafruitFingerprint:
         
         return True
 
+    # Gestión masiva de la base de datos
+    def enroll_batch(self, locations):
+        """
+        Registrar varias huellas seguidas
+        
+        Retorna: diccionario ubicación -> True o mensaje de error
+        """
+        resultados = {}
+        for location in locations:
+            try:
+                resultados[location] = self.enroll_finger(location)
+            except Exception as e:
+                print(f"❌ Posición {location}: {e}")
+                resultados[location] = str(e)
+            self._wait_removal()
+        
+        exitosas = sum(1 for r in resultados.values() if r is True)
+        print(f"📋 Registro por lotes: {exitosas}/{len(resultados)} huellas")
+        return resultados
+
+    def read_index_table(self, page=0):
+        """
+        Leer la tabla de índices de una página (256 ubicaciones)
+        
+        Retorna: bytes de 32 bytes, un bit por ubicación ocupada
+        """
+        data = [self.FINGERPRINT_READINDEXTABLE, page]
+        self._write_packet(self.FINGERPRINT_COMMANDPACKET, data)
+        
+        packet_type, response = self._read_packet()
+        if response[0] != self.FINGERPRINT_OK:
+            raise Exception(f"Error leyendo tabla de índices: {response[0]}")
+        return bytes(response[1:33])
+
+    def used_slots(self):
+        """Lista de ubicaciones ocupadas según la tabla de índices"""
+        ocupadas = []
+        for page in range((self.CAPACIDAD + 255) // 256):
+            tabla = self.read_index_table(page)
+            for i in range(256):
+                location = page * 256 + i
+                if location >= self.CAPACIDAD:
+                    break
+                if tabla[i >> 3] & (1 << (i & 7)):
+                    ocupadas.append(location)
+        return ocupadas
+
+    def free_slots(self):
+        """Lista de ubicaciones libres según la tabla de índices"""
+        ocupadas = set(self.used_slots())
+        return [location for location in range(self.CAPACIDAD) if location not in ocupadas]
+
+    def delete_range(self, start, end):
+        """Borrar las ubicaciones start..end (inclusive) en un solo comando"""
+        return self.deleteModel(start, end - start + 1)
+
+    def export_database(self, destino):
+        """
+        Volcar todos los templates a un stream (archivo, socket...)
+        
+        Formato: b"ZMF1", luego por template b"T" + ubicación (2 bytes) y sus
+        paquetes como tipo (1 byte) + longitud (2 bytes) + datos, y b"E" al
+        final. Los paquetes se escriben a medida que llegan, sin juntar el
+        template en RAM.
+        
+        Retorna: número de templates exportados
+        """
+        cabecera = bytearray(3)
+        
+        def escribir(tipo, datos):
+            n = len(datos)
+            cabecera[0] = tipo
+            cabecera[1] = n >> 8
+            cabecera[2] = n & 0xFF
+            destino.write(cabecera)
+            destino.write(datos)
+        
+        destino.write(self._MAGIC_VOLCADO)
+        exportados = 0
+        for location in self.used_slots():
+            if self.loadModel(location, 1) != self.FINGERPRINT_OK:
+                print(f"⚠️ No se pudo cargar la posición {location}")
+                continue
+            cabecera[0] = ord("T")
+            cabecera[1] = location >> 8
+            cabecera[2] = location & 0xFF
+            destino.write(cabecera)
+            if self._upload_stream(1, escribir) != self.FINGERPRINT_OK:
+                raise Exception(f"Error subiendo template {location}")
+            exportados += 1
+        destino.write(b"E")
+        
+        print(f"📤 {exportados} templates exportados")
+        return exportados
+
+    def import_database(self, origen):
+        """
+        Cargar templates desde un volcado de export_database
+        
+        Cada paquete se lee en un buffer fijo y se reenvía al sensor, así el
+        volcado completo nunca está en RAM.
+        
+        Retorna: número de templates importados
+        """
+        cabecera = bytearray(3)
+        datos = bytearray(self._TAM_MAX_PAQUETE)
+        vista = memoryview(datos)
+        
+        def leer(buf):
+            if origen.readinto(buf) != len(buf):
+                raise Exception("Volcado incompleto")
+        
+        leer(vista[:4])
+        if datos[:4] != self._MAGIC_VOLCADO:
+            raise Exception("Volcado no reconocido")
+        
+        importados = 0
+        while True:
+            leer(vista[:1])
+            if datos[0] == ord("E"):
+                break
+            if datos[0] != ord("T"):
+                raise Exception("Volcado corrupto")
+            leer(vista[:2])
+            location = (datos[0] << 8) | datos[1]
+            
+            if self._download_start(1) != self.FINGERPRINT_OK:
+                raise Exception(f"Error bajando template {location}")
+            while True:
+                leer(cabecera)
+                tipo = cabecera[0]
+                n = (cabecera[1] << 8) | cabecera[2]
+                if n > self._TAM_MAX_PAQUETE - self._TAM_CABECERA - 2:
+                    raise Exception(f"Paquete de {n} bytes en el template {location}")
+                leer(vista[:n])
+                self._write_packet(tipo, vista[:n])
+                if tipo == self.FINGERPRINT_ENDDATAPACKET:
+                    break
+            
+            if self.storeModel(location, 1) != self.FINGERPRINT_OK:
+                raise Exception(f"Error guardando template {location}")
+            importados += 1
+        
+        print(f"📥 {importados} templates importados")
+        return importados
+
+class CacheHuellas:
+    """
+    Cache delante de fingerSearch para usuarios que se repiten
+    
+    Antes de la búsqueda 1:N del sensor se compara la huella 1:1 (MATCH)
+    contra:
+    - el template del último usuario reconocido, que queda cargado en el
+      CharBuffer2 del sensor: cuesta sólo el MATCH, sin pasar por la UART;
+    - hasta `candidatos` templates de usuarios recientes guardados en el
+      ESP32 (LRU), que hay que bajar por la UART antes de cada MATCH.
+    Los templates son opacos, así que la comparación la hace el sensor.
+    
+    Límite: sólo conviene lo que sale más barato que SEARCH, que crece con
+    la base (R307: 20 ms + 0.6 ms por template, 118 ms con las 164
+    ubicaciones). El MATCH contra el CharBuffer2 (30 ms) conviene desde
+    ~17 templates a cualquier baudrate. Bajar un template de RAM cuesta
+    además ~101 ms a 57600 baudios y ~53 ms a 115200: con la capacidad
+    del sensor sólo conviene a 115200 y de a uno (candidatos_rentables).
+    Sin nada que convenga la cache no se conecta al sensor. Conviene con
+    un usuario que se repite mucho (escenarios huella_cache y
+    huella_sin_cache de simulacion/benchmark.py).
+    """
+    
+    # Tiempos del sensor (ms) para estimar qué conviene
+    SEARCH_MS = 20
+    SEARCH_POR_TEMPLATE_US = 600
+    MATCH_MS = 30
+    DOWNLOAD_MS = 5
+    BYTES_TEMPLATE = 556    # 512 de datos + 4 paquetes de 11 bytes
+    
+    def __init__(self, sensor, capacidad=4, candidatos=None):
+        """
+        Args:
+            sensor: AdafruitFingerprint al que se conecta la cache
+            capacidad: Número máximo de templates guardados en RAM
+            candidatos: Templates de RAM que se comparan 1:1 antes de buscar
+                (None = los que convienen según candidatos_rentables)
+        """
+        self.sensor = sensor
+        self.capacidad = capacidad
+        ocupadas = len(sensor.used_slots())
+        self.usar_buffer = self.MATCH_MS < self.search_ms(ocupadas)
+        if candidatos is None:
+            candidatos = self.candidatos_rentables(ocupadas)
+        self.candidatos = candidatos
+        self.en_buffer = -1     # Ubicación cuyo template está en el CharBuffer2
+        self._ubicaciones = []  # Orden LRU: la más reciente al final
+        self._templates = {}    # ubicación -> bytes del template
+        self.aciertos = 0
+        self.fallos = 0
+        if self.usar_buffer or candidatos:
+            sensor.cache = self
+        else:
+            print("⚠️ Cache desactivada: con esta base la búsqueda 1:N del sensor es más rápida")
+
+    def search_ms(self, ocupadas):
+        """Lo que tarda SEARCH sobre ocupadas templates"""
+        return self.SEARCH_MS + self.SEARCH_POR_TEMPLATE_US * ocupadas // 1000
+
+    def candidatos_rentables(self, ocupadas):
+        """Templates de RAM (DOWNLOAD + MATCH) que cuestan menos que una búsqueda"""
+        candidato_ms = (self.MATCH_MS + self.DOWNLOAD_MS
+                        + self.BYTES_TEMPLATE * 10000 // self.sensor.baudrate)
+        return min(self.capacidad, self.search_ms(ocupadas) // candidato_ms)
+
+    def buscar(self, slot=1):
+        """
+        Buscar la huella del CharBuffer indicado
+        
+        Retorna: (código, id, confianza) igual que fingerSearch
+        """
+        sensor = self.sensor
+        
+        # 1:1 contra el último usuario, ya cargado en el CharBuffer2
+        if self.usar_buffer and self.en_buffer >= 0:
+            result, puntaje = sensor.matchModel()
+            if result == sensor.FINGERPRINT_OK:
+                self.aciertos += 1
+                self._usada(self.en_buffer)
+                return result, self.en_buffer, puntaje
+        
+        # 1:pocos contra los templates de RAM (más reciente primero)
+        ultimo = max(-1, len(self._ubicaciones) - 1 - self.candidatos)
+        for i in range(len(self._ubicaciones) - 1, ultimo, -1):
+            ubicacion = self._ubicaciones[i]
+            if ubicacion == self.en_buffer:
+                continue
+            self.en_buffer = -1
+            if sensor.downloadModel(self._templates[ubicacion], 2) != sensor.FINGERPRINT_OK:
+                continue
+            self.en_buffer = ubicacion
+            result, puntaje = sensor.matchModel()
+            if result == sensor.FINGERPRINT_OK:
+                self.aciertos += 1
+                self._usada(ubicacion)
+                return result, ubicacion, puntaje
+        
+        # Fallo: búsqueda 1:N en el sensor
+        self.fallos += 1
+        result, finger_id, confidence = sensor.fingerSearch(slot)
+        if result == sensor.FINGERPRINT_OK:
+            self._agregar(finger_id)
+        return result, finger_id, confidence
+
+    def _usada(self, ubicacion):
+        """Pasar la ubicación al final del orden LRU (si está en RAM)"""
+        if ubicacion in self._templates:
+            self._ubicaciones.remove(ubicacion)
+            self._ubicaciones.append(ubicacion)
+
+    def _agregar(self, ubicacion):
+        """Dejar el template en el CharBuffer2 y, si se usan, también en RAM"""
+        sensor = self.sensor
+        if ubicacion != self.en_buffer:
+            self.en_buffer = -1
+            if sensor.loadModel(ubicacion, 2) != sensor.FINGERPRINT_OK:
+                return
+            self.en_buffer = ubicacion
+        if not self.candidatos:
+            return      # Sin templates en RAM: no subirlo por la UART
+        if ubicacion in self._templates:
+            # Ya estaba (fuera de los candidatos o sin MATCH): sólo reordenar
+            self._usada(ubicacion)
+            return
+        template = sensor.uploadModel(2)
+        if template is None:
+            return
+        
+        # Desalojar el menos usado recientemente
+        if len(self._ubicaciones) >= self.capacidad:
+            del self._templates[self._ubicaciones.pop(0)]
+        self._ubicaciones.append(ubicacion)
+        self._templates[ubicacion] = template
+
+    def buffer_pisado(self):
+        """El driver escribió el CharBuffer2 por su cuenta (registro, carga...)"""
+        self.en_buffer = -1
+
+    def invalidar(self, ubicacion, cantidad=1):
+        """Olvidar los templates de un rango de ubicaciones"""
+        if ubicacion <= self.en_buffer < ubicacion + cantidad:
+            self.en_buffer = -1
+        for i in range(len(self._ubicaciones) - 1, -1, -1):
+            u = self._ubicaciones[i]
+            if ubicacion <= u < ubicacion + cantidad:
+                self._ubicaciones.pop(i)
+                del self._templates[u]
+
+    def vaciar(self):
+        """Olvidar todos los templates"""
+        self.en_buffer = -1
+        self._ubicaciones = []
+        self._templates = {}
+
+    def estadisticas(self):
+        """Contadores de aciertos y fallos de la cache"""
+        total = self.aciertos + self.fallos
+        tasa = (self.aciertos / total * 100) if total > 0 else 0
+        return {
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "tasa": tasa,
+            "templates": len(self._ubicaciones),
+        }
+
+class MaquinaHuella:
+    """
+    Máquina de estados no bloqueante para reconocer huellas
+    
+    IDLE → CAPTURE → CONVERT → SEARCH → RESULT. Cada llamada a paso() envía
+    un comando o revisa si llegó su respuesta, sin esperar nunca a la UART,
+    así el planificador puede llamarla junto con las demás tareas.
+    
+    Después de un resultado sigue sondeando con GETIMAGE, pero no arma otra
+    captura hasta que el sensor contesta NOFINGER (como _wait_removal), así
+    un dedo que sigue apoyado no se reconoce dos veces.
+    """
+    
+    IDLE = 0
+    CAPTURE = 1
+    CONVERT = 2
+    SEARCH = 3
+    RESULT = 4
+    NOMBRES = ("IDLE", "CAPTURE", "CONVERT", "SEARCH", "RESULT")
+    
+    # Límites de los buckets del histograma en ms (el último bucket es "más")
+    LIMITES_MS = (10, 20, 50, 100, 200, 500, 1000)
+    
+    def __init__(self, sensor, espera_min_ms=50, espera_max_ms=1000, timeout_ms=3000):
+        """
+        Args:
+            sensor: AdafruitFingerprint ya conectado
+            espera_min_ms: Intervalo de sondeo con dedo presente
+            espera_max_ms: Intervalo máximo de sondeo con el sensor inactivo
+            timeout_ms: Tiempo máximo de espera de cada respuesta
+        """
+        self.sensor = sensor
+        self.espera_min_ms = espera_min_ms
+        self.espera_max_ms = espera_max_ms
+        self.timeout_ms = timeout_ms
+        
+        self.estado = self.IDLE
+        self.intervalo_ms = espera_min_ms  # Back-off actual ante NOFINGER
+        self.resultado = None              # (código, id, confianza)
+        self._retirar = False              # Esperando NOFINGER tras un resultado
+        
+        # Marca de tiempo de la última entrada a cada estado
+        ahora = time.ticks_ms()
+        self.marcas = array('L', [ahora] * 5)
+        self._proximo = ahora
+        
+        # Histogramas por etapa (CAPTURE, CONVERT, SEARCH) y total de desbloqueo
+        self._histogramas = [array('L', [0] * (len(self.LIMITES_MS) + 1)) for _ in range(4)]
+        self._sumas_ms = array('L', [0] * 4)
+
+    def _cambiar(self, estado, ahora):
+        """Pasar a otro estado registrando la marca de tiempo"""
+        self.estado = estado
+        self.marcas[estado] = ahora
+
+    def _registrar(self, indice, ms):
+        """Sumar una latencia al histograma indicado"""
+        histograma = self._histogramas[indice]
+        i = 0
+        for limite in self.LIMITES_MS:
+            if ms <= limite:
+                break
+            i += 1
+        histograma[i] += 1
+        self._sumas_ms[indice] += ms
+
+    def _enviar(self, estado, ahora):
+        """Enviar el comando de la etapa y pasar a esperar su respuesta"""
+        sensor = self.sensor
+        if estado == self.CAPTURE:
+            sensor._write_packet(sensor.FINGERPRINT_COMMANDPACKET, sensor._CMD_GETIMAGE)
+        elif estado == self.CONVERT:
+            sensor._send_image2Tz(1)
+        else:
+            sensor._send_fingerSearch(1)
+        sensor._rx_reset()
+        self._cambiar(estado, ahora)
+
+    def _reposo(self, ahora, espera_ms):
+        """Volver a IDLE y programar el próximo sondeo"""
+        self._proximo = time.ticks_add(ahora, espera_ms)
+        self._cambiar(self.IDLE, ahora)
+
+    def paso(self):
+        """
+        Avanzar la máquina sin bloquear
+        
+        Retorna: (código, id, confianza) al terminar una búsqueda, None si no
+        """
+        ahora = time.ticks_ms()
+        estado = self.estado
+        
+        if estado == self.RESULT:
+            # No volver a capturar hasta que se retire el dedo
+            self._retirar = True
+            self._reposo(ahora, self.espera_min_ms)
+            return None
+        
+        if estado == self.IDLE:
+            if time.ticks_diff(ahora, self._proximo) >= 0:
+                self._enviar(self.CAPTURE, ahora)
+            return None
+        
+        # Etapas que esperan la respuesta del sensor
+        sensor = self.sensor
+        try:
+            total = sensor._rx_recibir()
+        except Exception:
+            self._reposo(ahora, self.intervalo_ms)
+            return None
+        
+        transcurrido = time.ticks_diff(ahora, self.marcas[estado])
+        if not total:
+            if transcurrido > self.timeout_ms:
+                self._reposo(ahora, self.intervalo_ms)
+            return None
+        
+        codigo = sensor._rx[sensor._TAM_CABECERA]
+        
+        if self._retirar:
+            # Sondeo de retiro: sólo NOFINGER arma la próxima captura
+            if codigo == sensor.FINGERPRINT_NOFINGER:
+                self._retirar = False
+                self.intervalo_ms = self.espera_min_ms
+            self._reposo(ahora, self.espera_min_ms)
+            return None
+        
+        self._registrar(estado - 1, transcurrido)
+        
+        if estado == self.CAPTURE:
+            if codigo == sensor.FINGERPRINT_OK:
+                # Dedo presente: sondeo rápido y a convertir
+                self.intervalo_ms = self.espera_min_ms
+                self._enviar(self.CONVERT, ahora)
+            elif codigo == sensor.FINGERPRINT_NOFINGER:
+                # Sensor inactivo: duplicar el intervalo hasta el máximo
+                self.intervalo_ms = min(self.intervalo_ms * 2, self.espera_max_ms)
+                self._reposo(ahora, self.intervalo_ms)
+            else:
+                self._reposo(ahora, self.espera_min_ms)
+            return None
+        
+        if estado == self.CONVERT:
+            if codigo == sensor.FINGERPRINT_OK:
+                self._enviar(self.SEARCH, ahora)
+            else:
+                self._reposo(ahora, self.espera_min_ms)
+            return None
+        
+        # SEARCH
+        self.resultado = sensor._search_result(sensor._rx_mv[sensor._TAM_CABECERA:total - 2])
+        self._registrar(3, time.ticks_diff(ahora, self.marcas[self.CAPTURE]))
+        self._cambiar(self.RESULT, ahora)
+        return self.resultado
+
+    def espera_ms(self):
+        """Milisegundos hasta que vale la pena volver a llamar a paso()"""
+        if self.estado == self.IDLE:
+            return max(0, time.ticks_diff(self._proximo, time.ticks_ms()))
+        if self.estado == self.RESULT:
+            return 0
+        return 5
+
+    def reporte(self):
+        """Mostrar el histograma de latencia por etapa"""
+        encabezado = "".join(f"{'<=' + str(l):>7}" for l in self.LIMITES_MS)
+        print("📊 Latencia por etapa (ms)")
+        print(f"   {'etapa':<8}{encabezado}{'más':>7}{'media':>8}")
+        nombres = ("CAPTURE", "CONVERT", "SEARCH", "TOTAL")
+        for i in range(4):
+            histograma = self._histogramas[i]
+            cuenta = sum(histograma)
+            media = self._sumas_ms[i] / cuenta if cuenta else 0
+            celdas = "".join(f"{c:>7}" for c in histograma)
+            print(f"   {nombres[i]:<8}{celdas}{media:>8.1f}")
+
 def create_fingerprint_sensor(tx_pin=17, rx_pin=16, baudrate=57600):
     """Crear sensor con configuración específica (estilo Adafruit)"""
     return AdafruitFingerprint(uart_num=2, baudrate=baudrate, tx_pin=tx_pin, rx_pin=rx_pin)
 
-def auto_detect_fingerprint():
-    """Auto-detectar configuración del ZMFO40"""
-    configuraciones = [
-        (17, 16, 57600), (16, 17, 57600),
-        (25, 26, 57600), (26, 25, 57600),
-    ]
+# Última configuración detectada, guardada en la flash del ESP32
+ARCHIVO_CONFIG = "huella_config.txt"
+
+# Pines probados y baudrates que acepta el sensor (9600 * N, N = 1..12),
+# empezando por el de fábrica
+PINES = ((17, 16), (16, 17), (25, 26), (26, 25))
+BAUDRATES = (57600,) + tuple(9600 * n for n in range(1, 13) if n != 6)
+
+def _leer_config():
+    """Leer la última configuración exitosa (tx, rx, baudrate) o None"""
+    try:
+        with open(ARCHIVO_CONFIG) as f:
+            tx, rx, br = f.read().split(",")
+        return int(tx), int(rx), int(br)
+    except (OSError, ValueError):
+        return None
+
+def _guardar_config(tx, rx, br):
+    """Guardar la configuración detectada para el próximo arranque"""
+    try:
+        with open(ARCHIVO_CONFIG, "w") as f:
+            f.write(f"{tx},{rx},{br}")
+    except OSError:
+        print("⚠️ No se pudo guardar la configuración del sensor")
+
+def _configuraciones(ultima):
+    """Orden de prueba: la última exitosa y luego todos los pines por baudrate"""
+    if ultima:
+        yield ultima
+    for br in BAUDRATES:
+        for tx, rx in PINES:
+            if (tx, rx, br) != ultima:
+                yield tx, rx, br
+
+def auto_detect_fingerprint(probe_timeout_ms=200):
+    """
+    Auto-detectar configuración del ZMFO40
     
-    for tx, rx, br in configuraciones:
+    Prueba primero la última configuración guardada en la flash y usa una
+    espera corta por intento, así un arranque normal tarda milisegundos en
+    lugar de varios segundos.
+    """
+    inicio = time.ticks_ms()
+    ultima = _leer_config()
+    
+    for tx, rx, br in _configuraciones(ultima):
         try:
             print(f"🔍 Probando TX={tx}, RX={rx}, Baudrate={br}")
-            sensor = AdafruitFingerprint(uart_num=2, baudrate=br, tx_pin=tx, rx_pin=rx)
+            sensor = AdafruitFingerprint(uart_num=2, baudrate=br, tx_pin=tx, rx_pin=rx, probe_timeout_ms=probe_timeout_ms)
             print(f"✅ Configuración detectada: TX={tx}, RX={rx}, Baudrate={br}")
+            if (tx, rx, br) != ultima:
+                _guardar_config(tx, rx, br)
+            print(f"⏱️ Detección: {time.ticks_diff(time.ticks_ms(), inicio)} ms, sensor listo a los {time.ticks_ms()} ms del arranque")
             return sensor
         except:
             continue
@@ -316,18 +1194,16 @@ def auto_detect_fingerprint():
     raise Exception("❌ No se pudo detectar configuración automáticamente")
 
 # Ejemplo de uso estilo Adafruit
+if __name__ == "__main__":
+    # Conectar al sensor
+    finger = auto_detect_fingerprint()
 
+    # Registrar huella
+    #finger.enroll_finger(4)
 
-
-# Conectar al sensor
-finger = auto_detect_fingerprint()
-
-# Registrar huella
-#finger.enroll_finger(4)
-
- #Verificar huella
-#while True:
-   # finger_id = finger.get_fingerprint()
-    #if finger_id:
-     #   print(f"Bienvenido usuario {finger_id}")
-    #time.sleep(1)
+    #Verificar huella
+    #while True:
+    #    finger_id = finger.get_fingerprint()
+    #    if finger_id:
+    #        print(f"Bienvenido usuario {finger_id}")
+    #    time.sleep(1)
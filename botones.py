@@ -0,0 +1,129 @@
+# ========================================
+# BANCO DE BOTONES CON INTERRUPCIONES
+# ========================================
+
+from machine import Pin
+from time import ticks_ms, ticks_us, ticks_add, ticks_diff
+from array import array
+import asyncio
+import machine
+
+from metricas import Latencias
+
+class BancoBotones:
+    """
+    Botones con interrupción por flanco y antirrebote por marca de tiempo
+
+    La interrupción escucha los dos flancos. Una pulsación cuenta cuando el
+    pin está en LOW, el botón se soltó desde la anterior y el pin estuvo
+    quieto antirrebote_ms: así ni los rebotes al presionar ni los de soltar
+    (tras mantenerlo apretado) generan eventos de más. Un flanco de subida
+    rearma el botón sólo si llega después de antirrebote_ms en LOW, o sea,
+    si es la suelta y no un rebote de la pulsación.
+
+    Cada pulsación se anota en un buffer circular sin crear objetos: sólo
+    la interrupción escribe el índice de escritura y sólo el consumidor
+    escribe el de lectura, así no hace falta bloquear. El bucle principal
+    consume con leer() o una tarea async con esperar().
+    """
+
+    def __init__(self, pines, antirrebote_ms=50, capacidad=16):
+        """
+        Parámetros:
+        - pines: Números de GPIO (con pull-up, activos en LOW)
+        - antirrebote_ms: Tiempo quieto que necesita un flanco para contar
+        - capacidad: Eventos que caben en el buffer
+        """
+        self.antirrebote_ms = antirrebote_ms
+        self.pines = [Pin(n, Pin.IN, Pin.PULL_UP) for n in pines]
+
+        # Último flanco de cada botón; arranca "viejo" para que una
+        # pulsación apenas creado el banco no se tome como rebote
+        self._ultimo_ms = array('L', [ticks_add(ticks_ms(), -antirrebote_ms)] * len(self.pines))
+        self._armado = bytearray(b"\x01" * len(self.pines))
+        self._eventos = bytearray(capacidad)
+        self._marcas_us = array('L', [0] * capacidad)
+        self._escritura = 0   # Sólo lo modifica la interrupción
+        self._lectura = 0     # Sólo lo modifica el consumidor
+
+        self.actividad = False  # Hubo algún flanco desde el último esperar
+        self._flag = asyncio.ThreadSafeFlag()
+
+        # Estadísticas
+        self.perdidos = 0
+        self.rebotes = 0
+        self.latencias = Latencias()  # µs desde la interrupción hasta leer()
+
+        handler = self._irq  # Un solo bound method para todos los pines
+        for pin in self.pines:
+            pin.irq(trigger=Pin.IRQ_FALLING | Pin.IRQ_RISING, handler=handler)
+
+    def _irq(self, pin):
+        """Interrupción: antirrebote y encolado, sin crear objetos"""
+        self.actividad = True
+        self._flag.set()
+
+        ahora = ticks_ms()
+        pines = self.pines
+        for i in range(len(pines)):
+            if pines[i] is pin:
+                break
+        else:
+            return
+
+        quieto = ticks_diff(ahora, self._ultimo_ms[i]) >= self.antirrebote_ms
+        self._ultimo_ms[i] = ahora
+
+        if pin.value():
+            # Subida: sólo la suelta (tras estar quieto en LOW) rearma
+            if quieto:
+                self._armado[i] = 1
+            return
+        if not (quieto and self._armado[i]):
+            self.rebotes += 1
+            return
+        self._armado[i] = 0
+
+        siguiente = (self._escritura + 1) % len(self._eventos)
+        if siguiente == self._lectura:
+            self.perdidos += 1
+            return
+        self._eventos[self._escritura] = i
+        self._marcas_us[self._escritura] = ticks_us()
+        self._escritura = siguiente
+
+    def pendientes(self):
+        """Cantidad de pulsaciones sin leer"""
+        return (self._escritura - self._lectura) % len(self._eventos)
+
+    def leer(self):
+        """Índice del siguiente botón presionado, o -1 si no hay"""
+        if self._lectura == self._escritura:
+            return -1
+        i = self._eventos[self._lectura]
+        self.latencias.registrar(ticks_diff(ticks_us(), self._marcas_us[self._lectura]))
+        self._lectura = (self._lectura + 1) % len(self._eventos)
+        return i
+
+    async def esperar(self):
+        """Esperar (sin sondeo) la siguiente pulsación; retorna su índice"""
+        while True:
+            i = self.leer()
+            if i >= 0:
+                return i
+            self.actividad = False
+            await self._flag.wait()
+
+    def esperar_actividad(self, timeout_ms=0):
+        """
+        Dormir la CPU hasta el próximo flanco (o timeout_ms si no es 0)
+
+        Para bucles sin asyncio: machine.idle() sólo despierta con
+        interrupciones.
+        """
+        inicio = ticks_ms()
+        while not self.actividad and self._lectura == self._escritura:
+            if timeout_ms and ticks_diff(ticks_ms(), inicio) >= timeout_ms:
+                break
+            machine.idle()
+        self.actividad = False
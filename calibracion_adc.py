@@ -0,0 +1,151 @@
+# ========================================
+# CALIBRACIÓN DEL ADC DEL PANEL
+# ========================================
+#
+# Puntos medidos (cuentas crudas, mV reales con el multímetro) guardados en
+# flash. Con ellos se arma una tabla por segmentos: cada 2**bits_segmento
+# cuentas hay un nodo en mV, y entre nodos se interpola con enteros. Con
+# dos puntos es una recta; con más se corrige la alinealidad del ADC del
+# ESP32 cerca de los extremos.
+
+from array import array
+
+ARCHIVO_CALIBRACION = "calibracion_adc.txt"
+MAX_CUENTAS = 4095  # ADC de 12 bits
+
+# Sin archivo: la fórmula anterior, 3.3 V / 4095 * 4.7. El divisor nominal
+# (68k + 20k) / 20k da 4.4; el 4.7 era un ajuste a mano que la calibración
+# reemplaza.
+PUNTOS_POR_DEFECTO = ((0, 0), (MAX_CUENTAS, 3300 * 47 // 10))
+
+class CalibracionADC:
+    """Conversión cuentas → mV por tabla segmentada, en enteros"""
+
+    def __init__(self, puntos=PUNTOS_POR_DEFECTO, bits_segmento=6):
+        """
+        Parámetros:
+        - puntos: Pares (cuentas, mV); con uno solo, recta desde (0, 0)
+        - bits_segmento: Cada segmento cubre 2**bits_segmento cuentas
+        """
+        self.bits = bits_segmento
+        self._mascara = (1 << bits_segmento) - 1
+        self.tabla = array('l', [0] * (((MAX_CUENTAS + 1) >> bits_segmento) + 1))
+        self.medidos = []   # Puntos de calibración (los que se guardan)
+        self.puntos = []    # Puntos de la tabla (con el ancla (0, 0) si hace falta)
+        self.construir(puntos)
+
+    def construir(self, puntos):
+        """Recalcular la tabla a partir de los puntos (lineal a tramos)"""
+        medidos = sorted(set(puntos))
+        puntos = medidos
+        if len(puntos) == 1 and puntos[0][0] > 0:
+            puntos = [(0, 0)] + puntos
+        if len(puntos) < 2:
+            raise ValueError("Hacen falta al menos dos puntos de calibración")
+        self.medidos = medidos
+        self.puntos = puntos
+
+        tramo = 0
+        for k in range(len(self.tabla)):
+            x = k << self.bits
+            # Tramo que contiene x (los extremos se extrapolan)
+            while tramo < len(puntos) - 2 and x > puntos[tramo + 1][0]:
+                tramo += 1
+            x0, y0 = puntos[tramo]
+            x1, y1 = puntos[tramo + 1]
+            y = y0 + ((y1 - y0) * (x - x0) + (x1 - x0) // 2) // (x1 - x0)
+            self.tabla[k] = max(0, y)
+
+    def convertir(self, cuentas):
+        """Cuentas crudas (0-4095) → mV, sin floats ni objetos nuevos"""
+        tabla = self.tabla
+        i = cuentas >> self.bits
+        a = tabla[i]
+        return a + ((tabla[i + 1] - a) * (cuentas & self._mascara) >> self.bits)
+
+    def agregar_punto(self, cuentas, mv):
+        """
+        Sumar una medición y recalcular la tabla
+
+        La primera medición reemplaza la calibración por defecto por una
+        recta desde (0, 0). Desde la segunda sólo cuentan los puntos
+        medidos: uno bajo y uno alto dan la recta de la placa (offset
+        incluido) y los siguientes agregan tramos.
+        """
+        base = self.medidos
+        if base == sorted(PUNTOS_POR_DEFECTO):
+            base = []
+        self.construir([p for p in base if p[0] != cuentas] + [(cuentas, mv)])
+
+    def guardar(self, archivo=ARCHIVO_CALIBRACION):
+        """Guardar los puntos en flash (una línea 'cuentas,mV' por punto)"""
+        try:
+            with open(archivo, "w") as f:
+                for cuentas, mv in self.medidos:
+                    f.write(f"{cuentas},{mv}\n")
+        except OSError:
+            print("⚠️ No se pudo guardar la calibración del ADC")
+
+    @classmethod
+    def cargar(cls, archivo=ARCHIVO_CALIBRACION, bits_segmento=6):
+        """Calibración guardada en flash, o la de por defecto si no hay"""
+        try:
+            with open(archivo) as f:
+                puntos = []
+                for linea in f:
+                    if linea.strip():
+                        cuentas, mv = linea.split(",")
+                        puntos.append((int(cuentas), int(mv)))
+            return cls(puntos, bits_segmento)
+        except (OSError, ValueError):
+            return cls(bits_segmento=bits_segmento)
+
+def medir_cuentas(adc, lecturas=64):
+    """Promedio de lecturas crudas para tomar un punto de calibración"""
+    suma = 0
+    for _ in range(lecturas):
+        suma += adc.read()
+    return suma // lecturas
+
+# Comparación en el host: python calibracion_adc.py
+if __name__ == "__main__":
+    import time
+
+    # ADC "real" simulado: comprimido cerca de los extremos, como el ESP32
+    def mv_reales(cuentas):
+        mv = cuentas * 3300 * 44 // 40950 + 150   # Divisor nominal 4.4 + offset
+        if cuentas < 300:
+            mv += (300 - cuentas) * 2
+        elif cuentas > 3800:
+            mv += (cuentas - 3800) * 3
+        return mv
+
+    formula = lambda c: c * (3.3 / 4095) * 4.7
+    dos = CalibracionADC(((300, mv_reales(300)), (3800, mv_reales(3800))))
+    multi = CalibracionADC([(c, mv_reales(c)) for c in (0, 150, 300, 2000, 3800, 3950, 4095)])
+
+    # Calibrar en la placa con agregar_punto: el ancla (0, 0) sólo vale
+    # mientras hay una medición
+    campo = CalibracionADC()
+    campo.agregar_punto(3800, mv_reales(3800))
+    assert campo.puntos[0] == (0, 0)
+    campo.agregar_punto(300, mv_reales(300))
+    assert campo.puntos == dos.puntos, campo.puntos
+
+    for nombre, convertir in (("fórmula 4.7", lambda c: int(formula(c) * 1000)),
+                              ("un punto", CalibracionADC([(3800, mv_reales(3800))]).convertir),
+                              ("dos puntos", dos.convertir), ("multipunto", multi.convertir)):
+        errores = [abs(convertir(c) - mv_reales(c)) for c in range(MAX_CUENTAS + 1)]
+        print(f"   {nombre:<12} error máx {max(errores):>5} mV, medio {sum(errores) // len(errores):>4} mV")
+
+    n = 100000
+    inicio = time.perf_counter()
+    for c in range(n):
+        formula(c & MAX_CUENTAS)
+    t_float = time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    for c in range(n):
+        multi.convertir(c & MAX_CUENTAS)
+    t_tabla = time.perf_counter() - inicio
+    print(f"📊 {n} conversiones: float {t_float * 1e6 / n:.2f} µs, tabla {t_tabla * 1e6 / n:.2f} µs "
+          f"(en el ESP32 la tabla no crea floats en el heap)")
@@ -0,0 +1,426 @@
+# ========================================
+# CALIDAD DEL ENLACE Y PERFILES LORA ADAPTATIVOS
+# ========================================
+#
+# Cada +RCV trae el RSSI y la SNR del paquete. MonitorEnlace los guarda
+# (y el resultado de cada intento) en arrays fijos y decide si conviene
+# un perfil más rápido (menos tiempo en el aire) o más robusto.
+#
+# Cambio coordinado (el transmisor decide, el receptor sigue):
+#   1. TX envía CMD_PERFIL(nuevo) con el perfil actual
+#   2. RX lo acusa y, cuando su acuse terminó de salir, pasa al nuevo
+#      (recién con el +OK de AT+PARAMETER; si no llega, sigue en el actual)
+#   3. TX recibe el acuse, pasa al nuevo y envía CMD_PERFIL(nuevo) otra vez
+#   4. RX recibe la confirmación en el perfil nuevo y lo acusa
+# Si 3 falla, TX vuelve al perfil anterior; si RX no recibe la
+# confirmación en TIEMPO_CONFIRMACION_MS, también vuelve. TX vuelve al
+# robusto cuando una trama se queda sin acuse; fuera del perfil robusto
+# repite CMD_PERFIL cada KEEPALIVE_MS sin tráfico, para que el silencio
+# sólo signifique enlace caído. Por eso RX vuelve al robusto tras
+# SILENCIOS_MS[perfil] sin oír nada: un keepalive más la ventana de
+# reintentos de TX en ese perfil, lo más que TX tarda en volver solo.
+
+if __name__ == "__main__":
+    try:
+        import simulacion   # Host: machine y time simulados
+        simulacion.instalar()
+    except ImportError:
+        pass
+
+from array import array
+from time import ticks_ms, ticks_diff, ticks_add
+import math
+
+from metricas import Latencias
+
+# Perfiles de AT+PARAMETER (SF, código de BW, CR, preámbulo), del más
+# rápido al más robusto. El último es el de fábrica del módulo.
+PERFILES = (
+    (7, 8, 1, 4),       # SF7, 250 kHz
+    (7, 7, 1, 4),       # SF7, 125 kHz
+    (9, 7, 1, 4),       # SF9, 125 kHz
+    (10, 7, 1, 4),      # SF10, 125 kHz
+    (12, 7, 1, 4),      # SF12, 125 kHz
+)
+PERFIL_ROBUSTO = len(PERFILES) - 1
+NOMBRES = ("SF7/250", "SF7/125", "SF9/125", "SF10/125", "SF12/125")
+
+# Comandos AT de cada perfil (se arman una sola vez)
+COMANDOS = tuple(b"AT+PARAMETER=%d,%d,%d,%d" % p for p in PERFILES)
+
+# Ancho de banda por código de AT+PARAMETER (kHz)
+ANCHOS_KHZ = (7.8, 10.4, 15.6, 20.8, 31.25, 41.7, 62.5, 125, 250, 500)
+
+# SNR mínima que demodula cada SF (décimas de dB, hoja de datos del SX1276)
+_SNR_MINIMA = {7: -75, 8: -100, 9: -125, 10: -150, 11: -175, 12: -200}
+
+def _ajuste_bw(bw):
+    """Décimas de dB de ruido extra de un BW respecto de 125 kHz"""
+    return round(100 * math.log10(ANCHOS_KHZ[bw] / 125))
+
+# SNR mínima de cada perfil referida a 125 kHz (décimas de dB)
+PISOS = array('h', [_SNR_MINIMA[p[0]] + _ajuste_bw(p[1]) for p in PERFILES])
+_AJUSTES = array('h', [_ajuste_bw(p[1]) for p in PERFILES])
+
+TIEMPO_CONFIRMACION_MS = 10000     # Receptor: espera de la confirmación
+TIMEOUT_PERFIL_MS = 1000           # Receptor: espera del +OK de AT+PARAMETER
+KEEPALIVE_MS = 4000                # Transmisor: CMD_PERFIL si no hay tráfico
+
+def tiempo_aire_ms(largo, perfil):
+    """Tiempo en el aire de largo bytes con un perfil (fórmula de Semtech)"""
+    sf, bw, cr, preambulo = PERFILES[perfil]
+    tsym_ms = (1 << sf) / ANCHOS_KHZ[bw]
+    optimizar = 1 if tsym_ms > 16 else 0
+    simbolos = 8 + max(math.ceil((8 * largo - 4 * sf + 28 + 16) / (4 * (sf - 2 * optimizar))) * (cr + 4), 0)
+    return int((preambulo + 4.25 + simbolos) * tsym_ms) + 1
+
+def rto_inicial_ms(perfil, largo=14):
+    """RTO de arranque en un perfil: ida y vuelta en el aire más margen"""
+    return 2 * tiempo_aire_ms(largo, perfil) + 100
+
+def ventana_reintentos_ms(perfil, intentos=4, rto_min_ms=200, rto_max_ms=10000, largo=14):
+    """
+    Lo más que tarda TX en dar una trama por perdida en un perfil
+
+    Cada intento es la trama en el aire más el RTO, que arranca en
+    rto_inicial_ms() y se duplica (los valores por defecto de Acuses).
+    """
+    rto = min(max(rto_inicial_ms(perfil, largo), rto_min_ms), rto_max_ms)
+    total = 0
+    for _ in range(intentos):
+        total += tiempo_aire_ms(largo, perfil) + rto
+        rto = min(rto * 2, rto_max_ms)
+    return total
+
+# Receptor: silencio que lo lleva al robusto, por perfil
+SILENCIOS_MS = array('L', [KEEPALIVE_MS + ventana_reintentos_ms(p) for p in range(len(PERFILES))])
+
+# RSSI y SNR viajan en el payload del acuse como bytes con signo
+def a_byte(valor):
+    """Entero con signo (-128..127, se satura) a byte"""
+    return max(-128, min(127, valor)) & 0xFF
+
+def con_signo(byte):
+    """Byte a entero con signo"""
+    return byte - 256 if byte > 127 else byte
+
+class MonitorEnlace:
+    """
+    Estadísticas móviles de RSSI, SNR y pérdidas en arrays fijos
+
+    Parámetros:
+    - ventana: Muestras que se promedian (y mínimas para subir de perfil)
+    - margen_bajar_db: Margen de SNR por debajo del cual se baja de perfil
+    - margen_subir_db: Margen que debe quedar en el perfil más rápido
+    - perdida_bajar: % de intentos perdidos que obliga a bajar
+    """
+
+    def __init__(self, ventana=8, margen_bajar_db=5, margen_subir_db=8, perdida_bajar=25):
+        self._rssi = array('h', [0] * ventana)
+        self._snr = array('h', [0] * ventana)    # Décimas de dB, referidas a 125 kHz
+        self._i = 0
+        self.muestras = 0
+        self._intentos = bytearray(ventana)      # 1 = acusado, 0 = perdido
+        self._j = 0
+        self.intentos = 0
+
+        self.margen_bajar = margen_bajar_db * 10
+        self.margen_subir = margen_subir_db * 10
+        self.perdida_bajar = perdida_bajar
+
+        self.ultimo_rssi = 0
+        self.ultimo_snr = 0
+
+        # Latencia de los comandos en cada perfil (ms)
+        self.latencias = [Latencias(32) for _ in PERFILES]
+        self.cambios = 0
+
+    def reiniciar(self):
+        """Olvidar las muestras (después de cambiar de perfil)"""
+        self.muestras = 0
+        self.intentos = 0
+        self._i = self._j = 0
+
+    def registrar(self, rssi, snr, perfil):
+        """Agregar una medición (dBm, dB) tomada con el perfil indicado"""
+        ventana = len(self._rssi)
+        self._rssi[self._i] = rssi
+        self._snr[self._i] = snr * 10 + _AJUSTES[perfil]
+        self._i = (self._i + 1) % ventana
+        self.muestras += 1
+
+    def registrar_linea(self, linea, largo, perfil):
+        """
+        Tomar RSSI y SNR de "+RCV=<dir>,<largo>,<datos>,<rssi>,<snr>"
+
+        Recorre la línea desde el final sin crear objetos.
+        Retorna: True si encontró los dos valores
+        """
+        valores = 0
+        valor = 0
+        signo = 1
+        escala = 1
+        rssi = snr = 0
+        for i in range(largo - 1, -1, -1):
+            c = linea[i]
+            if 48 <= c <= 57:
+                valor += (c - 48) * escala
+                escala *= 10
+            elif c == 45:  # '-'
+                signo = -1
+            elif c == 44:  # ','
+                if valores == 0:
+                    snr = signo * valor
+                else:
+                    rssi = signo * valor
+                    break
+                valores += 1
+                valor = 0
+                signo = 1
+                escala = 1
+            else:
+                return False
+        else:
+            return False
+        self.ultimo_rssi = rssi
+        self.ultimo_snr = snr
+        self.registrar(rssi, snr, perfil)
+        return True
+
+    def registrar_intento(self, acusado):
+        """Resultado de una transmisión: True si llegó el acuse"""
+        self._intentos[self._j] = 1 if acusado else 0
+        self._j = (self._j + 1) % len(self._intentos)
+        self.intentos += 1
+
+    def rssi_medio(self):
+        n = min(self.muestras, len(self._rssi))
+        return sum(self._rssi[:n]) // n if n else 0
+
+    def snr_media(self):
+        """SNR media en décimas de dB referida a 125 kHz"""
+        n = min(self.muestras, len(self._snr))
+        return sum(self._snr[:n]) // n if n else 0
+
+    def perdida(self):
+        """Porcentaje de intentos sin acuse en la ventana"""
+        n = min(self.intentos, len(self._intentos))
+        if not n:
+            return 0
+        return 100 - sum(self._intentos[:n]) * 100 // n
+
+    def evaluar(self, perfil):
+        """
+        Perfil recomendado a partir de las estadísticas
+
+        Baja (más robusto) con muchas pérdidas o poco margen de SNR, hasta
+        el primer perfil con margen suficiente; sube (más rápido) de a uno,
+        sólo con la ventana llena y margen de sobra en el perfil siguiente.
+        """
+        if self.muestras < 4 and self.intentos < 4:
+            return perfil
+        if perfil < PERFIL_ROBUSTO and self.intentos >= 4 and self.perdida() > self.perdida_bajar:
+            return perfil + 1
+        snr = self.snr_media()
+        if self.muestras >= 4:
+            nuevo = perfil
+            while nuevo < PERFIL_ROBUSTO and snr - PISOS[nuevo] < self.margen_bajar:
+                nuevo += 1
+            if nuevo != perfil:
+                return nuevo
+        if perfil > 0 and self.muestras >= len(self._snr) and self.perdida() == 0:
+            if snr - PISOS[perfil - 1] >= self.margen_subir:
+                return perfil - 1
+        return perfil
+
+    def reporte(self, perfil):
+        """Estado del enlace y latencia de comandos por perfil"""
+        print(f"📶 Enlace: {NOMBRES[perfil]} RSSI={self.rssi_medio()} dBm "
+              f"SNR={self.snr_media() / 10:.1f} dB pérdida={self.perdida()}% cambios={self.cambios}")
+        for i in range(len(PERFILES)):
+            lat = self.latencias[i]
+            if lat.cantidad:
+                p50, p90, p99 = lat.percentiles()
+                print(f"   {NOMBRES[i]:<9} comandos={lat.cantidad:<4} p50={p50} ms p99={p99} ms")
+
+class SeguidorPerfil:
+    """
+    Lado del receptor del cambio coordinado de perfil
+
+    solicitar() se llama al recibir CMD_PERFIL; paso() desde el bucle
+    principal, con el parser AT libre, aplica el cambio cuando el acuse ya
+    salió y vuelve atrás si no llega la confirmación o si hay silencio.
+    El perfil cambia recién con el +OK de AT+PARAMETER; con +ERR o sin
+    respuesta se queda el anterior y se cuenta en fallos.
+    """
+
+    def __init__(self):
+        self.perfil = PERFIL_ROBUSTO
+        self.anterior = PERFIL_ROBUSTO
+        self.pendiente = -1         # Perfil a aplicar después del acuse
+        self._confirmar_hasta = 0
+        self._esperando = False     # Aplicado pero sin confirmar
+        self._ultimo_rx = ticks_ms()
+        self.cambios = 0
+        self.vueltas_atras = 0
+        self.fallos = 0             # AT+PARAMETER con +ERR o sin respuesta
+
+        # AT+PARAMETER en curso: perfil enviado (-1 = ninguno) y su envío
+        self._en_curso = -1
+        self._confirmar = False
+        self._envio = 0             # parser_at.enviados al mandarlo
+        self._enviado_en = 0
+        self._pausa_hasta = self._ultimo_rx
+        self._resincronizar = False # Reenviar el perfil actual tras un timeout
+
+    def recibido(self):
+        """Llamar con cada trama válida"""
+        self._ultimo_rx = ticks_ms()
+
+    def solicitar(self, perfil):
+        """CMD_PERFIL recibido: cambio pedido o confirmación"""
+        if not 0 <= perfil <= PERFIL_ROBUSTO:
+            return
+        if perfil == self.perfil:
+            self._esperando = False
+        else:
+            self.pendiente = perfil
+
+    def paso(self, parser_at, acuse_enviado):
+        """
+        Avanzar sin bloquear
+
+        Parámetros:
+        - parser_at: ParserAT del módulo (sólo se usa si no hay comando en curso)
+        - acuse_enviado: True si no queda ningún acuse por enviar
+
+        Retorna: True si envió un AT+PARAMETER
+        """
+        ahora = ticks_ms()
+        if self._en_curso >= 0:
+            self._respuesta(parser_at, ahora)
+            return False
+        if parser_at.pendiente or ticks_diff(ahora, self._pausa_hasta) < 0:
+            return False
+        if self.pendiente >= 0:
+            if not acuse_enviado:
+                return False
+            return self._aplicar(parser_at, self.pendiente, True, ahora)
+        if self._esperando and ticks_diff(ahora, self._confirmar_hasta) >= 0:
+            print("↩️ Sin confirmación del nuevo perfil, se vuelve al anterior")
+            return self._aplicar(parser_at, self.anterior, False, ahora)
+        if self.perfil != PERFIL_ROBUSTO and ticks_diff(ahora, self._ultimo_rx) >= SILENCIOS_MS[self.perfil]:
+            print("↩️ Enlace en silencio, se vuelve al perfil robusto")
+            return self._aplicar(parser_at, PERFIL_ROBUSTO, False, ahora)
+        if self._resincronizar:
+            return self._aplicar(parser_at, self.perfil, False, ahora)
+        return False
+
+    def _aplicar(self, parser_at, perfil, confirmar, ahora):
+        """Enviar AT+PARAMETER; el perfil se adopta en _respuesta()"""
+        if confirmar:
+            self.pendiente = -1
+        self._en_curso = perfil
+        self._confirmar = confirmar
+        self._resincronizar = False
+        self._enviado_en = ahora
+        parser_at.enviar(COMANDOS[perfil])
+        self._envio = parser_at.enviados
+        return True
+
+    def _respuesta(self, parser_at, ahora):
+        """Adoptar el perfil con +OK; con +ERR o timeout quedarse con el anterior"""
+        if parser_at.enviados != self._envio:
+            resultado = None    # Otro comando ocupó el parser: respuesta perdida
+        elif parser_at.pendiente:
+            if ticks_diff(ahora, self._enviado_en) < TIMEOUT_PERFIL_MS:
+                return
+            parser_at.pendiente = False
+            resultado = None
+        else:
+            resultado = parser_at.resultado
+        perfil = self._en_curso
+        self._en_curso = -1
+
+        if resultado is not True:
+            # El módulo sigue en el perfil anterior (+ERR) o no se sabe en
+            # cuál quedó (sin respuesta): se reenvía el actual más tarde
+            self.fallos += 1
+            self._pausa_hasta = ticks_add(ahora, TIMEOUT_PERFIL_MS)
+            self._resincronizar = resultado is None
+            print(f"⚠️ AT+PARAMETER {NOMBRES[perfil]} sin +OK, sigue {NOMBRES[self.perfil]}")
+            return
+
+        if self._confirmar:
+            self.anterior = self.perfil
+            self._esperando = True
+            self._confirmar_hasta = ticks_add(ahora, TIEMPO_CONFIRMACION_MS)
+        elif perfil != self.perfil:
+            self._esperando = False
+            self.vueltas_atras += 1
+        if self.pendiente == perfil:
+            # La confirmación llegó antes de procesar el +OK
+            self.pendiente = -1
+            self._esperando = False
+        if perfil != self.perfil:
+            self.perfil = perfil
+            self._ultimo_rx = ahora
+            self.cambios += 1
+            print(f"📶 Perfil {NOMBRES[perfil]}")
+
+if __name__ == "__main__":
+    from time import sleep_ms
+
+    class ParserFalso:
+        """Lo que SeguidorPerfil usa de ParserAT; responder() simula el módulo"""
+
+        def __init__(self):
+            self.pendiente = False
+            self.resultado = None
+            self.enviados = 0
+            self.ultimo = None
+
+        def enviar(self, cmd):
+            self.pendiente = True
+            self.resultado = None
+            self.enviados += 1
+            self.ultimo = cmd
+
+        def responder(self, ok):
+            self.pendiente = False
+            self.resultado = ok
+
+    parser = ParserFalso()
+    seguidor = SeguidorPerfil()
+
+    # +OK: el perfil cambia recién con la respuesta del módulo
+    seguidor.solicitar(2)
+    assert seguidor.paso(parser, True) and seguidor.perfil == PERFIL_ROBUSTO
+    parser.responder(True)
+    seguidor.paso(parser, True)
+    assert seguidor.perfil == 2 and seguidor.cambios == 1
+    seguidor.solicitar(2)   # Confirmación del transmisor en el perfil nuevo
+    print(f"✅ +OK: perfil {NOMBRES[seguidor.perfil]} adoptado después de la respuesta")
+
+    # +ERR: el módulo sigue en el perfil anterior y se pausa antes de otro intento
+    seguidor.solicitar(0)
+    seguidor.paso(parser, True)
+    parser.responder(False)
+    seguidor.paso(parser, True)
+    assert seguidor.perfil == 2 and seguidor.fallos == 1 and not seguidor.paso(parser, True)
+    print(f"✅ +ERR: sigue en {NOMBRES[seguidor.perfil]}, fallos={seguidor.fallos}")
+
+    # Sin respuesta: se cuenta el fallo y, tras la pausa, se reenvía el
+    # perfil actual porque no se sabe en cuál quedó el módulo
+    sleep_ms(TIMEOUT_PERFIL_MS)
+    seguidor.solicitar(1)
+    seguidor.paso(parser, True)
+    sleep_ms(TIMEOUT_PERFIL_MS)
+    seguidor.paso(parser, True)
+    assert seguidor.perfil == 2 and seguidor.fallos == 2 and not parser.pendiente
+    sleep_ms(TIMEOUT_PERFIL_MS)
+    assert seguidor.paso(parser, True) and parser.ultimo == COMANDOS[2]
+    parser.responder(True)
+    seguidor.paso(parser, True)
+    assert seguidor.perfil == 2 and seguidor.cambios == 1 and not seguidor.paso(parser, True)
+    print(f"✅ Sin respuesta: {COMANDOS[2].decode()} reenviado, fallos={seguidor.fallos}")
@@ -1,42 +1,142 @@
 from machine import Pin
+import asyncio
 import time
-import math
+from banco_reles import BancoReles
 
 # Pines
 in1 = Pin(0, Pin.OUT)
 in2 = Pin(2, Pin.OUT)
-rele1=Pin(4,Pin.OUT)
-rele2=Pin(13,Pin.OUT)
+# Relés: motor (pin 4, activo en LOW) y habilitación de puertas (pin 13)
+banco = BancoReles(((4, True), 13))
+RELE_MOTOR = 0
+RELE_PUERTAS = 1
+
+def rele_puertas(estado):
+ banco.poner(RELE_PUERTAS, estado)
+ banco.aplicar()
 
 def cerrar_puertas():
  print("cerrar puertas")
- rele2.on()
+ rele_puertas(True)
  time.sleep_ms(200)
  in1.on()
  in2.off()
  time.sleep_ms(200)
- rele2.off()
+ rele_puertas(False)
 
 
 def abrir_puertas():
  print("abrir puertas")
- rele2.on()
+ rele_puertas(True)
  time.sleep_ms(200)
  in1.off()
  in2.on()
  time.sleep_ms(200)
- rele2.off()
+ rele_puertas(False)
  
 def apagar_motor():
-  rele1.on()
+  banco.desactivar(RELE_MOTOR)
+  banco.aplicar()
 
 def encender_motor():
-   rele1.off()
+   banco.activar(RELE_MOTOR)
+   banco.aplicar()
 
 def apagar():
     in1.off()
     in2.off()
-  
 
 
-abrir_puertas()
\ No newline at end of file
+# Versiones async: la pausa del relé cede el control en lugar de bloquear
+async def cerrar_puertas_async():
+ print("cerrar puertas")
+ rele_puertas(True)
+ await asyncio.sleep_ms(200)
+ in1.on()
+ in2.off()
+ await asyncio.sleep_ms(200)
+ rele_puertas(False)
+
+
+async def abrir_puertas_async():
+ print("abrir puertas")
+ rele_puertas(True)
+ await asyncio.sleep_ms(200)
+ in1.off()
+ in2.on()
+ await asyncio.sleep_ms(200)
+ rele_puertas(False)
+
+
+class Actuador:
+    """
+    Recuerda el último estado pedido y sólo mueve el hardware en los cambios
+
+    Los pedidos repetidos no tocan los relés. Con permanencia_ms, un cambio
+    llegado antes de ese tiempo se posterga (el siguiente pedido lo aplica).
+    """
+
+    def __init__(self, nombre, activar, desactivar, permanencia_ms=0):
+        """
+        Parámetros:
+        - nombre: Nombre para el reporte
+        - activar/desactivar: Funciones (normales o async) que mueven el hardware
+        - permanencia_ms: Tiempo mínimo en un estado antes de cambiarlo
+        """
+        self.nombre = nombre
+        self._activar = activar
+        self._desactivar = desactivar
+        self.permanencia_ms = permanencia_ms
+
+        self.estado = None  # Desconocido hasta el primer pedido
+        self._ultimo_cambio = time.ticks_ms()
+
+        # Contadores
+        self.actuaciones = 0
+        self.repetidos = 0
+        self.postergados = 0
+
+    def _debe_actuar(self, estado):
+        if estado == self.estado:
+            self.repetidos += 1
+            return False
+        if self.estado is not None and time.ticks_diff(time.ticks_ms(), self._ultimo_cambio) < self.permanencia_ms:
+            self.postergados += 1
+            return False
+        self.estado = estado
+        self._ultimo_cambio = time.ticks_ms()
+        self.actuaciones += 1
+        return True
+
+    def pedir(self, estado):
+        """Pedir un estado (True = activar); retorna True si movió el hardware"""
+        if not self._debe_actuar(estado):
+            return False
+        if estado:
+            self._activar()
+        else:
+            self._desactivar()
+        return True
+
+    async def pedir_async(self, estado):
+        """Igual que pedir(), para acciones async"""
+        if not self._debe_actuar(estado):
+            return False
+        if estado:
+            await self._activar()
+        else:
+            await self._desactivar()
+        return True
+
+    def reporte(self):
+        print(f"   {self.nombre:<10} estado={self.estado} actuaciones={self.actuaciones} "
+              f"repetidos={self.repetidos} postergados={self.postergados}")
+
+
+# Actuadores con caché de estado: True = abrir puertas / encender motor
+puertas = Actuador("puertas", abrir_puertas_async, cerrar_puertas_async, permanencia_ms=1000)
+motor = Actuador("motor", encender_motor, apagar_motor)
+
+
+if __name__ == "__main__":
+  abrir_puertas()
\ No newline at end of file
@@ -0,0 +1,176 @@
+# ========================================
+# DESPACHADOR DE COMANDOS POR TABLA
+# ========================================
+#
+# Cada código de comando tiene precalculada la máscara de relés de un
+# BancoReles y el duty del PWM. Aplicar un comando es fijar la máscara y
+# escribirla (W1TC/W1TS una vez cada uno), sin recorrer Pins ni dormir.
+
+if __name__ == "__main__":
+    try:
+        import simulacion   # Host: machine y time simulados
+        simulacion.instalar()
+    except ImportError:
+        pass
+
+from array import array
+
+from banco_reles import BancoReles, RegistroFalso
+
+class Despachador:
+    """
+    Tabla código → (máscara de relés, duty PWM)
+
+    Los enclavamientos son los del banco; se comprueban al definir cada
+    comando, así aplicar() no tiene que hacerlo. El banco apaga primero y
+    enciende después, de modo que un relé nunca se activa junto con su par
+    todavía encendido; si el par se acaba de apagar, el encendido espera
+    el tiempo muerto del banco y lo completa un banco.aplicar() posterior.
+    """
+
+    def __init__(self, banco, pwm=None, capacidad=8):
+        """
+        Parámetros:
+        - banco: BancoReles con los relés del motor
+        - pwm: PWM de velocidad (opcional)
+        - capacidad: Códigos posibles (0 .. capacidad-1)
+        """
+        self.banco = banco
+        self.pwm = pwm
+
+        self._mascaras = array('L', [0] * capacidad)
+        self._duties = array('H', [0] * capacidad)
+        self._definidos = bytearray(capacidad)
+
+        self.duty = 0
+
+        # Estadísticas
+        self.despachos = 0
+        self.rechazados = 0
+
+    def definir(self, codigo, reles, duty=0):
+        """
+        Precalcular un comando
+
+        Parámetros:
+        - codigo: Código del comando
+        - reles: Índices (en el banco) de los relés a encender
+        - duty: Duty del PWM (0-1023)
+        """
+        mascara = 0
+        for i in reles:
+            mascara |= 1 << i
+        if not self.banco.permitido(mascara):
+            raise ValueError(f"Comando {codigo}: relés {reles} violan el enclavamiento")
+        self._mascaras[codigo] = mascara
+        self._duties[codigo] = duty
+        self._definidos[codigo] = 1
+
+    def aplicar(self, codigo):
+        """Aplicar un comando definido; retorna False si no existe"""
+        if codigo >= len(self._definidos) or not self._definidos[codigo]:
+            self.rechazados += 1
+            return False
+
+        banco = self.banco
+        banco.deseado = self._mascaras[codigo]  # Ya validada en definir()
+        banco.aplicar()
+
+        duty = self._duties[codigo]
+        if self.pwm is not None and duty != self.duty:
+            self.pwm.duty(duty)
+        self.duty = duty
+
+        self.despachos += 1
+        return True
+
+    def apagar_todo(self):
+        """Apagar todos los relés y el PWM, sin importar el estado anotado"""
+        self.banco.apagar_todo()
+        if self.pwm is not None:
+            self.pwm.duty(0)
+        self.duty = 0
+
+# Benchmark en el host: python despachador.py
+if __name__ == "__main__":
+    import time
+
+    class PWMFalso:
+        def __init__(self):
+            self.valor = 0
+
+        def duty(self, valor=None):
+            if valor is None:
+                return self.valor
+            self.valor = valor
+
+    registro = RegistroFalso()
+    # Sin tiempo muerto: se mide sólo el despacho
+    banco = BancoReles((2, 4, 5, 18), registro=registro, tiempo_muerto_ms=0)
+    banco.enclavar(0, 2)
+    banco.enclavar(1, 3)
+    despachador = Despachador(banco, PWMFalso())
+    despachador.definir(0, ())                # Detener
+    despachador.definir(1, (0, 3), 512)       # Derecha
+    despachador.definir(2, (0, 1), 512)       # Adelante
+    despachador.definir(3, (1, 2), 512)       # Izquierda
+    despachador.definir(4, (2, 3), 512)       # Atrás
+
+    try:
+        despachador.definir(7, (0, 2))
+    except ValueError as e:
+        print(f"✅ Enclavamiento: {e}")
+
+    n = 200000
+    codigos = bytes((2, 4, 1, 3, 0) * (n // 5))
+    inicio = time.perf_counter()
+    for codigo in codigos:
+        despachador.aplicar(codigo)
+    total = time.perf_counter() - inicio
+
+    print(f"📊 {n} despachos en {total:.3f}s: {n / total:.0f}/s, {total / n * 1e6:.2f} µs cada uno")
+    print(f"   escrituras de registro: {registro.escrituras}, salida final: {registro.salida:#x}")
+
+    # Tiempo muerto: ADELANTE → ATRÁS apaga en seguida y enciende
+    # tiempo_muerto_ms después
+    registro = RegistroFalso()
+    banco = BancoReles((2, 4, 5, 18), registro=registro)
+    banco.enclavar(0, 2)
+    banco.enclavar(1, 3)
+    muerto = banco.tiempo_muerto_ms
+    despachador = Despachador(banco)
+    despachador.definir(0, ())
+    despachador.definir(1, (0, 3))
+    despachador.definir(2, (0, 1))
+    despachador.definir(4, (2, 3))
+    despachador.aplicar(2)
+    despachador.aplicar(4)
+    assert registro.salida == 0 and banco.pendiente()
+    time.sleep_ms(muerto - 1)
+    banco.aplicar()
+    assert registro.salida == 0
+    time.sleep_ms(1)
+    banco.aplicar()
+    assert registro.salida == (1 << 5 | 1 << 18) and not banco.pendiente()
+    print(f"✅ Tiempo muerto: ATRÁS encendido {muerto} ms después de apagar ADELANTE")
+
+    # Desde reposo no hay espera: el par no estuvo encendido en la ventana
+    despachador.aplicar(0)
+    time.sleep_ms(muerto)
+    despachador.aplicar(2)
+    assert registro.salida == (1 << 2 | 1 << 4) and banco.diferidos == 1
+    # Cada relé cuenta su propia ventana: el 0 se apaga antes que el 1, así
+    # que el 2 (su par) puede encenderse mientras el 3 todavía espera
+    banco.desactivar(0)
+    banco.aplicar()
+    time.sleep_ms(muerto // 2)
+    banco.desactivar(1)
+    banco.aplicar()
+    time.sleep_ms(muerto - muerto // 2)
+    banco.fijar(1 << 2 | 1 << 3)
+    banco.aplicar()
+    assert registro.salida == 1 << 5 and banco.pendiente()
+    time.sleep_ms(muerto // 2)
+    banco.aplicar()
+    assert registro.salida == (1 << 5 | 1 << 18) and not banco.pendiente()
+    print(f"✅ Tiempo muerto sólo en inversiones: diferidos={banco.diferidos}")
@@ -0,0 +1,189 @@
+# ========================================
+# PARSER AT INCREMENTAL PARA EL MÓDULO LORA
+# ========================================
+#
+# Acumula los bytes de la UART en un buffer circular y entrega líneas
+# completas terminadas en \r\n, sin pausas fijas:
+#   - "+OK", "+ERR=<n>" y las respuestas a consultas ("+ADDRESS=1", ...)
+#     completan el comando pendiente
+#   - "+RCV=..." se entrega al callback al_recibir(linea, largo)
+#   - "+READY" y líneas sin comando pendiente se ignoran
+
+import asyncio
+import time
+
+class ParserAT:
+    """Parser de respuestas AT por líneas sobre un buffer circular"""
+
+    def __init__(self, uart, al_recibir=None, tam_anillo=256, tam_linea=128):
+        """
+        Parámetros:
+        - uart: UART conectada al módulo LoRa
+        - al_recibir: Función (linea, largo) para las líneas +RCV
+        - tam_anillo: Tamaño del buffer circular de recepción
+        - tam_linea: Largo máximo de una línea
+        """
+        self.uart = uart
+        self.al_recibir = al_recibir
+
+        self._anillo = bytearray(tam_anillo)
+        self._mv_anillo = memoryview(self._anillo)
+        self._escritura = 0   # Próxima posición a escribir
+        self._lectura = 0     # Próxima posición a leer
+        self._ocupados = 0
+
+        self.linea = bytearray(tam_linea)
+        self._mv_linea = memoryview(self.linea)
+        self._largo = 0
+
+        # Comando en curso
+        self.pendiente = False
+        self.resultado = None   # True (+OK/respuesta), False (+ERR), None
+        self.codigo_error = 0
+        self.largo_respuesta = 0
+        self._respuesta = bytearray(tam_linea)
+        self._mv_respuesta = memoryview(self._respuesta)
+
+        # Estadísticas
+        self.lineas = 0
+        self.desbordes = 0
+        self.enviados = 0     # Comandos escritos (distingue uno de otro)
+
+    def alimentar(self):
+        """
+        Pasar a las líneas todo lo que haya llegado por la UART
+
+        Retorna: número de líneas completas procesadas
+        """
+        procesadas = 0
+        while self.uart.any():
+            self._leer_uart()
+            procesadas += self._extraer_lineas()
+        return procesadas
+
+    def _leer_uart(self):
+        """Leer la UART en el espacio libre del anillo (hasta el final del buffer)"""
+        tam = len(self._anillo)
+        libre = tam - self._ocupados
+        if not libre:
+            # Anillo lleno sin fin de línea: descartar lo acumulado
+            self._lectura = self._escritura
+            self._ocupados = 0
+            self._largo = 0
+            self.desbordes += 1
+            libre = tam
+        contiguo = min(libre, tam - self._escritura, self.uart.any())
+        inicio = self._escritura
+        n = self.uart.readinto(self._mv_anillo[inicio:inicio + contiguo], contiguo) or 0
+        self._escritura = (inicio + n) % tam
+        self._ocupados += n
+
+    def _extraer_lineas(self):
+        """Mover bytes del anillo a la línea actual; procesar cada \\n"""
+        anillo = self._anillo
+        tam = len(anillo)
+        linea = self.linea
+        procesadas = 0
+        while self._ocupados:
+            byte = anillo[self._lectura]
+            self._lectura = (self._lectura + 1) % tam
+            self._ocupados -= 1
+            if byte == 10:  # '\n'
+                largo = self._largo
+                if largo and linea[largo - 1] == 13:  # quitar '\r'
+                    largo -= 1
+                self._largo = 0
+                if largo:
+                    self._procesar_linea(largo)
+                    procesadas += 1
+            elif self._largo < len(linea):
+                linea[self._largo] = byte
+                self._largo += 1
+            else:
+                self.desbordes += 1
+        return procesadas
+
+    def _empieza(self, prefijo, largo):
+        """¿La línea actual empieza con el prefijo?"""
+        if largo < len(prefijo):
+            return False
+        linea = self.linea
+        for i in range(len(prefijo)):
+            if linea[i] != prefijo[i]:
+                return False
+        return True
+
+    def _procesar_linea(self, largo):
+        """Clasificar una línea completa"""
+        self.lineas += 1
+        if self._empieza(b"+RCV=", largo):
+            if self.al_recibir:
+                self.al_recibir(self.linea, largo)
+            return
+        if not self.pendiente or self._empieza(b"+READY", largo):
+            return
+
+        # Respuesta al comando pendiente
+        self._mv_respuesta[:largo] = self._mv_linea[:largo]
+        self.largo_respuesta = largo
+        if self._empieza(b"+ERR=", largo):
+            self.codigo_error = 0
+            for i in range(5, largo):
+                c = self.linea[i]
+                if 48 <= c <= 57:
+                    self.codigo_error = self.codigo_error * 10 + c - 48
+            self.resultado = False
+        else:
+            self.resultado = True
+        self.pendiente = False
+
+    def respuesta_raw(self):
+        """Bytes de la última respuesta (crea un objeto nuevo)"""
+        return bytes(self._mv_respuesta[:self.largo_respuesta])
+
+    def respuesta(self):
+        """Texto de la última respuesta (para mostrar; crea un string)"""
+        return self.respuesta_raw().decode()
+
+    def enviar(self, cmd):
+        """Escribir un comando (str, bytes o memoryview) y dejarlo pendiente"""
+        self.alimentar()  # Procesar lo que haya llegado antes
+        self.pendiente = True
+        self.resultado = None
+        self.largo_respuesta = 0
+        self.enviados += 1
+        self.uart.write(cmd)
+        self.uart.write(b"\r\n")
+
+    def comando(self, cmd, timeout_ms=1000):
+        """
+        Enviar un comando y esperar su respuesta, sin pausas fijas
+
+        Retorna: True (+OK o respuesta a consulta), False (+ERR) o None
+        (sin respuesta dentro del timeout)
+        """
+        self.enviar(cmd)
+        deadline = time.ticks_add(time.ticks_ms(), timeout_ms)
+        while self.pendiente:
+            self.alimentar()
+            if not self.pendiente:
+                break
+            if time.ticks_diff(deadline, time.ticks_ms()) <= 0:
+                self.pendiente = False
+                return None
+            time.sleep_ms(1)
+        return self.resultado
+
+    async def comando_async(self, cmd, timeout_ms=1000):
+        """Igual que comando(), pero cede el control mientras espera"""
+        self.enviar(cmd)
+        deadline = time.ticks_add(time.ticks_ms(), timeout_ms)
+        while self.pendiente:
+            self.alimentar()
+            if not self.pendiente:
+                break
+            if time.ticks_diff(deadline, time.ticks_ms()) <= 0:
+                self.pendiente = False
+                return None
+            await asyncio.sleep_ms(1)
+        return self.resultado
@@ -4,67 +4,71 @@
 #pin39
 import asyncio
 from machine import Pin
-from control_de_motores import abrir_puertas, cerrar_puertas, apagar_motor, encender_motor
+from control_de_motores import puertas, motor
 from sensor import load_data
-from biometrico import auto_detect_fingerprint
-from avdc import Adc
+from biometrico import auto_detect_fingerprint, MaquinaHuella
+from avdc import leer_panel
+from planificador import Planificador
+from alarma import reproductor, ALARMA, PRIORIDAD_ALARMA
 
 in1 = Pin(36, Pin.IN)
 in2 = Pin(35, Pin.IN)
 finger = auto_detect_fingerprint()
+maquina_huella = MaquinaHuella(finger)
+planificador = Planificador()
 
-async def tarea_sensores():
-    """Tarea para leer sensores"""
-    while True:
-        load_data()
-        await asyncio.sleep(1) 
+def paso_sensores():
+    """Leer sensores"""
+    load_data()
 
-async def tarea_puertas():
-    """Tarea para controlar puertas"""
-    while True:
-        if in1.on():
-            abrir_puertas()
-        else:
-            cerrar_puertas()
-        await asyncio.sleep(0.1) 
+async def paso_puertas():
+    """Controlar puertas (sólo actúa cuando cambia la entrada)"""
+    await puertas.pedir_async(in1.value() == 1)
 
-async def tarea_motor():
-    """Tarea para controlar motor"""
-    while True:
-        if in2.on():
-            encender_motor()
-        else:
-            apagar_motor()
-        await asyncio.sleep(0.1)
-async def tarea_motor():
-    """Tarea para cambio de tension del panel"""
-    while True:
-        Adc()    
+def paso_motor():
+    """Controlar motor (sólo actúa cuando cambia la entrada)"""
+    motor.pedir(in2.value() == 1)
+
+def paso_panel():
+    """Tensión del panel: ráfaga filtrada con histéresis en el relé"""
+    leer_panel()
+
+contador = 0
 
-async def tarea_biometrico():
-    """Tarea para detector biométrico"""
-    while True:
-        finger_id = finger.get_fingerprint()
-        if finger_id== True:
+def paso_biometrico():
+    """Detector biométrico (máquina de estados, no bloquea)"""
+    global contador
+    resultado = maquina_huella.paso()
+    if resultado:
+        codigo, finger_id, confianza = resultado
+        if codigo == finger.FINGERPRINT_OK:
             print(f"Bienvenido usuario {finger_id}")
-            encender_motor()
+            reproductor.detener()
+            motor.pedir(True)
+            contador = 0
         else:
-            contador=+1
-            if contador>=4:
-                print("alarma") 
+            contador += 1
+            if contador >= 4:
+                print("alarma")
+                # Suena en segundo plano: las demás tareas siguen corriendo
+                reproductor.tocar(ALARMA, PRIORIDAD_ALARMA)
 
-        await asyncio.sleep(0.2)  # Cada 200ms
+def paso_reporte():
+    """Métricas del planificador y de los actuadores"""
+    planificador.reporte()
+    puertas.reporte()
+    motor.reporte()
+
+# Tareas: nombre, paso, período (ms), plazo (ms)
+planificador.agregar("sensores", paso_sensores, 1000, 50)
+planificador.agregar("puertas", paso_puertas, 100, 500)
+planificador.agregar("motor", paso_motor, 100, 5)
+planificador.agregar("panel", paso_panel, 100, 5)
+planificador.agregar("biometrico", paso_biometrico, 20, 10)
+planificador.agregar("alarma", reproductor.paso, 10, 2)
+planificador.agregar("reporte", paso_reporte, 30000, 100)
 
 async def main():
-    
-    await asyncio.gather(
-        tarea_sensores(),
-        tarea_puertas(),
-        tarea_motor(),
-        tarea_biometrico()
-    )
+    await planificador.ejecutar()
 
 asyncio.run(main())
-
-
-
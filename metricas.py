@@ -0,0 +1,40 @@
+# ========================================
+# MÉTRICAS DE LATENCIA
+# ========================================
+
+from array import array
+
+class Latencias:
+    """
+    Guarda las últimas N latencias en un array fijo
+
+    registrar() no crea objetos; sólo los percentiles ordenan una copia.
+    """
+
+    def __init__(self, capacidad=64):
+        self._muestras = array('L', [0] * capacidad)
+        self._siguiente = 0
+        self.cantidad = 0   # Total registrado (no sólo las guardadas)
+        self.suma = 0
+        self.maximo = 0
+
+    def registrar(self, valor):
+        """Agregar una muestra (entero no negativo)"""
+        self._muestras[self._siguiente] = valor
+        self._siguiente = (self._siguiente + 1) % len(self._muestras)
+        self.cantidad += 1
+        self.suma += valor
+        if valor > self.maximo:
+            self.maximo = valor
+
+    def media(self):
+        """Media de todas las muestras registradas"""
+        return self.suma / self.cantidad if self.cantidad else 0
+
+    def percentiles(self, ps=(50, 90, 99)):
+        """Percentiles de las muestras guardadas, como tupla"""
+        n = min(self.cantidad, len(self._muestras))
+        if not n:
+            return tuple(0 for _ in ps)
+        ordenadas = sorted(self._muestras[:n])
+        return tuple(ordenadas[min(n - 1, p * n // 100)] for p in ps)
@@ -50,5 +50,6 @@ def loop():
         sleep(5)  # Esperar 5 segundos antes de enviar el siguiente mensaje
 
 # Llamar a las funciones de configuración y bucle principal
-setup()
-loop()
+if __name__ == "__main__":
+    setup()
+    loop()
@@ -0,0 +1,133 @@
+# ========================================
+# PLANIFICADOR COOPERATIVO CON PLAZOS
+# ========================================
+#
+# Cada tarea periódica tiene un período y un plazo. Se mide cuánto tarda
+# cada paso y con cuánto retraso arranca (jitter), y se cuentan los pasos
+# que exceden el plazo.
+
+if __name__ == "__main__":
+    try:
+        import simulacion   # Host: machine y time simulados
+        simulacion.instalar()
+    except ImportError:
+        pass
+
+import asyncio
+import time
+from time import ticks_us, ticks_diff, ticks_add
+
+from metricas import Latencias
+
+class TareaPeriodica:
+    """Una tarea registrada en el Planificador"""
+
+    def __init__(self, nombre, paso, periodo_ms, plazo_ms):
+        self.nombre = nombre
+        self.paso = paso
+        self.periodo_ms = periodo_ms
+        self.plazo_ms = plazo_ms
+
+        self.ejecuciones = 0
+        self.excesos = 0         # Pasos que tardaron más que el plazo
+        self.saltos = 0          # Períodos perdidos por pasos largos
+        self.duraciones = Latencias()  # µs por paso
+        self.jitter = Latencias()      # µs de retraso al arrancar
+
+    async def bucle(self):
+        """Ejecutar el paso una vez por período"""
+        periodo_us = self.periodo_ms * 1000
+        plazo_us = self.plazo_ms * 1000
+        proximo = ticks_us()
+
+        while True:
+            inicio = ticks_us()
+            self.jitter.registrar(max(0, ticks_diff(inicio, proximo)))
+
+            resultado = self.paso()
+            if resultado is not None and hasattr(resultado, "send"):
+                await resultado  # Paso async
+
+            duracion = ticks_diff(ticks_us(), inicio)
+            self.duraciones.registrar(duracion)
+            self.ejecuciones += 1
+            if duracion > plazo_us:
+                self.excesos += 1
+
+            # Siguiente activación; si ya pasó, resincronizar
+            proximo = ticks_add(proximo, periodo_us)
+            espera = ticks_diff(proximo, ticks_us())
+            if espera < 0:
+                self.saltos += -espera // periodo_us
+                proximo = ticks_us()
+                espera = 0
+            await asyncio.sleep_ms(espera // 1000)
+
+class Planificador:
+    """
+    Planificador de tareas periódicas sobre asyncio
+
+    Los pasos deben ser cortos o async: un paso síncrono que bloquea
+    retrasa a todas las tareas, y eso se ve en su jitter.
+    """
+
+    def __init__(self):
+        self.tareas = []
+
+    def agregar(self, nombre, paso, periodo_ms, plazo_ms=None):
+        """
+        Registrar una tarea periódica
+
+        Parámetros:
+        - nombre: Nombre para el reporte
+        - paso: Función (normal o async) que hace una iteración
+        - periodo_ms: Cada cuánto se ejecuta
+        - plazo_ms: Duración máxima esperada de un paso (por defecto el período)
+        """
+        tarea = TareaPeriodica(nombre, paso, periodo_ms, plazo_ms or periodo_ms)
+        self.tareas.append(tarea)
+        return tarea
+
+    async def ejecutar(self):
+        """Correr todas las tareas (no retorna)"""
+        await asyncio.gather(*[tarea.bucle() for tarea in self.tareas])
+
+    def reporte(self):
+        """Mostrar duración, jitter y excesos por tarea"""
+        print("📊 Planificador (µs)")
+        print(f"   {'tarea':<12}{'período':>9}{'pasos':>7}{'excesos':>9}{'saltos':>8}"
+              f"{'dur p50':>9}{'dur p99':>9}{'jit p50':>9}{'jit p90':>9}{'jit p99':>9}")
+        for t in self.tareas:
+            d50, d90, d99 = t.duraciones.percentiles()
+            j50, j90, j99 = t.jitter.percentiles()
+            print(f"   {t.nombre:<12}{t.periodo_ms:>7}ms{t.ejecuciones:>7}{t.excesos:>9}{t.saltos:>8}"
+                  f"{d50:>9}{d99:>9}{j50:>9}{j90:>9}{j99:>9}")
+
+# Simulación en el host: python planificador.py
+if __name__ == "__main__":
+    contador = [0]
+
+    def paso_rapido():
+        time.sleep_ms(1)   # Trabajo bloqueante
+
+    def paso_bloqueante():
+        # Como el Adc() original: de vez en cuando bloquea 30 ms
+        contador[0] += 1
+        time.sleep_ms(30 if contador[0] % 5 == 0 else 2)
+
+    async def paso_async():
+        # Como abrir_puertas_async: espera sin bloquear
+        await asyncio.sleep_ms(20)
+
+    planificador = Planificador()
+    planificador.agregar("rapida", paso_rapido, 10, 5)
+    planificador.agregar("bloqueante", paso_bloqueante, 50, 10)
+    planificador.agregar("async", paso_async, 100, 50)
+
+    async def simular(segundos):
+        tarea = asyncio.create_task(planificador.ejecutar())
+        await asyncio.sleep(segundos)
+        tarea.cancel()
+
+    asyncio.run(simular(3))
+    planificador.reporte()
@@ -0,0 +1,252 @@
+# ========================================
+# PROTOCOLO BINARIO PARA EL ENLACE LORA
+# ========================================
+#
+# Trama binaria:
+#   [0]      SYNC (0xA5)
+#   [1]      número de secuencia (0-255)
+#   [2]      comando
+#   [3]      largo del payload (0-MAX_PAYLOAD)
+#   [4..]    payload
+#   [último] CRC-8 (polinomio 0x07) de los bytes 1 .. fin del payload
+#
+# El módulo LoRa sólo acepta texto ASCII en AT+SEND, así que la trama viaja
+# en hexadecimal. Todas las funciones trabajan sobre buffers preasignados y
+# no crean strings.
+
+SYNC = 0xA5
+MAX_PAYLOAD = 16
+TAM_TRAMA = 4 + MAX_PAYLOAD + 1
+
+# Posiciones dentro de la trama binaria
+POS_SEQ = 1
+POS_CMD = 2
+POS_LARGO = 3
+POS_PAYLOAD = 4
+
+# Comandos del control remoto
+CMD_DETENER = 0
+CMD_DERECHA = 1
+CMD_ADELANTE = 2
+CMD_IZQUIERDA = 3
+CMD_ATRAS = 4
+CMD_POWER = 5
+CMD_ACK = 6         # Acuse de recibo: lleva el número de secuencia confirmado
+CMD_PERFIL = 7      # Cambio de perfil LoRa: payload [perfil] (ver calidad_enlace.py)
+
+_HEX = b"0123456789ABCDEF"
+
+def _tabla_crc8():
+    """Tabla CRC-8 (polinomio 0x07), se calcula una sola vez"""
+    tabla = bytearray(256)
+    for i in range(256):
+        crc = i
+        for _ in range(8):
+            if crc & 0x80:
+                crc = ((crc << 1) ^ 0x07) & 0xFF
+            else:
+                crc = (crc << 1) & 0xFF
+        tabla[i] = crc
+    return bytes(tabla)
+
+_CRC8 = _tabla_crc8()
+
+def crc8(buf, inicio, fin):
+    """CRC-8 de buf[inicio:fin]"""
+    crc = 0
+    tabla = _CRC8
+    for i in range(inicio, fin):
+        crc = tabla[crc ^ buf[i]]
+    return crc
+
+def _nibble(c):
+    """Valor de un dígito hexadecimal ASCII, o -1 si no es válido"""
+    if 48 <= c <= 57:
+        return c - 48
+    c |= 0x20  # minúscula
+    if 97 <= c <= 102:
+        return c - 87
+    return -1
+
+def _poner_hex(salida, j, byte):
+    """Escribir un byte como dos dígitos hexadecimales; retorna la nueva posición"""
+    salida[j] = _HEX[byte >> 4]
+    salida[j + 1] = _HEX[byte & 0x0F]
+    return j + 2
+
+def codificar(salida, seq, cmd, payload=b"", inicio=0):
+    """
+    Escribir una trama en hexadecimal en salida[inicio:]
+
+    Parámetros:
+    - salida: bytearray con espacio para 2 * TAM_TRAMA bytes
+    - seq: Número de secuencia (0-255)
+    - cmd: Comando (CMD_*)
+    - payload: Datos opcionales (hasta MAX_PAYLOAD bytes)
+
+    Retorna: cantidad de bytes escritos
+    """
+    largo = len(payload)
+    if largo > MAX_PAYLOAD:
+        raise ValueError("Payload demasiado largo")
+
+    seq &= 0xFF
+    crc = _CRC8[seq]
+    crc = _CRC8[crc ^ cmd]
+    crc = _CRC8[crc ^ largo]
+    for i in range(largo):
+        crc = _CRC8[crc ^ payload[i]]
+
+    j = _poner_hex(salida, inicio, SYNC)
+    j = _poner_hex(salida, j, seq)
+    j = _poner_hex(salida, j, cmd)
+    j = _poner_hex(salida, j, largo)
+    for i in range(largo):
+        j = _poner_hex(salida, j, payload[i])
+    j = _poner_hex(salida, j, crc)
+    return j - inicio
+
+def decodificar(entrada, inicio, fin, trama):
+    """
+    Decodificar una trama hexadecimal de entrada[inicio:fin]
+
+    Parámetros:
+    - entrada: bytes/bytearray con el texto recibido
+    - trama: bytearray de TAM_TRAMA bytes donde se deja la trama binaria
+
+    Retorna: largo del payload, o -1 si la trama no es válida
+    """
+    n = fin - inicio
+    if n < 10 or n & 1 or n > 2 * TAM_TRAMA:
+        return -1
+
+    j = 0
+    for i in range(inicio, fin, 2):
+        alto = _nibble(entrada[i])
+        bajo = _nibble(entrada[i + 1])
+        if alto < 0 or bajo < 0:
+            return -1
+        trama[j] = (alto << 4) | bajo
+        j += 1
+
+    largo = trama[POS_LARGO]
+    if trama[0] != SYNC or j != POS_PAYLOAD + largo + 1:
+        return -1
+    if crc8(trama, 1, j - 1) != trama[j - 1]:
+        return -1
+    return largo
+
+def _escribir_decimal(salida, j, valor):
+    """Escribir un entero no negativo en ASCII; retorna la nueva posición"""
+    if valor >= 100:
+        salida[j] = 48 + valor // 100
+        j += 1
+    if valor >= 10:
+        salida[j] = 48 + (valor // 10) % 10
+        j += 1
+    salida[j] = 48 + valor % 10
+    return j + 1
+
+def armar_send(salida, direccion, seq, cmd, payload=b""):
+    """
+    Armar el comando "AT+SEND=<direccion>,<largo>,<trama hex>" en salida
+
+    Retorna: cantidad de bytes escritos (sin el \\r\\n final)
+    """
+    j = 0
+    for c in b"AT+SEND=":
+        salida[j] = c
+        j += 1
+    j = _escribir_decimal(salida, j, direccion)
+    salida[j] = 44  # ','
+    j += 1
+    n = 2 * (POS_PAYLOAD + len(payload) + 1)
+    j = _escribir_decimal(salida, j, n)
+    salida[j] = 44
+    j += 1
+    return j + codificar(salida, seq, cmd, payload, j)
+
+def _buscar(datos, byte, inicio, fin):
+    """Posición de byte en datos[inicio:fin], o -1 (sirve para bytearray)"""
+    for i in range(inicio, fin):
+        if datos[i] == byte:
+            return i
+    return -1
+
+def buscar_rcv(datos, trama, fin=-1):
+    """
+    Buscar una línea "+RCV=<dir>,<largo>,<datos>,<rssi>,<snr>" en
+    datos[:fin] y decodificar su trama
+
+    Retorna: largo del payload, o -1 si no hay trama válida
+    """
+    if fin < 0:
+        fin = len(datos)
+    i = 0
+    while True:
+        i = _buscar(datos, 43, i, fin - 4)  # '+'
+        if i < 0:
+            return -1
+        if datos[i + 1] == 82 and datos[i + 2] == 67 and datos[i + 3] == 86 and datos[i + 4] == 61:  # "RCV="
+            break
+        i += 1
+    # Saltar dirección y largo
+    i = _buscar(datos, 44, i + 5, fin)  # ','
+    if i < 0:
+        return -1
+    i = _buscar(datos, 44, i + 1, fin)
+    if i < 0:
+        return -1
+    fin = _buscar(datos, 44, i + 1, fin)
+    if fin < 0:
+        return -1
+    return decodificar(datos, i + 1, fin, trama)
+
+def origen_rcv(datos, fin=-1):
+    """
+    Dirección de origen de una línea "+RCV=<dir>,..." en datos[:fin]
+
+    Retorna: la dirección, o -1 si la línea no empieza con +RCV=
+    """
+    if fin < 0:
+        fin = len(datos)
+    if fin < 6 or datos[0] != 43 or datos[1] != 82 or datos[2] != 67 or datos[3] != 86 or datos[4] != 61:
+        return -1
+    valor = 0
+    for i in range(5, fin):
+        c = datos[i]
+        if c == 44:  # ','
+            return valor
+        if not 48 <= c <= 57:
+            return -1
+        valor = valor * 10 + c - 48
+    return -1
+
+# Benchmark en el host: python protocolo.py
+if __name__ == "__main__":
+    import time
+
+    reloj = getattr(time, "perf_counter", None) or (lambda: time.ticks_us() / 1000000)
+    N = 100000
+
+    salida = bytearray(64)
+    trama = bytearray(TAM_TRAMA)
+
+    # Tramas de prueba: los seis comandos como líneas +RCV
+    lineas = []
+    for cmd in range(6):
+        n = codificar(salida, cmd, cmd)
+        lineas.append(b"+RCV=1," + str(n).encode() + b"," + bytes(salida[:n]) + b",-42,11\r\n")
+
+    t0 = reloj()
+    for i in range(N):
+        n = codificar(salida, i, i % 6)
+    t1 = reloj()
+    validas = 0
+    for i in range(N):
+        if buscar_rcv(lineas[i % 6], trama) >= 0:
+            validas += 1
+    t2 = reloj()
+
+    print(f"Codificar:   {N / (t1 - t0):10.0f} tramas/s")
+    print(f"Decodificar: {N / (t2 - t1):10.0f} tramas/s ({validas} válidas)")
@@ -1,40 +1,148 @@
 # ========================================
 # RECEPTOR LORA CON RELÉS CORREGIDOS
 # ========================================
+#
+# CABLEADO: cambia respecto de la versión anterior. Dos salidas estaban
+# sobre pines que ya eran entradas y esas entradas dejaban de leerse:
+#   - Botón power: pin 19 (entrada D) → pin 25
+#   - PWM del motor: pin 21 (entrada Acelerador) → pin 22
+# Hay que mover esos dos cables en la placa. Al arrancar se verifica que
+# ningún pin tenga dos usos; si los hay, el programa no sigue.
 
-from machine import UART, Pin, PWM
-from time import sleep
+from machine import UART, Pin
+from time import sleep, ticks_ms, ticks_diff
+import protocolo
+from PWM import gestor
+from lora_at import ParserAT
+from banco_reles import BancoReles
+from despachador import Despachador
+from acuses import FiltroDuplicados
+from temporizadores import rueda
+from calidad_enlace import MonitorEnlace, SeguidorPerfil, PERFIL_ROBUSTO, COMANDOS, a_byte
+from protocolo import CMD_DETENER, CMD_DERECHA, CMD_ADELANTE, CMD_IZQUIERDA, CMD_ATRAS, CMD_POWER, CMD_ACK, CMD_PERFIL
 
 # Configuración correcta confirmada
 uart2 = UART(2, baudrate=115200, rx=Pin(17), tx=Pin(16))
 
-# Relés para control de motor/dispositivo
-rele1 = Pin(2, Pin.OUT)   # Motor Adelante A
-rele2 = Pin(4, Pin.OUT)   # Motor Adelante B  
-rele3 = Pin(5, Pin.OUT)   # Motor Atrás A
-rele4 = Pin(18, Pin.OUT)  # Motor Atrás B
+# Relés para control de motor/dispositivo (activos en HIGH)
+# 0 = Motor Adelante A (pin 2), 1 = Motor Adelante B (pin 4)
+# 2 = Motor Atrás A (pin 5),    3 = Motor Atrás B (pin 18)
+banco = BancoReles((2, 4, 5, 18))
 D=Pin(19, Pin.IN,Pin.PULL_UP)
 R=Pin(20, Pin.IN,Pin.PULL_UP)
 Acelerador=Pin(21, Pin.IN,Pin.PULL_UP)
 
-# PWM para velocidad (opcional)
-pwm_motor = None
-
-# Botón power y LED
-boton_power = Pin(19, Pin.OUT)
+# Botón power y LED. El botón power estaba en el pin 19, que es la entrada
+# D: al configurarlo como salida la entrada dejaba de leerse. Va al pin 25.
+PIN_BOTON_POWER = 25
+boton_power = Pin(PIN_BOTON_POWER, Pin.OUT)
 led_status = Pin(23, Pin.OUT)
 
+# PWM para velocidad: se crea una sola vez. Antes se creaba sobre el pin 21,
+# que es la entrada Acelerador (el PWM la pasaba a salida y dejaba de
+# leerse); va al pin 22, libre.
+PIN_PWM_MOTOR = 22
+
+# Registrar el uso de cada pin para detectar choques al arrancar
+for numero, uso in ((2, "rele1"), (4, "rele2"), (5, "rele3"), (18, "rele4"),
+                    (19, "D"), (20, "R"), (21, "Acelerador"),
+                    (PIN_BOTON_POWER, "boton_power"), (23, "led_status")):
+    gestor.reservar(numero, uso)
+
+pwm_motor = gestor.canal(PIN_PWM_MOTOR, "pwm_motor")
+gestor.verificar()
+
 # Estado del sistema
 system_on = False
 
+# Buffer para decodificar tramas recibidas (se reutiliza)
+trama_rx = bytearray(protocolo.TAM_TRAMA)
+
+# Acuses: cada trama se contesta con CMD_ACK y el mismo número de secuencia;
+# las retransmisiones se acusan de nuevo pero no se procesan
+duplicados = FiltroDuplicados()
+ack_buf = bytearray(32)
+ack_mv = memoryview(ack_buf)
+ack_origen = -1     # Acuse por enviar (-1 = ninguno)
+ack_seq = 0
+ack_marca = 0       # Cuándo se envió el último (para no trabar el parser)
+ack_payload = bytearray(2)  # RSSI y SNR de la trama acusada
+TIMEOUT_ACK_MS = 2000
+
+# Calidad del enlace y perfil de radio pedido por el transmisor
+monitor = MonitorEnlace()
+seguidor = SeguidorPerfil()
+
+def recibir_linea(linea, largo):
+    """Procesa una línea +RCV entregada por el parser AT"""
+    global ack_origen, ack_seq
+    try:
+        # Sólo se aceptan tramas válidas
+        largo_payload = protocolo.buscar_rcv(linea, trama_rx, largo)
+        if largo_payload >= 0:
+            codigo = trama_rx[protocolo.POS_CMD]
+            if codigo == CMD_ACK:
+                return
+            seguidor.recibido()
+            monitor.registrar_linea(linea, largo, seguidor.perfil)
+            origen = protocolo.origen_rcv(linea, largo)
+            seq = trama_rx[protocolo.POS_SEQ]
+            if duplicados.nueva(origen, seq):
+                if codigo != CMD_PERFIL:
+                    procesar_codigo(codigo)
+                elif largo_payload == 1:
+                    seguidor.solicitar(trama_rx[protocolo.POS_PAYLOAD])
+            else:
+                print(f"🔁 Trama repetida (seq {seq}), sólo se vuelve a acusar")
+            # El acuse sale desde el bucle principal (enviar_acuse) y le
+            # devuelve al transmisor el RSSI/SNR con que llegó la trama
+            ack_origen = origen
+            ack_seq = seq
+            ack_payload[0] = a_byte(monitor.ultimo_rssi)
+            ack_payload[1] = a_byte(monitor.ultimo_snr)
+        else:
+            print(f"📡 Trama inválida: {bytes(linea[:largo])}")
+    except Exception as e:
+        print(f"❌ Error: {e}")
+
+# Parser AT incremental: respuestas a comandos y líneas +RCV
+parser_at = ParserAT(uart2, al_recibir=recibir_linea)
+
 def send_cmd(cmd):
-    """Envía comando AT simple"""
-    uart2.write(cmd + '\r\n')
-    sleep(1)
-    if uart2.any():
-        response = uart2.read().decode('utf-8')
-        return "+OK" in response
-    return False
+    """Envía comando AT simple y espera +OK (sin pausa fija)"""
+    return parser_at.comando(cmd) is True
+
+def enviar_acuse():
+    """
+    Enviar el acuse pendiente sin esperar el +OK
+
+    El +OK llega recién al terminar de transmitir; lo consume alimentar()
+    en las vueltas siguientes. Si hay un comando en curso se espera a que
+    termine (o a TIMEOUT_ACK_MS, por si el módulo no contestó).
+    """
+    global ack_origen, ack_marca
+    if ack_origen < 0:
+        return
+    if parser_at.pendiente:
+        if ticks_diff(ticks_ms(), ack_marca) < TIMEOUT_ACK_MS:
+            return
+        parser_at.pendiente = False
+    n = protocolo.armar_send(ack_buf, ack_origen, ack_seq, CMD_ACK, ack_payload)
+    ack_origen = -1
+    ack_marca = ticks_ms()
+    parser_at.enviar(ack_mv[:n])
+
+def atender():
+    """Una vuelta del bucle principal: líneas recibidas, acuses y perfil"""
+    # Procesar líneas completas; las +RCV llegan a recibir_linea
+    parser_at.alimentar()
+    enviar_acuse()
+    # Acciones diferidas: encendidos en espera del tiempo muerto y fin del
+    # pulso del botón power
+    banco.aplicar()
+    rueda.tick()
+    # Un cambio de perfil se aplica recién cuando su acuse salió
+    seguidor.paso(parser_at, ack_origen < 0)
 
 def setup_lora():
     """Configuración mínima"""
@@ -48,135 +156,100 @@ def setup_lora():
     # Configurar receptor
     send_cmd("AT+ADDRESS=2")
     send_cmd("AT+NETWORKID=5")
+    send_cmd(COMANDOS[PERFIL_ROBUSTO])  # Mismo perfil de arranque que el transmisor
     
     print("✅ LoRa configurado")
     return True
 
+# Despachador: cada comando es una máscara de relés + duty precalculados.
+# Enclavamiento: rele1/rele3 y rele2/rele4 son la misma rama del puente y
+# nunca se encienden juntos. La pausa de seguridad entre apagar una rama y
+# encender la otra la lleva el banco (tiempo muerto, sólo en inversiones):
+# atender() completa el encendido, sin dormir.
+banco.enclavar(0, 2)
+banco.enclavar(1, 3)
+despachador = Despachador(banco, pwm_motor)
+despachador.definir(CMD_DETENER, ())
+despachador.definir(CMD_DERECHA, (0, 3), 512)     # rele1 + rele4
+despachador.definir(CMD_ADELANTE, (0, 1), 512)    # rele1 + rele2
+despachador.definir(CMD_IZQUIERDA, (1, 2), 512)   # rele2 + rele3
+despachador.definir(CMD_ATRAS, (2, 3), 512)       # rele3 + rele4
+
+NOMBRES = {CMD_DETENER: "🛑 DETENER TODO", CMD_DERECHA: "➡️ DERECHA",
+           CMD_ADELANTE: "⬆️ MOTOR ADELANTE", CMD_IZQUIERDA: "⬅️ IZQUIERDA",
+           CMD_ATRAS: "⬇️ MOTOR ATRÁS"}
+
 def detener_todos_reles():
     """Apaga todos los relés - POSICIÓN SEGURA"""
-    rele1.off()
-    rele2.off()
-    rele3.off()
-    rele4.off()
-    
-    # Detener PWM si existe
-    global pwm_motor
-    if pwm_motor:
-        pwm_motor.deinit()
-        pwm_motor = None
-    
+    despachador.apagar_todo()
     print("🛑 Todos los relés apagados")
 
+def motor(codigo):
+    """Aplicar un comando de motor; el mensaje se imprime después de conmutar"""
+    if despachador.aplicar(codigo):
+        print(NOMBRES[codigo])
+
 def motor_adelante():
     """Motor girando hacia adelante"""
-    print("⬆️ MOTOR ADELANTE")
-    
-    # Apagar relés opuestos primero (seguridad)
-    rele3.off()
-    rele4.off()
-    sleep(0.1)  # Pausa de seguridad
-    
-    # Activar relés para adelante
-    rele1.on()
-    rele2.on()
-    
-    # Activar PWM para velocidad
-    iniciar_pwm()
+    motor(CMD_ADELANTE)
 
 def motor_atras():
     """Motor girando hacia atrás"""
-    print("⬇️ MOTOR ATRÁS")
-    
-    # Apagar relés opuestos primero (seguridad)
-    rele1.off()
-    rele2.off()
-    sleep(0.1)  # Pausa de seguridad
-    
-    # Activar relés para atrás
-    rele3.on()
-    rele4.on()
-    
-    # Activar PWM para velocidad
-    iniciar_pwm()
+    motor(CMD_ATRAS)
 
 def motor_derecha():
     """Motor/dispositivo hacia la derecha"""
-    print("➡️ DERECHA")
-    
-    # Apagar todos primero
-    detener_todos_reles()
-    sleep(0.1)
-    
-    # Configuración para derecha (ejemplo: solo rele1 y rele4)
-    rele1.on()
-    rele4.on()
-    
-    # PWM opcional
-    iniciar_pwm()
+    motor(CMD_DERECHA)
 
 def motor_izquierda():
     """Motor/dispositivo hacia la izquierda"""
-    print("⬅️ IZQUIERDA")
-    
-    # Apagar todos primero
-    detener_todos_reles()
-    sleep(0.1)
-    
-    # Configuración para izquierda (ejemplo: solo rele2 y rele3)
-    rele2.on()
-    rele3.on()
-    
-    # PWM opcional
-    iniciar_pwm()
-
-def iniciar_pwm():
-    """Inicia PWM para control de velocidad"""
-    global pwm_motor
-    
-    try:
-        # Usar pin 21 para PWM (diferente a los relés)
-        pwm_motor = PWM(Pin(21))
-        pwm_motor.freq(1000)
-        pwm_motor.duty(512)  # 50% velocidad inicial
-        print("⚡ PWM activado - 50% velocidad")
-    except Exception as e:
-        print(f"⚠️ Error PWM: {e}")
+    motor(CMD_IZQUIERDA)
 
 def acelerar_motor():
     """Aumenta velocidad del motor"""
-    global pwm_motor
-    
-    if pwm_motor:
+    if despachador.duty:
         try:
             pwm_motor.duty(800)  # 80% velocidad
+            despachador.duty = 800
             print("🚀 Motor acelerado - 80% velocidad")
         except:
             print("❌ Error acelerando")
 
+# Pulso del botón power: lo termina la rueda desde atender(), sin dormir
+# dentro del procesamiento de +RCV
+PULSO_BOTON_MS = 300
+boton_pulsado = None
+pulso_boton = -1    # Ranura en la rueda (-1 = sin pulso)
+
+def soltar_boton():
+    """Fin del pulso de presionar_boton (lo llama la rueda)"""
+    global boton_pulsado, pulso_boton
+    pulso_boton = -1
+    boton_pulsado.off()
+    boton_pulsado = None
+
 def presionar_boton(pin, nombre):
-    """Simula presión de botón"""
+    """Simula presión de botón; retorna enseguida y suelta a los PULSO_BOTON_MS"""
+    global boton_pulsado, pulso_boton
     print(f"🔘 {nombre}")
+    if pulso_boton >= 0:
+        # Una pulsación nueva durante el pulso lo alarga
+        rueda.cancelar(pulso_boton)
+        if boton_pulsado is not pin:
+            boton_pulsado.off()
     pin.on()
-    sleep(0.3)
-    pin.off()
+    boton_pulsado = pin
+    pulso_boton = rueda.programar(PULSO_BOTON_MS, soltar_boton)
+    if pulso_boton < 0:
+        # Rueda llena: mejor bloquear que dejar el botón apretado
+        sleep(PULSO_BOTON_MS / 1000)
+        soltar_boton()
 
 def procesar_codigo(codigo):
-    """Procesa códigos recibidos - CORREGIDO"""
+    """Procesa comandos recibidos (CMD_* de protocolo)"""
     global system_on
     
-    if codigo == "1" and system_on:
-        motor_derecha()
-        
-    elif codigo == "2" and system_on :
-        motor_adelante()
-        
-    elif codigo == "3" and system_on:
-        motor_izquierda()
-        
-    elif codigo == "4" and system_on :
-        motor_atras()
-        
-    elif codigo == "5":  # POWER - CORREGIDO
+    if codigo == CMD_POWER:  # POWER - CORREGIDO
         system_on = not system_on
         
         if system_on:
@@ -191,14 +264,14 @@ def procesar_codigo(codigo):
              
         if D.value()==0:
            if Acelerador.value()==0:
-             if codigo == "1" or codigo == "4":
+             if codigo == CMD_DERECHA or codigo == CMD_ATRAS:
                 pass
              else:
                 motor_adelante()
 
         elif R.value()==0:
             if Acelerador.value()==0:
-             if codigo == "1" or codigo == "4":
+             if codigo == CMD_DERECHA or codigo == CMD_ATRAS:
                 pass
              else:
                 motor_atras()
@@ -207,75 +280,58 @@ def procesar_codigo(codigo):
         # Activar botón power físico
         presionar_boton(boton_power, "POWER")
     
-    # Código extra para detener (opcional)
-    elif codigo == "0" and system_on:
-        print("🛑 DETENER TODO")
-        detener_todos_reles()
+    # Comandos de motor (incluido DETENER): una entrada de la tabla
+    elif system_on:
+        motor(codigo)
 
 # ========================================
 # PROGRAMA PRINCIPAL
 # ========================================
 
-print("📡 === RECEPTOR LORA CON RELÉS ===")
-print("🔧 Control de motor con 4 relés + PWM")
-
-# Inicializar - POSICIÓN SEGURA
-detener_todos_reles()
-led_status.off()
-
-# Configurar LoRa
-if not setup_lora():
-    print("💥 Error configuración")
-    exit()
-
-print("\n🔌 === CONFIGURACIÓN DE RELÉS ===")
-print("Pin 2  = Relé 1 (Motor Adelante A)")
-print("Pin 4  = Relé 2 (Motor Adelante B)")
-print("Pin 5  = Relé 3 (Motor Atrás A)")
-print("Pin 18 = Relé 4 (Motor Atrás B)")
-print("Pin 21 = PWM Motor (velocidad)")
-print("Pin 19 = Botón Power")
-print("Pin 23 = LED Status")
-
-print("\n👂 Esperando comandos...")
-print("1=DERECHA | 2=ADELANTE | 3=IZQUIERDA | 4=ATRÁS | 5=POWER")
-print("=" * 50)
-
-# Bucle principal
-try:
-    while True:
-        if uart2.any():
-            data = uart2.read()
-            try:
-                texto = data.decode('utf-8')
-                print(f"\n📡 {texto.strip()}")
-                
-                # Buscar patrón +RCV
-                if "+RCV=" in texto:
-                    partes = texto.split('+RCV=')[1].split(',')
-                    if len(partes) >= 3:
-                        datos = partes[2]
-                        procesar_codigo(datos.strip())
-                
-                # Buscar códigos directos
-                else:
-                    for char in "012345":  # Agregué 0 para DETENER
-                        if char in texto:
-                            procesar_codigo(char)
-                            break
-                            
-            except Exception as e:
-                print(f"❌ Error: {e}")
-                print(f"📡 RAW: {data}")
-        
-        sleep(0.1)
+if __name__ == "__main__":
+    print("📡 === RECEPTOR LORA CON RELÉS ===")
+    print("🔧 Control de motor con 4 relés + PWM")
+
+    # Inicializar - POSICIÓN SEGURA
+    detener_todos_reles()
+    led_status.off()
 
-except KeyboardInterrupt:
-    print("\n🛑 Programa detenido")
+    # Configurar LoRa
+    if not setup_lora():
+        print("💥 Error configuración")
+        exit()
 
-# Limpiar al salir - SEGURIDAD
-print("🔒 Apagando todos los relés por seguridad...")
-detener_todos_reles()
-led_status.off()
+    print("\n🔌 === CONFIGURACIÓN DE RELÉS ===")
+    print("Pin 2  = Relé 1 (Motor Adelante A)")
+    print("Pin 4  = Relé 2 (Motor Adelante B)")
+    print("Pin 5  = Relé 3 (Motor Atrás A)")
+    print("Pin 18 = Relé 4 (Motor Atrás B)")
+    print(f"Pin {PIN_PWM_MOTOR} = PWM Motor (velocidad)")
+    print(f"Pin {PIN_BOTON_POWER} = Botón Power")
+    print("Pin 23 = LED Status")
+
+    print("\n👂 Esperando comandos...")
+    print("1=DERECHA | 2=ADELANTE | 3=IZQUIERDA | 4=ATRÁS | 5=POWER")
+    print("=" * 50)
+
+    # Bucle principal
+    try:
+        while True:
+            atender()
+            sleep(0.005)
+
+    except KeyboardInterrupt:
+        print("\n🛑 Programa detenido")
+
+    # Limpiar al salir - SEGURIDAD
+    print("🔒 Apagando todos los relés por seguridad...")
+    detener_todos_reles()
+    led_status.off()
+    print(f"🔁 Tramas repetidas ignoradas: {duplicados.duplicados}")
+    print(f"📶 Cambios de perfil: {seguidor.cambios} (vueltas atrás: {seguidor.vueltas_atras}, "
+          f"AT+PARAMETER fallidos: {seguidor.fallos})")
+    monitor.reporte(seguidor.perfil)
+    gestor.reporte()
+    gestor.liberar()
 
-print("✅ Programa terminado")
\ No newline at end of file
+    print("✅ Programa terminado")
\ No newline at end of file
@@ -1,113 +1,150 @@
 from machine import Pin
 import time
+from banco_reles import BancoReles
+from temporizadores import rueda
 
 # Configurar los pines de los relés
 rele1 = Pin(27, Pin.OUT)
 rele2 = Pin(25, Pin.OUT)
 rele3 = Pin(26, Pin.OUT)
 
-# === OPCIÓN 1: Invertir directamente en el código ===
-print("Activando relés con lógica invertida...")
+# === OPCIÓN 2: Funciones sobre el banco de relés ===
+# El banco se encarga de la lógica invertida; los relés son índices
+banco = BancoReles(((27, True), (25, True), (26, True)))
+RELE1, RELE2, RELE3 = 0, 1, 2
 
-# Para ACTIVAR el relé (cerrar circuito) usamos .off()
-rele1.off()  # Relé 1 ACTIVADO (antes era .on())
-time.sleep(1)
-rele1.on()   # Relé 1 DESACTIVADO (antes era .off())
-print("Relé 1 completado")
-
-rele2.off()  # Relé 2 ACTIVADO
-time.sleep(1)
-rele2.on()   # Relé 2 DESACTIVADO
-print("Relé 2 completado")
-
-rele3.off()  # Relé 3 ACTIVADO
-time.sleep(1)
-rele3.on()   # Relé 3 DESACTIVADO
-print("Relé 3 completado")
-
-print("=== Secuencia completada ===")
-
-# === OPCIÓN 2: Funciones para mayor claridad ===
 def activar_rele(rele):
     """Activa el relé (lógica invertida)"""
-    rele.off()
+    banco.activar(rele)
+    banco.aplicar()
 
 def desactivar_rele(rele):
     """Desactiva el relé (lógica invertida)"""
-    rele.on()
+    banco.desactivar(rele)
+    banco.aplicar()
 
 def inicializar_reles():
     """Asegura que todos los relés estén desactivados al inicio"""
-    rele1.on()
-    rele2.on()
-    rele3.on()
+    banco.apagar_todo()
     print("Todos los relés inicializados (desactivados)")
 
-# Ejemplo usando las funciones
-print("\n=== Usando funciones claras ===")
-inicializar_reles()
-time.sleep(1)
-
-print("Activando relé 1...")
-activar_rele(rele1)
-time.sleep(1)
-desactivar_rele(rele1)
-print("Relé 1 desactivado")
-
-print("Activando relé 2...")
-activar_rele(rele2)
-time.sleep(1)
-desactivar_rele(rele2)
-print("Relé 2 desactivado")
-
-print("Activando relé 3...")
-activar_rele(rele3)
-time.sleep(1)
-desactivar_rele(rele3)
-print("Relé 3 desactivado")
-
 # === OPCIÓN 3: Clase para manejo más avanzado ===
 class ReleInvertido:
-    def __init__(self, pin_number):
-        self.pin = Pin(pin_number, Pin.OUT)
-        self.desactivar()  # Inicializar desactivado
-    
+    """
+    Relé activo en LOW con pulsos no bloqueantes
+
+    Los pulsos se programan en una rueda de temporizadores compartida
+    (temporizadores.rueda), que vence desde un machine.Timer o una tarea
+    asyncio; así varios relés pulsan en paralelo.
+    """
+
+    def __init__(self, pin_number, rueda_pulsos=None):
+        self.pin = Pin(pin_number, Pin.OUT, value=1)  # Inicializar desactivado
+        self.estado = False
+        self.rueda = rueda_pulsos or rueda
+        self._pulso = -1
+        self._fin_pulso = self._vencer_pulso  # Bound method creado una sola vez
+
     def activar(self):
         """Activa el relé (pin LOW)"""
         self.pin.off()
         self.estado = True
-    
+
     def desactivar(self):
-        """Desactiva el relé (pin HIGH)"""
+        """Desactiva el relé (pin HIGH) y cancela el pulso en curso"""
+        self.cancelar_pulso()
         self.pin.on()
         self.estado = False
-    
+
+    def _vencer_pulso(self):
+        self._pulso = -1  # La rueda ya liberó la ranura
+        self.desactivar()
+
     def toggle(self):
         """Cambia el estado del relé"""
         if self.estado:
             self.desactivar()
         else:
             self.activar()
-    
-    def pulso(self, duracion=1):
-        """Activa el relé por un tiempo determinado"""
-        self.activar()
-        time.sleep(duracion)
-        self.desactivar()
 
-# Ejemplo usando la clase
-print("\n=== Usando clase ReleInvertido ===")
-relay1 = ReleInvertido(27)
-relay2 = ReleInvertido(25)
-relay3 = ReleInvertido(26)
-
-# Secuencia con pulsos
-relay1.pulso(2)
-print("Pulso relé 1 completado")
-
-relay2.pulso(2)
-print("Pulso relé 2 completado")
-
-relay3.pulso(2)
-print("Pulso relé 3 completado")
+    def pulso(self, duracion=1):
+        """
+        Activa el relé por un tiempo determinado, sin bloquear
 
+        Retorna enseguida; la rueda lo desactiva al vencer. Un pulso nuevo
+        sobre un pulso en curso lo reprograma.
+        """
+        self.cancelar_pulso()
+        self.activar()
+        self._pulso = self.rueda.programar(int(duracion * 1000), self._fin_pulso)
+        if self._pulso < 0:
+            print("⚠️ Rueda de temporizadores llena")
+
+    def cancelar_pulso(self):
+        if self._pulso >= 0:
+            self.rueda.cancelar(self._pulso)
+            self._pulso = -1
+
+    def en_pulso(self):
+        return self._pulso >= 0
+
+if __name__ == "__main__":
+    # === OPCIÓN 1: Invertir directamente en el código ===
+    print("Activando relés con lógica invertida...")
+
+    # Para ACTIVAR el relé (cerrar circuito) usamos .off()
+    rele1.off()  # Relé 1 ACTIVADO (antes era .on())
+    time.sleep(1)
+    rele1.on()   # Relé 1 DESACTIVADO (antes era .off())
+    print("Relé 1 completado")
+
+    rele2.off()  # Relé 2 ACTIVADO
+    time.sleep(1)
+    rele2.on()   # Relé 2 DESACTIVADO
+    print("Relé 2 completado")
+
+    rele3.off()  # Relé 3 ACTIVADO
+    time.sleep(1)
+    rele3.on()   # Relé 3 DESACTIVADO
+    print("Relé 3 completado")
+
+    print("=== Secuencia completada ===")
+
+    # Ejemplo usando las funciones
+    print("\n=== Usando funciones claras ===")
+    inicializar_reles()
+    time.sleep(1)
+
+    print("Activando relé 1...")
+    activar_rele(RELE1)
+    time.sleep(1)
+    desactivar_rele(RELE1)
+    print("Relé 1 desactivado")
+
+    print("Activando relé 2...")
+    activar_rele(RELE2)
+    time.sleep(1)
+    desactivar_rele(RELE2)
+    print("Relé 2 desactivado")
+
+    print("Activando relé 3...")
+    activar_rele(RELE3)
+    time.sleep(1)
+    desactivar_rele(RELE3)
+    print("Relé 3 desactivado")
+
+    # Ejemplo usando la clase
+    print("\n=== Usando clase ReleInvertido ===")
+    relay1 = ReleInvertido(27)
+    relay2 = ReleInvertido(25)
+    relay3 = ReleInvertido(26)
+
+    # Pulsos en paralelo: los tres terminan a los 2 s, no a los 6 s
+    rueda.iniciar_timer(1)
+    inicio = time.ticks_ms()
+    relay1.pulso(2)
+    relay2.pulso(2)
+    relay3.pulso(2)
+    while relay1.en_pulso() or relay2.en_pulso() or relay3.en_pulso():
+        time.sleep_ms(10)
+    print(f"Pulsos de los 3 relés completados en {time.ticks_diff(time.ticks_ms(), inicio)} ms")
@@ -0,0 +1,216 @@
+# ========================================
+# SIMULACIÓN EN EL HOST
+# ========================================
+#
+# Permite importar y correr el código del proyecto en CPython:
+#
+#   import simulacion
+#   simulacion.instalar()      # antes de importar los módulos del proyecto
+#   import receptor
+#
+# instalar() registra el machine simulado, pasa time.ticks_*/sleep* al reloj
+# virtual y agrega a asyncio lo que MicroPython tiene de más (sleep_ms,
+# wait_for_ms, ThreadSafeFlag, StreamReader sobre una UART). asyncio.run
+# usa un bucle cuyo tiempo es el reloj virtual: las esperas no cuestan
+# tiempo real.
+
+import asyncio
+import math
+import os
+import selectors
+import sys
+import time
+import random
+
+from simulacion.reloj import reloj
+from simulacion import machine
+
+PERIODO_TICKS = 1 << 30   # Igual que MicroPython: los ticks dan la vuelta
+
+_instalado = False
+
+# ---- time ----
+
+def ticks_us():
+    return reloj.us & (PERIODO_TICKS - 1)
+
+def ticks_ms():
+    return (reloj.us // 1000) & (PERIODO_TICKS - 1)
+
+def ticks_add(ticks, delta):
+    return (ticks + delta) & (PERIODO_TICKS - 1)
+
+def ticks_diff(a, b):
+    mitad = PERIODO_TICKS // 2
+    return ((a - b + mitad) & (PERIODO_TICKS - 1)) - mitad
+
+def sleep_us(us):
+    reloj.avanzar(us)
+
+def sleep_ms(ms):
+    reloj.avanzar(ms * 1000)
+
+def sleep(segundos):
+    reloj.avanzar(int(segundos * 1000000))
+
+# ---- asyncio ----
+
+class ThreadSafeFlag:
+    """asyncio.ThreadSafeFlag: wait() consume la bandera"""
+
+    def __init__(self):
+        self._bandera = False
+        self._evento = asyncio.Event()
+
+    def set(self):
+        self._bandera = True
+        self._evento.set()
+
+    def clear(self):
+        self._bandera = False
+        self._evento.clear()
+
+    async def wait(self):
+        while not self._bandera:
+            self._evento.clear()
+            await self._evento.wait()
+        self._bandera = False
+        self._evento.clear()
+
+class StreamReader:
+    """asyncio.StreamReader(uart) de MicroPython: espera bytes sin sondear"""
+
+    def __init__(self, uart, *args):
+        self.uart = uart
+        self._flag = ThreadSafeFlag()
+        uart.avisar(self._flag.set)
+
+    async def _esperar(self):
+        while not self.uart.any():
+            await self._flag.wait()
+
+    async def read(self, n=-1):
+        await self._esperar()
+        return self.uart.read(None if n < 0 else n)
+
+    async def readinto(self, buf):
+        await self._esperar()
+        return self.uart.readinto(buf)
+
+    async def readline(self):
+        while True:
+            await self._esperar()
+            if b"\n" in self.uart._rx:
+                return self.uart.readline()
+            await self._flag.wait()
+
+def _sleep_ms(ms):
+    return asyncio.sleep(ms / 1000)
+
+def _wait_for_ms(aw, ms):
+    return asyncio.wait_for(aw, ms / 1000)
+
+class _SelectorVirtual:
+    """
+    Selector que, en lugar de bloquear, avanza el reloj virtual
+
+    Se avanza hasta el timeout del bucle o hasta el próximo evento del
+    reloj (lo que llegue antes), para que las interrupciones simuladas
+    despierten a las tareas a tiempo.
+    """
+
+    def __init__(self):
+        self._selector = selectors.DefaultSelector()
+
+    def select(self, timeout=None):
+        listos = self._selector.select(0)
+        if listos or timeout == 0:
+            return listos
+        proximo = reloj.proximo()
+        if timeout is None:
+            if proximo is None:
+                raise RuntimeError("Simulación bloqueada: ninguna tarea ni evento pendiente")
+            reloj.avanzar_hasta(proximo)
+        else:
+            espera = math.ceil(timeout * 1000000)
+            if proximo is not None:
+                espera = min(espera, proximo - reloj.us)
+            reloj.avanzar(espera)
+        return self._selector.select(0)
+
+    def __getattr__(self, nombre):
+        return getattr(self._selector, nombre)
+
+class BucleVirtual(asyncio.SelectorEventLoop):
+    """Bucle de asyncio cuyo tiempo es el reloj virtual"""
+
+    def __init__(self):
+        super().__init__(_SelectorVirtual())
+
+    def time(self):
+        return reloj.us / 1000000
+
+def ejecutar(coro, limite_ms=None):
+    """
+    Correr una corrutina en tiempo virtual
+
+    limite_ms corta la simulación después de ese tiempo virtual (para
+    programas que no terminan); retorna el resultado o None si se cortó.
+    """
+    async def con_limite():
+        try:
+            return await asyncio.wait_for(coro, limite_ms / 1000)
+        except asyncio.TimeoutError:
+            return None
+
+    bucle = _bucle_virtual()
+    try:
+        return bucle.run_until_complete(con_limite() if limite_ms is not None else coro)
+    finally:
+        # Cancelar las tareas que quedaron (p. ej. bucles infinitos de envío)
+        pendientes = asyncio.all_tasks(bucle)
+        for tarea in pendientes:
+            tarea.cancel()
+        if pendientes:
+            bucle.run_until_complete(asyncio.gather(*pendientes, return_exceptions=True))
+
+_bucle = None
+
+def _bucle_virtual():
+    """Un solo bucle para toda la simulación (los Event quedan ligados a él)"""
+    global _bucle
+    if _bucle is None:
+        _bucle = BucleVirtual()
+        asyncio.set_event_loop(_bucle)
+    return _bucle
+
+# ---- Instalación ----
+
+def instalar():
+    """Registrar machine simulado y parchear time/asyncio (idempotente)"""
+    global _instalado
+    if _instalado:
+        return
+    _instalado = True
+
+    sys.modules["machine"] = machine
+    sys.modules["urandom"] = random
+
+    time.ticks_us = ticks_us
+    time.ticks_ms = ticks_ms
+    time.ticks_add = ticks_add
+    time.ticks_diff = ticks_diff
+    time.sleep_us = sleep_us
+    time.sleep_ms = sleep_ms
+    time.sleep = sleep
+
+    asyncio.sleep_ms = _sleep_ms
+    asyncio.wait_for_ms = _wait_for_ms
+    asyncio.ThreadSafeFlag = ThreadSafeFlag
+    asyncio.StreamReader = StreamReader
+    asyncio.run = ejecutar
+
+    # Los módulos del proyecto se importan desde la raíz del repositorio
+    raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if raiz not in sys.path:
+        sys.path.insert(0, raiz)
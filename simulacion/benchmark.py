@@ -0,0 +1,887 @@
+# ========================================
+# BANCO DE PRUEBAS DE RENDIMIENTO
+# ========================================
+#
+#   python -m simulacion.benchmark            # todos los escenarios
+#   python -m simulacion.benchmark receptor   # sólo algunos
+#
+# Cada escenario corre el código real del proyecto sobre el hardware
+# simulado y reporta:
+#   - µs de CPU del host por iteración y tasa de iteraciones por segundo
+#   - latencia en tiempo virtual (la que vería el ESP32 por esperas y bytes)
+#   - memoria: pico (KB) durante el bucle y bloques que quedan retenidos,
+#     medidos con tracemalloc en una pasada aparte
+
+import simulacion
+simulacion.instalar()
+
+import gc
+import importlib
+import sys
+import time
+import tracemalloc
+
+from simulacion.reloj import reloj
+from simulacion import machine, perifericos
+from metricas import Latencias
+
+_perf = time.perf_counter  # Reloj real del host (time.sleep está simulado)
+
+class _Nulo:
+    """Salida descartada: los print del proyecto no cuentan en la medición"""
+
+    def write(self, texto):
+        return len(texto)
+
+    def flush(self):
+        pass
+
+class Escenario:
+    """Base: preparar() una vez; correr(n) hace n iteraciones"""
+
+    nombre = ""
+    iteraciones = 1000
+    unidad = "µs"           # Unidad de las latencias
+    descripcion = ""
+
+    def __init__(self):
+        self.latencias = Latencias(256)
+        self.notas = ""
+
+    def preparar(self):
+        pass
+
+    def correr(self, n):
+        raise NotImplementedError
+
+class Resultado:
+    def __init__(self, escenario, n, segundos, virtual_us, pico, bloques):
+        self.escenario = escenario
+        self.n = n
+        self.segundos = segundos
+        self.virtual_us = virtual_us
+        self.pico = pico
+        self.bloques = bloques
+
+def medir(escenario, n=None):
+    """Correr un escenario: pasada cronometrada y pasada con tracemalloc"""
+    n = n or escenario.iteraciones
+    salida = sys.stdout
+    sys.stdout = _Nulo()
+    try:
+        machine.placa(escenario.nombre)
+        escenario.preparar()
+        gc.collect()
+
+        inicio_virtual = reloj.us
+        inicio = _perf()
+        escenario.correr(n)
+        segundos = _perf() - inicio
+        virtual_us = reloj.us - inicio_virtual
+
+        # Memoria en una pasada más corta (tracemalloc es lento); el
+        # reporte muestra latencias y notas de la pasada cronometrada
+        n_memoria = max(1, n // 10)
+        latencias, notas = escenario.latencias, escenario.notas
+        escenario.latencias = Latencias(256)
+        gc.collect()
+        tracemalloc.start()
+        antes, _ = tracemalloc.get_traced_memory()
+        bloques_antes = sys.getallocatedblocks()
+        escenario.correr(n_memoria)
+        bloques = sys.getallocatedblocks() - bloques_antes
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        escenario.latencias, escenario.notas = latencias, notas
+    finally:
+        sys.stdout = salida
+    return Resultado(escenario, n, segundos, virtual_us, pico - antes, bloques)
+
+def reporte(resultados):
+    print("📊 Benchmark sobre hardware simulado")
+    print(f"   {'escenario':<14}{'iter':>7}{'µs/iter':>10}{'iter/s':>10}{'virtual':>10}"
+          f"{'lat p50':>10}{'lat p99':>10}{'pico KB':>9}{'bloques':>9}")
+    for r in resultados:
+        e = r.escenario
+        p50, p90, p99 = e.latencias.percentiles()
+        hay = e.latencias.cantidad
+        lat50 = f"{p50}{e.unidad}" if hay else "-"
+        lat99 = f"{p99}{e.unidad}" if hay else "-"
+        print(f"   {e.nombre:<14}{r.n:>7}{r.segundos / r.n * 1e6:>10.1f}{r.n / r.segundos:>10.0f}"
+              f"{r.virtual_us // 1000:>8}ms{lat50:>10}{lat99:>10}{r.pico / 1024:>9.1f}{r.bloques:>9}")
+        if e.notas:
+            print(f"   {'':<14}↳ {e.notas}")
+
+def cargar(modulo):
+    """Importar una copia nueva de un módulo del proyecto en la placa activa"""
+    sys.modules.pop(modulo, None)
+    return importlib.import_module(modulo)
+
+# ========================================
+# ESCENARIOS
+# ========================================
+
+ESCENARIOS = []
+
+def escenario(clase):
+    ESCENARIOS.append(clase)
+    return clase
+
+@escenario
+class Protocolo(Escenario):
+    """Codificar y decodificar tramas (protocolo.py)"""
+
+    nombre = "protocolo"
+    iteraciones = 20000
+
+    def preparar(self):
+        import protocolo
+        self.p = protocolo
+        self.salida = bytearray(protocolo.TAM_TRAMA * 2 + 2)
+        self.trama = bytearray(protocolo.TAM_TRAMA)
+        self.envio = bytearray(64)
+
+    def correr(self, n):
+        p = self.p
+        for i in range(n):
+            largo = p.codificar(self.salida, i & 0xFF, i % 6)
+            if p.decodificar(self.salida, 0, largo, self.trama) < 0:
+                raise AssertionError("trama inválida")
+            p.armar_send(self.envio, 2, i & 0xFF, i % 6)
+        self.notas = "codificar + decodificar + armar AT+SEND por iteración"
+
+@escenario
+class Botones(Escenario):
+    """
+    Pulsaciones con rebote sobre BancoBotones (interrupción → leer)
+    
+    Sin columnas de latencia: en la simulación la interrupción y el
+    planificador corren en el mismo instante virtual que el flanco, así que
+    la latencia pulsación → evento daría siempre 0 µs. Se mide en la placa
+    con BancoBotones.latencias.
+    """
+
+    nombre = "botones"
+    iteraciones = 500
+    unidad = "µs"
+
+    PINES = (14, 19, 21, 22, 23)
+
+    def preparar(self):
+        from botones import BancoBotones
+        self.banco = BancoBotones(self.PINES)
+        self.botones = [perifericos.Boton(p, semilla=p) for p in self.PINES]
+
+    def correr(self, n):
+        banco = self.banco
+        for i in range(n):
+            self.botones[i % len(self.botones)].presionar(en_ms=(i + 1) * 100)
+
+        async def consumir():
+            for _ in range(n):
+                await banco.esperar()
+
+        simulacion.ejecutar(consumir())
+        self.notas = (f"latencia no modelada | rebotes filtrados={banco.rebotes} "
+                      f"perdidos={banco.perdidos}")
+
+@escenario
+class BotonesSostenidos(Botones):
+    """Pulsaciones mantenidas con rebote al soltar: un evento por pulsación"""
+
+    nombre = "botones_sostenidos"
+    iteraciones = 200
+
+    def correr(self, n):
+        banco = self.banco
+        botones = self.botones
+        leidas = [b.presiones for b in botones]
+        # La primera apenas creado el banco; cada una mantenida 120-400 ms
+        for i in range(n):
+            botones[i % len(botones)].presionar(en_ms=10 + i * 100, duracion_ms=120 + (i * 37) % 280)
+
+        async def consumir():
+            for _ in range(n):
+                leidas[await banco.esperar()] += 1
+            await simulacion.asyncio.sleep_ms(1000)   # Que terminen las sueltas
+
+        simulacion.ejecutar(consumir())
+        if banco.pendientes() or leidas != [b.presiones for b in botones]:
+            raise AssertionError(f"eventos de más: {banco.pendientes()} sin leer, leídos {leidas}")
+        self.notas = (f"latencia no modelada | rebotes filtrados={banco.rebotes} "
+                      f"perdidos={banco.perdidos} eventos de más=0")
+
+@escenario
+class Receptor(Escenario):
+    """+RCV por la UART a 10 Hz → relés (receptor.py con despachador y banco)"""
+
+    nombre = "receptor"
+    iteraciones = 300
+    unidad = "µs"
+
+    def preparar(self):
+        self.modem = perifericos.RespondedorAT()
+        machine.conectar_uart(2, self.modem)
+        import receptor
+        import protocolo
+        self.receptor = receptor
+        self.protocolo = protocolo
+        receptor.system_on = True
+        self.asignaciones = receptor.gestor.asignaciones
+        self.tx = bytearray(64)
+
+    def _linea_rcv(self, seq, cmd):
+        n = self.protocolo.codificar(self.tx, seq, cmd)
+        datos = bytes(self.tx[:n])
+        return b"+RCV=1,%d,%s,-40,10" % (len(datos), datos)
+
+    def correr(self, n):
+        r = self.receptor
+        banco = r.banco
+        codigos = (self.protocolo.CMD_ADELANTE, self.protocolo.CMD_DERECHA,
+                   self.protocolo.CMD_ATRAS, self.protocolo.CMD_IZQUIERDA)
+        uart = r.uart2
+        for i in range(n):
+            linea = self._linea_rcv(i & 0xFF, codigos[i % 4])
+            llegada = reloj.us + 100000 + uart.tiempo_us(len(linea) + 2)
+            self.modem.inyectar(linea, 100000)
+            anterior = r.despachador.despachos
+            # Bucle principal de receptor.py, hasta que el comando quede
+            # escrito entero (el encendido espera el tiempo muerto)
+            while r.despachador.despachos == anterior or banco.pendiente():
+                r.atender()
+                time.sleep(0.005)
+            self.latencias.registrar(reloj.us - llegada)
+        self.notas = (f"PWM creados durante la prueba: {r.gestor.asignaciones - self.asignaciones} "
+                      f"(10 comandos/s), despachos={r.despachador.despachos} | latencia con "
+                      f"tiempo muerto de {banco.tiempo_muerto_ms} ms (encendidos diferidos={banco.diferidos}: "
+                      f"cada comando del ciclo invierte una rama)")
+
+@escenario
+class Transmisor(Escenario):
+    """Botón → cola → AT+SEND → acuse (transmisor.py, módem que tarda 40 ms)"""
+
+    nombre = "transmisor"
+    iteraciones = 200
+    unidad = "ms"
+
+    def preparar(self):
+        import protocolo
+        acuse = bytearray(protocolo.TAM_TRAMA * 2)
+
+        def enviar(linea):
+            # +OK del módulo y enseguida el acuse del receptor
+            seq = int(linea.split(b",")[2][2:4], 16)
+            n = protocolo.codificar(acuse, seq, protocolo.CMD_ACK)
+            return b"+OK\r\n+RCV=2,%d,%s,-40,10" % (n, bytes(acuse[:n]))
+
+        self.modem = perifericos.RespondedorAT(((b"AT+SEND=", enviar),), latencia_us=40000)
+        machine.conectar_uart(2, self.modem)
+        import transmisor
+        self.t = transmisor
+        self.botones = [perifericos.Boton(b[0], semilla=b[0]) for b in transmisor.BOTONES[:4]]
+
+    def correr(self, n):
+        t = self.t
+        cola = t.cola
+        previos = cola.latencias.cantidad
+        for i in range(n):
+            self.botones[i % 4].presionar(en_ms=(i + 1) * 100)
+
+        async def programa():
+            asyncio_tarea = simulacion.asyncio.create_task(cola.tarea_envio())
+            botones = simulacion.asyncio.create_task(t.tarea_botones())
+            while cola.latencias.cantidad - previos < n - cola.fusionados:
+                await simulacion.asyncio.sleep(0.1)
+                if reloj.us > inicio + (n * 100 + 5000) * 1000:
+                    break
+            asyncio_tarea.cancel()
+            botones.cancel()
+
+        inicio = reloj.us
+        simulacion.ejecutar(programa())
+        self.latencias = cola.latencias
+        self.notas = (f"enviados={cola.latencias.cantidad} fusionados={cola.fusionados} "
+                      f"descartados={cola.descartados}")
+
+@escenario
+class Panel(Escenario):
+    """Ráfagas filtradas del ADC alrededor del umbral (avdc.py)"""
+
+    nombre = "avdc"
+    iteraciones = 2000
+
+    def preparar(self):
+        # 3.5 V en el panel con ±150 cuentas de ruido
+        centro = 3500 * 10 * 4095 // (3300 * 47)
+        perifericos.senal_adc(34, perifericos.senal_ruidosa(centro, 150, semilla=1))
+        import avdc
+        self.avdc = avdc
+        self.umbral = centro
+
+    def correr(self, n):
+        panel = self.avdc.panel
+        antes = panel.conmutaciones
+        adc = self.avdc.adc
+        sin_filtro = 0
+        arriba = False
+        for _ in range(n):
+            panel.paso()
+            # Lo que haría el código viejo: una lectura y un solo umbral
+            crudo = adc.read() > self.umbral
+            if crudo != arriba:
+                sin_filtro += 1
+                arriba = crudo
+            time.sleep_ms(100)
+        self.notas = (f"conmutaciones del relé: {panel.conmutaciones - antes} "
+                      f"(una lectura y umbral único: {sin_filtro})")
+
+@escenario
+class Rampas(Escenario):
+    """MotorRampas: 4 canales redirigidos mientras rampan (PWM.py)"""
+
+    nombre = "rampas"
+    iteraciones = 5000
+
+    def preparar(self):
+        import PWM
+        self.rampas = PWM.MotorRampas(PWM.GestorPWM())
+        self.canales = (12, 13, 15, 25)
+        for c in self.canales:
+            self.rampas.canal(c)
+
+    def correr(self, n):
+        rampas = self.rampas
+        for i in range(n):
+            if i % 50 == 0:
+                for j, c in enumerate(self.canales):
+                    rampas.rampa(c, (i // 50 + j) * 250 % 1024, 800, ("lineal", "suave", "rapido")[j % 3])
+            rampas.paso()
+            time.sleep_ms(20)
+        cambios = sum(machine.pwms[c].cambios for c in self.canales)
+        self.notas = f"escrituras de duty: {cambios}"
+
+class _Huella(Escenario):
+    """Base: sensor de huellas simulado con usuarios ya registrados"""
+
+    unidad = "ms"
+    iteraciones = 100
+    USUARIOS = 20
+    LATENCIAS = None        # Cambios sobre simulacion.huella.LATENCIAS_US
+
+    def preparar(self):
+        from simulacion.huella import SensorHuella
+        import biometrico
+        import random
+        # Respuestas en fragmentos de 8 bytes y 1% de respuestas corruptas
+        self.sensor = SensorHuella(latencias_us=self.LATENCIAS, fragmento=8, prob_corrupto=0.01, semilla=3)
+        machine.conectar_uart(2, self.sensor)
+        for u in range(self.USUARIOS):
+            self.sensor.registrar(u, 100 + u)
+        self.finger = biometrico.AdafruitFingerprint()
+        self.biometrico = biometrico
+        self.azar = random.Random(5)
+        self.fallidas = 0
+        self.ocupado_us = 0     # Tiempo virtual dentro del driver en correr()
+        self.bloqueo_us = 0     # Mayor tiempo que las demás tareas no corrieron
+
+    def _notas(self):
+        por_minuto = 60000000 * self.latencias.cantidad // max(1, self.ocupado_us)
+        self.notas = (f"fallidas={self.fallidas} respuestas corruptas={self.sensor.corruptos} "
+                      f"desbloqueos/min con el driver ocupado={por_minuto} "
+                      f"bloqueo máx={self.bloqueo_us // 1000}ms")
+
+    def _apoyar(self, i):
+        """Apoyar un dedo registrado dentro de 0-300 ms; retorna ese instante"""
+        en_ms = self.azar.randint(0, 300)
+        self.sensor.poner_dedo(100 + i % self.USUARIOS, en_ms, 1000)
+        return reloj.us + en_ms * 1000
+
+@escenario
+class Huella(_Huella):
+    """get_fingerprint() bloqueante: dedo apoyado → huella encontrada"""
+
+    nombre = "huella"
+
+    def correr(self, n):
+        self.fallidas = self.ocupado_us = self.bloqueo_us = 0
+        for i in range(n):
+            apoyo = self._apoyar(i)
+            inicio = reloj.us
+            try:
+                ok = self.finger.get_fingerprint()
+            except Exception:
+                ok = None
+            # Nada más corre mientras dura la llamada
+            self.bloqueo_us = max(self.bloqueo_us, reloj.us - inicio)
+            self.ocupado_us += reloj.us - inicio
+            if ok:
+                self.latencias.registrar((reloj.us - apoyo) // 1000)
+            else:
+                self.fallidas += 1
+            time.sleep_ms(1200)     # El usuario retira el dedo
+        self._notas()
+
+class _HuellaRepetidos(Huella):
+    """
+    Base: un conductor principal y algunos más (un vehículo) sobre una base
+    casi llena, lo más favorable para la cache; la secuencia es la misma
+    con y sin cache
+    """
+
+    USUARIOS = 160
+    FRECUENTES = 3
+    PRINCIPAL = 0.8         # Probabilidad de que apoye el conductor principal
+    CACHE = False
+
+    def preparar(self):
+        super().preparar()
+        if self.CACHE:
+            self.cache = self.biometrico.CacheHuellas(self.finger)
+
+    def _apoyar(self, i):
+        if self.azar.random() < self.PRINCIPAL:
+            return super()._apoyar(0)
+        return super()._apoyar(self.azar.randrange(1, self.FRECUENTES))
+
+    def _notas(self):
+        super()._notas()
+        if self.CACHE:
+            cache = self.cache
+            e = cache.estadisticas()
+            self.notas += (f" | cache: CharBuffer2={'sí' if cache.usar_buffer else 'no'} "
+                           f"candidatos en RAM={cache.candidatos} (a 115200: "
+                           f"{cache.MATCH_MS + cache.DOWNLOAD_MS + cache.BYTES_TEMPLATE * 10000 // 115200} ms c/u "
+                           f"vs SEARCH {cache.search_ms(self.USUARIOS)} ms) aciertos={e['aciertos']} "
+                           f"fallos={e['fallos']}")
+
+@escenario
+class HuellaSinCache(_HuellaRepetidos):
+    """Conductor principal que se repite, búsqueda 1:N en el sensor"""
+
+    nombre = "huella_sin_cache"
+
+@escenario
+class HuellaCache(_HuellaRepetidos):
+    """Conductor principal que se repite, CacheHuellas (MATCH contra el CharBuffer2)"""
+
+    nombre = "huella_cache"
+    CACHE = True
+
+@escenario
+class HuellaAsync(_Huella):
+    """get_fingerprint_async() con otra tarea de 10 ms corriendo al lado"""
+
+    nombre = "huella_async"
+
+    def correr(self, n):
+        self.fallidas = self.ocupado_us = self.bloqueo_us = 0
+        asyncio = simulacion.asyncio
+        finger = self.finger
+
+        async def latido():
+            # Otra tarea periódica: cuánto se atrasa mide el bloqueo
+            while True:
+                antes = reloj.us
+                await asyncio.sleep_ms(10)
+                self.bloqueo_us = max(self.bloqueo_us, reloj.us - antes - 10000)
+
+        async def programa():
+            tarea = asyncio.create_task(latido())
+            for i in range(n):
+                apoyo = self._apoyar(i)
+                inicio = reloj.us
+                try:
+                    ok = await finger.get_fingerprint_async()
+                except Exception:
+                    ok = None
+                self.ocupado_us += reloj.us - inicio
+                if ok:
+                    self.latencias.registrar((reloj.us - apoyo) // 1000)
+                else:
+                    self.fallidas += 1
+                await asyncio.sleep_ms(1200)
+            tarea.cancel()
+
+        simulacion.ejecutar(programa())
+        self._notas()
+
+@escenario
+class HuellaMaquina(_Huella):
+    """MaquinaHuella paso a paso con el back-off de sondeo"""
+
+    nombre = "huella_fsm"
+
+    def preparar(self):
+        super().preparar()
+        self.maquina = self.biometrico.MaquinaHuella(self.finger)
+
+    def correr(self, n):
+        maquina = self.maquina
+        self.fallidas = self.ocupado_us = self.bloqueo_us = self.repetidas = 0
+        for i in range(n):
+            apoyo = self._apoyar(i)
+            inicio = reloj.us
+            fin = inicio + 1000000
+            while reloj.us < fin:
+                antes = reloj.us
+                resultado = maquina.paso()
+                self.bloqueo_us = max(self.bloqueo_us, reloj.us - antes)
+                if resultado is not None:
+                    if resultado[0] == 0:
+                        self.latencias.registrar((reloj.us - apoyo) // 1000)
+                    else:
+                        self.fallidas += 1
+                    break
+                time.sleep_ms(max(1, maquina.espera_ms()))
+            else:
+                self.fallidas += 1
+            self.ocupado_us += reloj.us - inicio
+            # La máquina sigue corriendo mientras el dedo sigue apoyado (1 s);
+            # otro resultado para el mismo apoyo sería una lectura repetida
+            while reloj.us < apoyo + 1100000:
+                if maquina.paso() is not None and resultado is not None:
+                    self.repetidas += 1
+                time.sleep_ms(max(1, maquina.espera_ms()))
+            time.sleep_ms(1200)
+        self._notas()
+        self.notas += f" repetidas con el dedo apoyado={self.repetidas}"
+
+@escenario
+class HuellaArranque(Escenario):
+    """auto_detect_fingerprint(): arranque hasta sensor listo (biometrico.py)"""
+
+    nombre = "huella_arranque"
+    iteraciones = 3
+    unidad = "ms"
+
+    # Detección original: 4 pares de pines a 57600 y 3 s por intento
+    PINES_ANTES = ((17, 16), (16, 17), (25, 26), (26, 25))
+
+    def preparar(self):
+        import os
+        import tempfile
+        import biometrico
+        self.biometrico = biometrico
+        self.archivo = os.path.join(tempfile.mkdtemp(), "huella_config.txt")
+        biometrico.ARCHIVO_CONFIG = self.archivo
+
+    def _detectar(self, cableado, guardada, **kwargs):
+        """ms de arranque hasta el sensor listo, con o sin configuración guardada"""
+        import os
+        from simulacion.huella import SensorHuella
+        machine.conectar_uart(2, SensorHuella(cableado=cableado))
+        if not guardada and os.path.exists(self.archivo):
+            os.remove(self.archivo)
+        inicio = reloj.us
+        self.biometrico.auto_detect_fingerprint(**kwargs)
+        return (reloj.us - inicio) // 1000
+
+    def correr(self, n):
+        b = self.biometrico
+        fabrica = (17, 16, 57600)
+        reconfigurado = (26, 25, 115200)
+        for _ in range(n):
+            # Antes: sólo la tabla original, sin archivo y con 3 s por intento
+            pines, baudrates = b.PINES, b.BAUDRATES
+            b.PINES, b.BAUDRATES = self.PINES_ANTES, (57600,)
+            try:
+                antes_fabrica = self._detectar(fabrica, False, probe_timeout_ms=3000)
+                antes_peor = self._detectar((26, 25, 57600), False, probe_timeout_ms=3000)
+            finally:
+                b.PINES, b.BAUDRATES = pines, baudrates
+            # Ahora: arranque en frío (sin archivo) y con la configuración guardada
+            frio_fabrica = self._detectar(fabrica, False)
+            frio_peor = self._detectar(reconfigurado, False)
+            guardada = self._detectar(reconfigurado, True)
+            self.latencias.registrar(guardada)
+        sondeos = len(b.PINES) * len(b.BAUDRATES)
+        self.notas = (f"antes: de fábrica {antes_fabrica} ms, pines 26/25 {antes_peor} ms | "
+                      f"ahora en frío: de fábrica {frio_fabrica} ms, 115200 y pines 26/25 "
+                      f"{frio_peor} ms ({sondeos} sondeos) | con la configuración guardada {guardada} ms")
+
+class _UartEco:
+    """
+    UART mínima para medir sólo el driver: descarta lo escrito y entrega
+    siempre la misma respuesta, copiándola de un buffer fijo
+    """
+
+    def __init__(self, respuesta):
+        self._respuesta = memoryview(respuesta)
+        self._pos = len(respuesta)
+        self.escritos = 0
+
+    def rearmar(self):
+        """Dejar la respuesta lista para leer otra vez"""
+        self._pos = 0
+
+    def any(self):
+        return len(self._respuesta) - self._pos
+
+    def readinto(self, buf, n=None):
+        n = min(len(buf) if n is None else n, self.any())
+        buf[:n] = self._respuesta[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def write(self, datos):
+        self.escritos += len(datos)
+        return len(datos)
+
+@escenario
+class HuellaCodec(_Huella):
+    """Codificar un comando y decodificar su respuesta (biometrico.py, UART falsa)"""
+
+    nombre = "huella_codec"
+    iteraciones = 20000
+    unidad = "µs"
+
+    def preparar(self):
+        super().preparar()
+        from simulacion.huella import paquete, ACK, DATOS
+        # Respuesta de SEARCH (id 5, confianza 100) y un paquete de template
+        self.respuestas = (_UartEco(paquete(ACK, bytes((0, 0, 5, 0, 100)))),
+                           _UartEco(paquete(DATOS, bytes(128))))
+
+    def correr(self, n):
+        finger = self.finger
+        uart_real = finger.uart
+        codificar = decodificar = 0.0
+        try:
+            for i in range(n):
+                uart = self.respuestas[i & 1]
+                finger.uart = uart
+                t0 = _perf()
+                finger._send_fingerSearch(1)
+                t1 = _perf()
+                uart.rearmar()
+                tipo, datos = finger._read_packet()
+                t2 = _perf()
+                codificar += t1 - t0
+                decodificar += t2 - t1
+                if len(datos) not in (5, 128):
+                    raise AssertionError("respuesta mal decodificada")
+        finally:
+            finger.uart = uart_real
+        self.notas = (f"por paquete: codificar {codificar / n * 1e6:.1f} µs, "
+                      f"decodificar {decodificar / n * 1e6:.1f} µs "
+                      f"(respuestas de 16 y 139 bytes; memoria en las columnas pico/bloques)")
+
+class _Enlace(Escenario):
+    """
+    Base: transmisor y receptor reales, cada uno en su placa, con módulos
+    LoRa simulados unidos por un canal. Mide pulsación → relé aplicado.
+    """
+
+    unidad = "ms"
+    iteraciones = 60
+    PERFIL = None           # Perfil fijo de calidad_enlace (None = de fábrica)
+    ADAPTATIVO = False      # Perfil según la calidad del enlace
+    INTERVALO_MS = 2000     # Entre pulsaciones
+    PERDIDA = 0.02
+    SNR = 3
+
+    def preparar(self):
+        from collections import deque
+        from simulacion.lora import Canal, ModemLoRa
+        self.canal = Canal(perdida=self.PERDIDA, rssi=-95, snr=self.SNR, semilla=7)
+
+        # El receptor queda como placa activa: sus relés escriben en mem32
+        machine.placa(self.nombre + "_tx")
+        self.modem_tx = ModemLoRa(self.canal)
+        machine.conectar_uart(2, self.modem_tx)
+        self.t = cargar("transmisor")
+        self.botones = [perifericos.Boton(b[0], semilla=b[0]) for b in self.t.BOTONES[:4]]
+        machine.placa(self.nombre + "_rx")
+        self.modem_rx = ModemLoRa(self.canal)
+        machine.conectar_uart(2, self.modem_rx)
+        self.r = cargar("receptor")
+
+        for programa in (self.t, self.r):
+            programa.setup_lora()
+        if self.PERFIL is not None:
+            from calidad_enlace import COMANDOS
+            self.t.parser_at.comando(COMANDOS[self.PERFIL])
+            self.r.parser_at.comando(COMANDOS[self.PERFIL])
+            self.t.perfil = self.r.seguidor.perfil = self.PERFIL
+        self.t.adaptativo = self.ADAPTATIVO
+        self.r.system_on = True
+
+        # Anotar cada comando que llega a los relés
+        self.pulsaciones = deque()
+        procesar = self.r.procesar_codigo
+
+        def procesar_y_medir(codigo):
+            procesar(codigo)
+            self._aplicado(codigo)
+
+        self.r.procesar_codigo = procesar_y_medir
+
+    def _aplicado(self, codigo):
+        """Emparejar con la pulsación más vieja de ese código (las anteriores se perdieron)"""
+        pulsaciones = self.pulsaciones
+        while pulsaciones:
+            marca, pulsado = pulsaciones.popleft()
+            if pulsado == codigo:
+                self.latencias.registrar((reloj.us - marca) // 1000)
+                self.aplicados += 1
+                return
+            self.perdidas += 1
+
+    async def _receptor(self):
+        """El bucle principal de receptor.py"""
+        while True:
+            self.r.atender()
+            await simulacion.asyncio.sleep_ms(5)
+
+    def correr(self, n):
+        self.aplicados = self.perdidas = 0
+        inicio = reloj.us
+        for i in range(n):
+            en_ms = (i + 1) * self.INTERVALO_MS
+            boton = i % len(self.botones)
+            self.botones[boton].presionar(en_ms=en_ms)
+            self.pulsaciones.append((reloj.us + en_ms * 1000, self.t.BOTONES[boton][1]))
+        fin_ms = (n + 1) * self.INTERVALO_MS + 5000
+
+        async def programa():
+            simulacion.asyncio.create_task(self.t.cola.tarea_envio())
+            simulacion.asyncio.create_task(self.t.tarea_botones())
+            simulacion.asyncio.create_task(self._receptor())
+            await simulacion.asyncio.sleep_ms(fin_ms)
+
+        simulacion.ejecutar(programa())
+        self.perdidas += len(self.pulsaciones)
+        self.pulsaciones.clear()
+        segundos = (reloj.us - inicio) / 1000000
+        canal = self.canal
+        acuses = self.t.acuses
+        self.notas = (f"aplicados={self.aplicados}/{n} ({self.aplicados / segundos:.2f}/s) "
+                      f"descartados en cola={self.t.cola.descartados} | acuses: {acuses.tasa():.0f}% "
+                      f"retransmisiones={acuses.retransmisiones} repetidas={self.r.duplicados.duplicados} "
+                      f"RTO={acuses.rto_ms}ms | canal: perdidos={canal.perdidos} "
+                      f"colisiones={canal.colisiones} débiles={canal.debiles} "
+                      f"aire={100 * canal.ocupado_us // max(1, reloj.us - inicio)}%")
+
+@escenario
+class Enlace(_Enlace):
+    """Pulsación → relé con los parámetros de fábrica (SF12, 125 kHz)"""
+
+    nombre = "enlace"
+
+@escenario
+class EnlaceSF9(_Enlace):
+    """Pulsación → relé con SF9 / 125 kHz"""
+
+    nombre = "enlace_sf9"
+    PERFIL = 2              # SF9 / 125 kHz
+
+@escenario
+class EnlacePerdidas(_Enlace):
+    """Pulsación → relé con SF9 y 20% de paquetes perdidos (retransmisiones)"""
+
+    nombre = "enlace_perdidas"
+    PERFIL = 2              # SF9 / 125 kHz
+    PERDIDA = 0.2
+
+@escenario
+class EnlaceTasa(_Enlace):
+    """Tasa sostenida: una pulsación cada 100 ms con SF9"""
+
+    nombre = "enlace_tasa"
+    iteraciones = 200
+    PERFIL = 2              # SF9 / 125 kHz
+    INTERVALO_MS = 100
+
+@escenario
+class EnlaceAdaptativo(_Enlace):
+    """
+    Perfil adaptativo: la SNR baja de a 1 dB hasta SNR_MINIMA en el
+    segundo tercio de la corrida y vuelve a subir en el último; el enlace
+    debe pasar a perfiles robustos y volver a los rápidos
+    """
+
+    nombre = "enlace_adaptativo"
+    iteraciones = 90        # La SNR cambia 1 dB cada ~1.6 s
+    ADAPTATIVO = True
+    SNR = 8
+    SNR_MINIMA = -11
+
+    def correr(self, n):
+        from calidad_enlace import NOMBRES
+        t = self.t
+        tercio_us = n * self.INTERVALO_MS * 1000 // 3
+        pasos = self.SNR - self.SNR_MINIMA
+        for i in range(1, pasos + 1):
+            cuando_us = i * tercio_us // (2 * pasos)
+            reloj.programar(tercio_us + cuando_us, setattr, self.canal, "snr", self.SNR - i)
+            reloj.programar(2 * tercio_us + cuando_us, setattr, self.canal, "snr", self.SNR_MINIMA + i)
+        cambios = t.monitor.cambios
+        super().correr(n)
+        latencias = []
+        for i in range(len(NOMBRES)):
+            lat = t.monitor.latencias[i]
+            if lat.cantidad:
+                latencias.append(f"{NOMBRES[i]}={lat.percentiles()[0]}ms×{lat.cantidad}")
+        self.notas += (f" | perfil={NOMBRES[t.perfil]} cambios={t.monitor.cambios - cambios} "
+                       f"receptor={NOMBRES[self.r.seguidor.perfil]} p50: {' '.join(latencias)}")
+
+@escenario
+class EnlaceCorte(_Enlace):
+    """
+    Corte de CORTE_MS en el perfil más rápido: TX se queda sin acuses y
+    vuelve solo al robusto; RX lo sigue al no oír nada (SILENCIOS_MS)
+    """
+
+    nombre = "enlace_corte"
+    iteraciones = 30
+    ADAPTATIVO = True
+    PERFIL = 0              # SF7 / 250 kHz
+    CORTE_MS = 4000
+
+    def _vigilar(self, desde_us, hasta_us):
+        """Anotar cuándo TX y RX pasan al robusto después del corte"""
+        from calidad_enlace import PERFIL_ROBUSTO
+        if reloj.us >= desde_us:
+            for nombre, perfil in (("tx", self.t.perfil), ("rx", self.r.seguidor.perfil)):
+                if perfil == PERFIL_ROBUSTO and nombre not in self.robusto:
+                    self.robusto[nombre] = (reloj.us - desde_us) // 1000
+        if reloj.us < hasta_us and len(self.robusto) < 2:
+            reloj.programar(10000, self._vigilar, desde_us, hasta_us)
+
+    def correr(self, n):
+        from calidad_enlace import COMANDOS, NOMBRES, SILENCIOS_MS
+        # Cada pasada arranca con los dos en el perfil rápido
+        for programa in (self.t, self.r):
+            programa.parser_at.comando(COMANDOS[self.PERFIL])
+        self.t.perfil = self.r.seguidor.perfil = self.PERFIL
+        self.r.seguidor.recibido()
+
+        corte_us = n * self.INTERVALO_MS * 1000 // 3
+        perdida = self.canal.perdida
+        reloj.programar(corte_us, setattr, self.canal, "perdida", 1.0)
+        reloj.programar(corte_us + self.CORTE_MS * 1000, setattr, self.canal, "perdida", perdida)
+        self.robusto = {}
+        fin_us = ((n + 1) * self.INTERVALO_MS + 5000) * 1000   # Lo que dura _Enlace.correr
+        reloj.programar(0, self._vigilar, reloj.us + corte_us, reloj.us + fin_us)
+        super().correr(n)
+
+        tx, rx = self.robusto.get("tx"), self.robusto.get("rx")
+        if tx is None or rx is None:
+            raise AssertionError(f"sin vuelta al robusto tras el corte: {self.robusto}")
+        self.notas += (f" | tras el corte: TX al robusto a los {tx} ms, RX a los {rx} ms "
+                       f"(desfasados {rx - tx} ms; silencio en {NOMBRES[self.PERFIL]}: "
+                       f"{SILENCIOS_MS[self.PERFIL]} ms, antes 12000 ms fijos)")
+
+def main(nombres):
+    elegidos = [e for e in ESCENARIOS if not nombres or e.nombre in nombres]
+    if not elegidos:
+        print(f"Escenarios: {', '.join(e.nombre for e in ESCENARIOS)}")
+        return
+    resultados = []
+    for clase in elegidos:
+        resultados.append(medir(clase()))
+    reporte(resultados)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
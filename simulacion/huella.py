@@ -0,0 +1,395 @@
+# ========================================
+# SENSOR DE HUELLAS SIMULADO (R30x / ZMFO40)
+# ========================================
+#
+# Habla el protocolo de paquetes del sensor (0xEF01, dirección, tipo,
+# longitud, datos, checksum) del otro lado de una UART simulada:
+#
+#   sensor = SensorHuella()
+#   machine.conectar_uart(2, sensor)       # antes de crear el driver
+#   sensor.poner_dedo(3, en_ms=200)        # el dedo del usuario 3
+#   finger = biometrico.AdafruitFingerprint()
+#
+# Cada dedo se identifica con un número: su template lleva ese número y
+# la búsqueda encuentra las ubicaciones guardadas con el mismo dedo. Las
+# respuestas tardan lo que dice LATENCIAS_US, pueden llegar en fragmentos
+# de pocos bytes y se pueden inyectar errores, todo determinista con la
+# semilla.
+
+import random
+
+from simulacion.reloj import reloj
+
+# Paquetes
+INICIO = b"\xef\x01"
+COMANDO = 0x01
+DATOS = 0x02
+ACK = 0x07
+FIN_DATOS = 0x08
+
+# Comandos
+VERIFYPASSWORD = 0x13
+GETIMAGE = 0x01
+IMAGE2TZ = 0x02
+MATCH = 0x03
+SEARCH = 0x04
+REGMODEL = 0x05
+STORE = 0x06
+LOAD = 0x07
+UPLOAD = 0x08
+DOWNLOAD = 0x09
+DELETE = 0x0C
+EMPTY = 0x0D
+TEMPLATECOUNT = 0x1D
+READINDEXTABLE = 0x1F
+
+# Códigos de confirmación
+OK = 0x00
+ERROR_PAQUETE = 0x01
+SIN_DEDO = 0x02
+NO_COINCIDE = 0x08
+NO_ENCONTRADA = 0x09
+REGISTRO_DISTINTO = 0x0A
+UBICACION_MALA = 0x0B
+ERROR_CARGA = 0x0C
+ERROR_CONTRASENA = 0x13
+SIN_IMAGEN = 0x15
+
+CAPACIDAD = 0xA4        # Ubicaciones 0-163, igual que el driver
+TAM_TEMPLATE = 512      # Bytes por template (4 paquetes de 128)
+TAM_PAQUETE = 128
+
+# Tiempo de proceso de cada comando en µs (valores típicos del R307)
+LATENCIAS_US = {
+    VERIFYPASSWORD: 2000,
+    GETIMAGE: 90000,
+    IMAGE2TZ: 250000,
+    MATCH: 30000,
+    SEARCH: 20000,       # Más SEARCH_POR_TEMPLATE_US por ubicación ocupada
+    REGMODEL: 40000,
+    STORE: 30000,
+    LOAD: 10000,
+    UPLOAD: 5000,
+    DOWNLOAD: 5000,
+    DELETE: 20000,
+    EMPTY: 50000,
+    TEMPLATECOUNT: 2000,
+    READINDEXTABLE: 2000,
+}
+SIN_DEDO_US = 25000          # GETIMAGE sin dedo contesta antes
+SEARCH_POR_TEMPLATE_US = 600
+
+def template(dedo, variante=0):
+    """Template de un dedo: número de dedo, variante de captura y relleno fijo"""
+    relleno = random.Random(dedo).randbytes(TAM_TEMPLATE - 4)
+    return bytes((dedo >> 8, dedo & 0xFF, variante & 0xFF, 0)) + relleno
+
+def dedo_de(datos):
+    """Número de dedo de un template (None si no hay template)"""
+    if not datos or len(datos) < 2:
+        return None
+    return (datos[0] << 8) | datos[1]
+
+def paquete(tipo, datos, direccion=0xFFFFFFFF):
+    """Armar un paquete completo con su checksum"""
+    largo = len(datos) + 2
+    suma = tipo + (largo >> 8) + (largo & 0xFF) + sum(datos)
+    return (INICIO + direccion.to_bytes(4, "big") + bytes((tipo, largo >> 8, largo & 0xFF))
+            + bytes(datos) + bytes(((suma >> 8) & 0xFF, suma & 0xFF)))
+
+class SensorHuella:
+    """
+    Sensor de huellas del otro lado de una UART simulada
+
+    Parámetros:
+    - password, direccion: Los del sensor (el driver usa 0 y 0xFFFFFFFF)
+    - latencias_us: Cambios sobre LATENCIAS_US por comando
+    - fragmento: Bytes por entrega de la UART (0 = el paquete entero)
+    - prob_corrupto: Probabilidad de que una respuesta llegue con mal checksum
+    - prob_perdido: Probabilidad de que una respuesta no llegue
+    - prob_basura: Probabilidad de bytes basura antes de una respuesta
+    - semilla: Para que los errores y las confianzas se repitan
+    - cableado: (tx, rx, baudrate) con que contesta; con otros pines u otro
+      baudrate no oye nada (None = con cualquiera)
+    """
+
+    def __init__(self, password=0, direccion=0xFFFFFFFF, latencias_us=None, fragmento=0,
+                 prob_corrupto=0.0, prob_perdido=0.0, prob_basura=0.0, semilla=1, cableado=None):
+        self.password = password
+        self.cableado = cableado
+        self.direccion = direccion
+        self.latencias_us = dict(LATENCIAS_US)
+        if latencias_us:
+            self.latencias_us.update(latencias_us)
+        self.fragmento = fragmento
+        self.prob_corrupto = prob_corrupto
+        self.prob_perdido = prob_perdido
+        self.prob_basura = prob_basura
+        self._azar = random.Random(semilla)
+
+        self.uart = None
+        self._entrada = bytearray()
+        self._libre_us = 0          # El sensor atiende un comando a la vez
+        self._descarga = None       # (slot, bytearray) durante un DOWNLOAD
+        self._forzados = {}         # comando -> [código, veces]
+
+        self.dedo = None            # Dedo apoyado ahora (número) o None
+        self._capturas = 0
+        self.imagen = None          # Dedo de la última imagen capturada
+        self.buffers = {1: None, 2: None}
+        self.base = {}              # ubicación -> template
+
+        # Estadísticas
+        self.comandos = {}          # comando -> cantidad
+        self.corruptos = 0
+        self.perdidos = 0
+        self.malos = 0              # Paquetes del driver con mal checksum
+
+    # ---- Conexión ----
+
+    def conectar(self, uart):
+        self.uart = uart
+        uart.dispositivo = self
+
+    # ---- Escenario ----
+
+    def poner_dedo(self, dedo, en_ms=0, duracion_ms=1000):
+        """Apoyar el dedo número dedo dentro de en_ms, durante duracion_ms"""
+        reloj.programar(en_ms * 1000, self._apoyar, dedo)
+        reloj.programar((en_ms + duracion_ms) * 1000, self._retirar, dedo)
+
+    def _apoyar(self, dedo):
+        self.dedo = dedo
+
+    def _retirar(self, dedo):
+        if self.dedo == dedo:
+            self.dedo = None
+
+    def registrar(self, ubicacion, dedo):
+        """Guardar directamente un dedo en la base (sin pasar por el driver)"""
+        self.base[ubicacion] = template(dedo)
+
+    def forzar(self, comando, codigo, veces=1):
+        """Hacer que las próximas veces respuestas a comando sean codigo"""
+        self._forzados[comando] = [codigo, veces]
+
+    # ---- Recepción desde el driver ----
+
+    def recibir(self, datos):
+        if self.cableado and self.cableado != (self.uart.tx, self.uart.rx, self.uart.baudrate):
+            return
+        entrada = self._entrada
+        entrada += datos
+        while True:
+            # Resincronizar con el start code
+            i = entrada.find(INICIO)
+            if i < 0:
+                del entrada[:max(0, len(entrada) - 1)]
+                return
+            if i:
+                del entrada[:i]
+            if len(entrada) < 9:
+                return
+            largo = (entrada[7] << 8) | entrada[8]
+            total = 9 + largo
+            if len(entrada) < total:
+                return
+            tipo = entrada[6]
+            cuerpo = bytes(entrada[9:total - 2])
+            suma = (entrada[total - 2] << 8) | entrada[total - 1]
+            del entrada[:total]
+            if (tipo + (largo >> 8) + (largo & 0xFF) + sum(cuerpo)) & 0xFFFF != suma:
+                self.malos += 1
+                if tipo == COMANDO:
+                    self._responder(ERROR_PAQUETE, 1000)
+                continue
+            self._paquete(tipo, cuerpo)
+
+    def _paquete(self, tipo, cuerpo):
+        if self._descarga is not None:
+            if tipo in (DATOS, FIN_DATOS):
+                self._descarga[1].extend(cuerpo)
+                if tipo == FIN_DATOS:
+                    slot, datos = self._descarga
+                    self.buffers[slot] = bytes(datos)
+                    self._descarga = None
+                return
+            self._descarga = None
+        if tipo == COMANDO and cuerpo:
+            self._comando(cuerpo[0], cuerpo[1:])
+
+    # ---- Comandos ----
+
+    def _comando(self, cmd, p):
+        self.comandos[cmd] = self.comandos.get(cmd, 0) + 1
+        latencia = self.latencias_us.get(cmd, 2000)
+
+        forzado = self._forzados.get(cmd)
+        if forzado:
+            forzado[1] -= 1
+            if forzado[1] <= 0:
+                del self._forzados[cmd]
+            self._responder(forzado[0], latencia)
+            return
+
+        if cmd == VERIFYPASSWORD:
+            clave = int.from_bytes(p[:4], "big")
+            self._responder(OK if clave == self.password else ERROR_CONTRASENA, latencia)
+
+        elif cmd == GETIMAGE:
+            if self.dedo is None:
+                self._responder(SIN_DEDO, SIN_DEDO_US)
+            else:
+                self.imagen = self.dedo
+                self._capturas += 1
+                self._responder(OK, latencia)
+
+        elif cmd == IMAGE2TZ:
+            slot = p[0] if p else 1
+            if self.imagen is None or slot not in self.buffers:
+                self._responder(SIN_IMAGEN, latencia)
+            else:
+                self.buffers[slot] = template(self.imagen, self._capturas)
+                self._responder(OK, latencia)
+
+        elif cmd == REGMODEL:
+            a, b = dedo_de(self.buffers[1]), dedo_de(self.buffers[2])
+            if a is None or a != b:
+                self._responder(REGISTRO_DISTINTO, latencia)
+            else:
+                self.buffers[1] = self.buffers[2] = template(a)
+                self._responder(OK, latencia)
+
+        elif cmd == STORE:
+            slot, ubicacion = p[0], (p[1] << 8) | p[2]
+            if ubicacion >= CAPACIDAD or not self.buffers.get(slot):
+                self._responder(UBICACION_MALA, latencia)
+            else:
+                self.base[ubicacion] = self.buffers[slot]
+                self._responder(OK, latencia)
+
+        elif cmd == LOAD:
+            slot, ubicacion = p[0], (p[1] << 8) | p[2]
+            if ubicacion not in self.base or slot not in self.buffers:
+                self._responder(ERROR_CARGA, latencia)
+            else:
+                self.buffers[slot] = self.base[ubicacion]
+                self._responder(OK, latencia)
+
+        elif cmd == SEARCH:
+            slot = p[0]
+            inicio, cantidad = (p[1] << 8) | p[2], (p[3] << 8) | p[4]
+            dedo = dedo_de(self.buffers.get(slot))
+            latencia += SEARCH_POR_TEMPLATE_US * len(self.base)
+            for ubicacion in range(inicio, inicio + cantidad + 1):
+                if dedo is not None and dedo_de(self.base.get(ubicacion)) == dedo:
+                    confianza = self._azar.randint(60, 250)
+                    self._responder(OK, latencia, (ubicacion >> 8, ubicacion & 0xFF,
+                                                   confianza >> 8, confianza & 0xFF))
+                    return
+            self._responder(NO_ENCONTRADA, latencia, (0, 0, 0, 0))
+
+        elif cmd == MATCH:
+            a, b = dedo_de(self.buffers[1]), dedo_de(self.buffers[2])
+            if a is not None and a == b:
+                puntaje = self._azar.randint(60, 250)
+                self._responder(OK, latencia, (puntaje >> 8, puntaje & 0xFF))
+            else:
+                self._responder(NO_COINCIDE, latencia, (0, 0))
+
+        elif cmd == UPLOAD:
+            datos = self.buffers.get(p[0])
+            if not datos:
+                self._responder(ERROR_CARGA, latencia)
+                return
+            t = self._responder(OK, latencia)
+            for i in range(0, len(datos), TAM_PAQUETE):
+                tipo = FIN_DATOS if i + TAM_PAQUETE >= len(datos) else DATOS
+                t = self._enviar(paquete(tipo, datos[i:i + TAM_PAQUETE], self.direccion), t)
+
+        elif cmd == DOWNLOAD:
+            if p[0] not in self.buffers:
+                self._responder(ERROR_PAQUETE, latencia)
+            else:
+                self._descarga = (p[0], bytearray())
+                self._responder(OK, latencia)
+
+        elif cmd == DELETE:
+            ubicacion, cantidad = (p[0] << 8) | p[1], (p[2] << 8) | p[3]
+            for u in range(ubicacion, ubicacion + cantidad):
+                self.base.pop(u, None)
+            self._responder(OK, latencia)
+
+        elif cmd == EMPTY:
+            self.base.clear()
+            self._responder(OK, latencia)
+
+        elif cmd == TEMPLATECOUNT:
+            n = len(self.base)
+            self._responder(OK, latencia, (n >> 8, n & 0xFF))
+
+        elif cmd == READINDEXTABLE:
+            tabla = bytearray(32)
+            pagina = p[0] if p else 0
+            for u in self.base:
+                i = u - pagina * 256
+                if 0 <= i < 256:
+                    tabla[i >> 3] |= 1 << (i & 7)
+            self._responder(OK, latencia, tabla)
+
+        else:
+            self._responder(ERROR_PAQUETE, latencia)
+
+    # ---- Respuestas ----
+
+    def _responder(self, codigo, latencia_us, datos=()):
+        """Programar el ACK; retorna el instante (µs) en que termina de llegar"""
+        inicio = max(reloj.us, self._libre_us) + latencia_us
+        return self._enviar(paquete(ACK, bytes((codigo,)) + bytes(datos), self.direccion), inicio)
+
+    def _enviar(self, datos, inicio_us):
+        """Entregar un paquete desde inicio_us aplicando los errores configurados"""
+        azar = self._azar
+        fin = inicio_us + self.uart.tiempo_us(len(datos))
+        self._libre_us = fin
+        if self.prob_perdido and azar.random() < self.prob_perdido:
+            self.perdidos += 1
+            return fin
+        if self.prob_corrupto and azar.random() < self.prob_corrupto:
+            self.corruptos += 1
+            datos = bytearray(datos)
+            datos[-1] ^= 0x5A
+        if self.prob_basura and azar.random() < self.prob_basura:
+            datos = bytes((0x00, 0xEF, 0x55)) + bytes(datos)
+        self.uart.entregar(datos, inicio_us - reloj.us, self.fragmento)
+        return fin
+
+if __name__ == "__main__":
+    # Ida y vuelta de la base: exportar, vaciar, importar y comparar
+    import io
+    import time
+    import simulacion
+    simulacion.instalar()
+    from simulacion import machine
+    import biometrico
+
+    sensor = SensorHuella(fragmento=7)
+    machine.conectar_uart(2, sensor)
+    finger = biometrico.AdafruitFingerprint()
+
+    for ubicacion, dedo in ((0, 11), (5, 12), (40, 13), (163, 14)):
+        sensor.poner_dedo(dedo, en_ms=200, duracion_ms=800)
+        sensor.poner_dedo(dedo, en_ms=2000, duracion_ms=600)
+        finger.enroll_finger(ubicacion)
+        time.sleep_ms(1000)     # El usuario se va antes del siguiente
+    original = dict(sensor.base)
+
+    volcado = io.BytesIO()
+    assert finger.export_database(volcado) == len(original)
+    finger.emptyDatabase()
+    assert not sensor.base
+    volcado.seek(0)
+    assert finger.import_database(volcado) == len(original)
+    assert sensor.base == original
+    print(f"✅ Ida y vuelta de {len(original)} templates ({len(volcado.getvalue())} bytes), "
+          f"{reloj.ms()} ms virtuales")
@@ -0,0 +1,293 @@
+# ========================================
+# MÓDULOS LORA AT SIMULADOS Y CANAL DE RADIO
+# ========================================
+#
+# Varios módulos tipo REYAX RYLR896/998 unidos por un canal:
+#
+#   canal = Canal(perdida=0.02)
+#   machine.placa("transmisor")
+#   machine.conectar_uart(2, ModemLoRa(canal))
+#   import transmisor                  # habla AT como con el módulo real
+#   machine.placa("receptor")
+#   machine.conectar_uart(2, ModemLoRa(canal))
+#   ...
+#
+# Cada módulo contesta AT, AT+ADDRESS, AT+NETWORKID, AT+PARAMETER,
+# AT+BAND, AT+MODE y AT+SEND por la UART simulada. AT+SEND ocupa el aire
+# el tiempo que corresponde a SF/BW/CR (fórmula de Semtech) y contesta
+# +OK al terminar, como el módulo real. Del otro lado llega
+# +RCV=<origen>,<largo>,<datos>,<RSSI>,<SNR> si coinciden red, dirección
+# y parámetros, el módulo no estaba transmitiendo, no hubo colisión y el
+# paquete no se perdió.
+
+import math
+import random
+
+from simulacion.reloj import reloj
+
+# Ancho de banda por código de AT+PARAMETER (kHz)
+ANCHOS_KHZ = (7.8, 10.4, 15.6, 20.8, 31.25, 41.7, 62.5, 125, 250, 500)
+
+# SNR mínima que se demodula por SF (dB, hoja de datos del SX1276)
+SNR_MINIMA = {7: -7.5, 8: -10.0, 9: -12.5, 10: -15.0, 11: -17.5, 12: -20.0}
+
+PARAMETRO_DE_FABRICA = (12, 7, 1, 4)    # SF12, 125 kHz, 4/5, preámbulo 4
+MAX_DATOS = 240
+
+# Errores del módulo
+ERR_SIN_FIN = 1         # Falta \r\n
+ERR_SIN_AT = 2          # No empieza con AT
+ERR_SIN_IGUAL = 3       # Falta el "="
+ERR_DESCONOCIDO = 4     # Comando desconocido
+ERR_TX_OCUPADO = 10     # Transmisión en curso
+ERR_LARGO = 13          # Más de MAX_DATOS bytes
+ERR_PARAMETRO = 15      # Valor fuera de rango
+
+def tiempo_aire_us(largo, sf=12, bw=7, cr=1, preambulo=4):
+    """
+    Tiempo en el aire de un paquete de largo bytes (cabecera explícita, CRC)
+
+    Parámetros: los de AT+PARAMETER (bw y cr son los códigos del módulo)
+    """
+    tsym = (1 << sf) / (ANCHOS_KHZ[bw] * 1000)
+    optimizar = 1 if tsym > 0.016 else 0    # Low data rate optimize
+    simbolos = 8 + max(math.ceil((8 * largo - 4 * sf + 28 + 16) / (4 * (sf - 2 * optimizar))) * (cr + 4), 0)
+    return int((preambulo + 4.25 + simbolos) * tsym * 1000000)
+
+def _ruido_bw(bw):
+    """dB de ruido extra de un ancho de banda respecto de 125 kHz"""
+    return 10 * math.log10(ANCHOS_KHZ[bw] / 125)
+
+class Canal:
+    """
+    Aire compartido por los módulos
+
+    Parámetros:
+    - perdida: Probabilidad de perder un paquete que llegaría bien
+    - rssi, snr: Nivel y relación señal/ruido por defecto de cada enlace
+      (la SNR es la de 125 kHz: un BW más ancho junta más ruido)
+    - variacion_db: Desvío (gaussiano) de RSSI y SNR por paquete
+    - semilla: Para que pérdidas y niveles se repitan
+    """
+
+    def __init__(self, perdida=0.0, rssi=-80, snr=8, variacion_db=2, semilla=1):
+        self.perdida = perdida
+        self.rssi = rssi
+        self.snr = snr
+        self.variacion_db = variacion_db
+        self._azar = random.Random(semilla)
+        self._enlaces = {}      # (id a, id b) -> (rssi, snr)
+        self.modems = []
+        self._en_aire = []      # Transmisiones en curso
+
+        # Estadísticas
+        self.enviados = 0
+        self.entregados = 0
+        self.perdidos = 0
+        self.colisiones = 0
+        self.debiles = 0        # SNR por debajo de lo que demodula el SF
+        self.ocupado_us = 0     # Tiempo total de aire
+
+    def enlace(self, a, b, rssi, snr):
+        """Fijar el nivel entre dos módulos (en ambos sentidos)"""
+        self._enlaces[(id(a), id(b))] = self._enlaces[(id(b), id(a))] = (rssi, snr)
+
+    def transmitir(self, origen, destino, datos):
+        """Poner un paquete en el aire; retorna su tiempo de aire en µs"""
+        aire = tiempo_aire_us(len(datos), *origen.parametro)
+        tx = [origen, reloj.us, reloj.us + aire, destino, datos, False]
+        # Dos transmisiones con los mismos parámetros que se pisan chocan
+        for otra in self._en_aire:
+            if otra[0].parametro == origen.parametro:
+                otra[5] = tx[5] = True
+        self._en_aire.append(tx)
+        self.enviados += 1
+        self.ocupado_us += aire
+        reloj.programar(aire, self._terminar, tx)
+        return aire
+
+    def _terminar(self, tx):
+        self._en_aire.remove(tx)
+        origen, inicio, fin, destino, datos, choco = tx
+        azar = self._azar
+        for modem in self.modems:
+            if modem is origen or not modem.escucha(origen, destino, inicio):
+                continue
+            if choco:
+                self.colisiones += 1
+                continue
+            rssi, snr = self._enlaces.get((id(origen), id(modem)), (self.rssi, self.snr))
+            rssi = round(rssi + azar.gauss(0, self.variacion_db))
+            snr = round(snr - _ruido_bw(origen.parametro[1]) + azar.gauss(0, self.variacion_db))
+            if snr < SNR_MINIMA[origen.parametro[0]]:
+                self.debiles += 1
+                continue
+            if self.perdida and azar.random() < self.perdida:
+                self.perdidos += 1
+                continue
+            self.entregados += 1
+            modem.recibir_radio(origen.direccion, datos, rssi, snr)
+
+class ModemLoRa:
+    """
+    Módulo LoRa AT del otro lado de una UART simulada
+
+    Parámetros:
+    - canal: Canal compartido
+    - direccion, red: Valores iniciales de AT+ADDRESS y AT+NETWORKID
+    - latencia_us: Tiempo de respuesta a un comando de configuración
+    """
+
+    def __init__(self, canal, direccion=0, red=0, latencia_us=1000):
+        self.canal = canal
+        self.direccion = direccion
+        self.red = red
+        self.parametro = PARAMETRO_DE_FABRICA
+        self.banda = 915000000
+        self.modo = 0
+        self.latencia_us = latencia_us
+        self.uart = None
+        self._linea = bytearray()
+        self._tx_hasta = 0      # Fin de la transmisión en curso (µs)
+        canal.modems.append(self)
+
+        # Estadísticas
+        self.comandos = 0
+        self.enviados = 0
+        self.recibidos = 0
+        self.errores = 0
+
+    def conectar(self, uart):
+        self.uart = uart
+        uart.dispositivo = self
+
+    # ---- UART ----
+
+    def recibir(self, datos):
+        for byte in datos:
+            if byte == 10:
+                linea = bytes(self._linea)
+                self._linea = bytearray()
+                if linea.endswith(b"\r"):
+                    self._comando(linea[:-1])
+                else:
+                    self._error(ERR_SIN_FIN)
+            else:
+                self._linea.append(byte)
+
+    def _responder(self, texto, retardo_us=None):
+        retardo = self.latencia_us if retardo_us is None else retardo_us
+        self.uart.entregar(texto + b"\r\n", retardo)
+
+    def _error(self, codigo):
+        self.errores += 1
+        self._responder(b"+ERR=%d" % codigo)
+
+    # ---- Comandos ----
+
+    def _comando(self, linea):
+        self.comandos += 1
+        if not linea.startswith(b"AT"):
+            self._error(ERR_SIN_AT)
+            return
+        if linea == b"AT":
+            self._responder(b"+OK")
+            return
+        if not linea.startswith(b"AT+"):
+            self._error(ERR_DESCONOCIDO)
+            return
+
+        nombre, igual, valor = linea[3:].partition(b"=")
+        consulta = nombre.endswith(b"?")
+        if consulta:
+            nombre = nombre[:-1]
+        elif not igual:
+            self._error(ERR_SIN_IGUAL)
+            return
+
+        if nombre == b"SEND":
+            if consulta:
+                self._error(ERR_DESCONOCIDO)
+            else:
+                self._enviar(valor)
+            return
+
+        if nombre == b"ADDRESS":
+            self._valor(nombre, consulta, valor, "direccion", 0, 65535)
+        elif nombre == b"NETWORKID":
+            self._valor(nombre, consulta, valor, "red", 0, 16)
+        elif nombre == b"BAND":
+            self._valor(nombre, consulta, valor, "banda", 100000000, 1000000000)
+        elif nombre == b"MODE":
+            self._valor(nombre, consulta, valor, "modo", 0, 2)
+        elif nombre == b"PARAMETER":
+            if consulta:
+                self._responder(b"+PARAMETER=%d,%d,%d,%d" % self.parametro)
+                return
+            try:
+                sf, bw, cr, pre = (int(x) for x in valor.split(b","))
+            except ValueError:
+                self._error(ERR_PARAMETRO)
+                return
+            if not (7 <= sf <= 12 and 0 <= bw <= 9 and 1 <= cr <= 4 and 4 <= pre <= 24):
+                self._error(ERR_PARAMETRO)
+                return
+            self.parametro = (sf, bw, cr, pre)
+            self._responder(b"+OK")
+        else:
+            self._error(ERR_DESCONOCIDO)
+
+    def _valor(self, nombre, consulta, valor, atributo, minimo, maximo):
+        """AT+NOMBRE=valor / AT+NOMBRE? para un entero"""
+        if consulta:
+            self._responder(b"+%s=%d" % (nombre, getattr(self, atributo)))
+            return
+        try:
+            numero = int(valor)
+        except ValueError:
+            numero = -1
+        if not minimo <= numero <= maximo:
+            self._error(ERR_PARAMETRO)
+            return
+        setattr(self, atributo, numero)
+        self._responder(b"+OK")
+
+    def _enviar(self, valor):
+        """AT+SEND=<destino>,<largo>,<datos>: +OK al terminar de transmitir"""
+        partes = valor.split(b",", 2)
+        try:
+            destino, largo, datos = int(partes[0]), int(partes[1]), partes[2]
+        except (ValueError, IndexError):
+            self._error(ERR_PARAMETRO)
+            return
+        if largo > MAX_DATOS:
+            self._error(ERR_LARGO)
+            return
+        if largo != len(datos):
+            self._error(ERR_PARAMETRO)
+            return
+        if self.transmitiendo():
+            self._error(ERR_TX_OCUPADO)
+            return
+        aire = self.canal.transmitir(self, destino, datos)
+        self._tx_hasta = reloj.us + aire
+        self.enviados += 1
+        self._responder(b"+OK", aire + self.latencia_us)
+
+    # ---- Radio ----
+
+    def transmitiendo(self):
+        return reloj.us < self._tx_hasta
+
+    def escucha(self, origen, destino, inicio_us):
+        """¿Este módulo demodula el paquete? (red, parámetros, dirección, half-duplex)"""
+        if origen.red != self.red or origen.parametro != self.parametro:
+            return False
+        if destino not in (0, self.direccion):
+            return False
+        # Si transmitió mientras llegaba el paquete, no lo escuchó
+        return self._tx_hasta <= inicio_us
+
+    def recibir_radio(self, origen, datos, rssi, snr):
+        self.recibidos += 1
+        self._responder(b"+RCV=%d,%d,%s,%d,%d" % (origen, len(datos), datos, rssi, snr))
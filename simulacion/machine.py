@@ -0,0 +1,402 @@
+# ========================================
+# MÓDULO machine SIMULADO
+# ========================================
+#
+# Lo justo de la API de MicroPython (ESP32) que usa el proyecto: Pin, PWM,
+# UART, ADC, Timer, mem32 e idle, sobre el reloj virtual. El estado de
+# cada pin, UART y ADC vive en registros por número, así dos objetos del
+# mismo pin ven lo mismo y los periféricos simulados pueden manejarlos.
+
+from simulacion.reloj import reloj
+
+# Registros por número (los usa simulacion/perifericos.py). Cada placa
+# tiene los suyos: así un transmisor y un receptor pueden correr en el
+# mismo proceso sin compartir pines. Los objetos quedan ligados a la placa
+# activa al crearlos; mem32 escribe en la placa activa.
+placas = {}
+pines = pwms = uarts = senales_adc = dispositivos = None
+placa_actual = None
+
+def placa(nombre="principal"):
+    """Activar (y crear si hace falta) la placa donde se crea el hardware"""
+    global pines, pwms, uarts, senales_adc, dispositivos, placa_actual
+    if nombre not in placas:
+        # pines, pwms, uarts, señales ADC (pin -> cuentas o función(us)),
+        # periféricos a conectar a cada UART al crearla
+        placas[nombre] = ({}, {}, {}, {}, {})
+    pines, pwms, uarts, senales_adc, dispositivos = placas[nombre]
+    placa_actual = nombre
+
+def reiniciar():
+    """Olvidar todo el hardware simulado"""
+    placas.clear()
+    placa()
+
+placa()
+
+# ---- Pin ----
+
+class _EstadoPin:
+    def __init__(self, numero):
+        self.numero = numero
+        self.valor = 0
+        self.modo = Pin.IN
+        self.externo = None     # Nivel impuesto desde afuera (botón, señal)
+        self.irq = None         # (trigger, handler, pin)
+        self.cambios = 0
+        self.ultimo_cambio_us = 0
+
+    def nivel(self):
+        if self.modo == Pin.OUT:
+            return self.valor
+        return self.externo if self.externo is not None else self.valor
+
+    def escribir(self, valor):
+        valor = 1 if valor else 0
+        if valor != self.valor:
+            self.valor = valor
+            self.cambios += 1
+            self.ultimo_cambio_us = reloj.us
+
+    def poner(self, valor):
+        """Imponer un nivel desde afuera (dispara la interrupción si corresponde)"""
+        anterior = self.nivel()
+        self.externo = 1 if valor else 0
+        actual = self.nivel()
+        if actual == anterior:
+            return
+        self.cambios += 1
+        self.ultimo_cambio_us = reloj.us
+        if self.irq:
+            trigger, handler, pin = self.irq
+            if (actual == 0 and trigger & Pin.IRQ_FALLING) or (actual == 1 and trigger & Pin.IRQ_RISING):
+                handler(pin)
+
+def pin(numero):
+    """Estado simulado del pin (lo crea si hace falta)"""
+    estado = pines.get(numero)
+    if estado is None:
+        estado = pines[numero] = _EstadoPin(numero)
+    return estado
+
+class Pin:
+    IN = 1
+    OUT = 3
+    OPEN_DRAIN = 7
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_RISING = 1
+    IRQ_FALLING = 2
+
+    def __init__(self, id, mode=-1, pull=-1, value=None):
+        self.id = id
+        self._estado = pin(id)
+        self.init(mode, pull, value)
+
+    def init(self, mode=-1, pull=-1, value=None):
+        estado = self._estado
+        if mode != -1:
+            estado.modo = Pin.OUT if mode in (Pin.OUT, Pin.OPEN_DRAIN) else Pin.IN
+        if pull == Pin.PULL_UP and estado.externo is None:
+            estado.valor = 1
+        elif pull == Pin.PULL_DOWN and estado.externo is None:
+            estado.valor = 0
+        if value is not None:
+            estado.escribir(value)
+
+    def value(self, v=None):
+        if v is None:
+            return self._estado.nivel()
+        self._estado.escribir(v)
+
+    __call__ = value
+
+    def on(self):
+        self._estado.escribir(1)
+
+    def off(self):
+        self._estado.escribir(0)
+
+    def irq(self, handler=None, trigger=IRQ_FALLING | IRQ_RISING):
+        self._estado.irq = (trigger, handler, self) if handler else None
+
+    def __repr__(self):
+        return f"Pin({self.id})"
+
+# ---- Registros GPIO (machine.mem32) ----
+
+GPIO_OUT = 0x3FF44004
+GPIO_OUT_W1TS = 0x3FF44008
+GPIO_OUT_W1TC = 0x3FF4400C
+
+class _Memoria32:
+    """mem32 con los registros GPIO_OUT conectados a los pines simulados"""
+
+    def __init__(self):
+        self._otros = {}
+        self.escrituras = 0
+
+    def __getitem__(self, direccion):
+        if direccion == GPIO_OUT:
+            salida = 0
+            for numero, estado in pines.items():
+                if numero < 32 and estado.valor:
+                    salida |= 1 << numero
+            return salida
+        return self._otros.get(direccion, 0)
+
+    def __setitem__(self, direccion, valor):
+        self.escrituras += 1
+        if direccion in (GPIO_OUT_W1TS, GPIO_OUT_W1TC, GPIO_OUT):
+            nivel = 0 if direccion == GPIO_OUT_W1TC else 1
+            for numero in range(32):
+                if valor >> numero & 1:
+                    pin(numero).escribir(nivel)
+                elif direccion == GPIO_OUT and numero in pines:
+                    pines[numero].escribir(0)
+        else:
+            self._otros[direccion] = valor
+
+mem32 = _Memoria32()
+
+# ---- PWM ----
+
+class PWM:
+    def __init__(self, dest, freq=None, duty=None, duty_u16=None):
+        self.pin = dest.id if isinstance(dest, Pin) else dest
+        self._freq = 5000
+        self._duty = 512
+        self.cambios = 0
+        self.activo = True
+        pwms[self.pin] = self
+        if freq is not None:
+            self.freq(freq)
+        if duty is not None:
+            self.duty(duty)
+        if duty_u16 is not None:
+            self.duty_u16(duty_u16)
+
+    def init(self, freq=None, duty=None):
+        self.activo = True
+        if freq is not None:
+            self.freq(freq)
+        if duty is not None:
+            self.duty(duty)
+
+    def freq(self, valor=None):
+        if valor is None:
+            return self._freq
+        self._freq = valor
+
+    def duty(self, valor=None):
+        if valor is None:
+            return self._duty
+        if valor != self._duty:
+            self.cambios += 1
+        self._duty = max(0, min(1023, valor))
+
+    def duty_u16(self, valor=None):
+        if valor is None:
+            return self._duty * 65535 // 1023
+        self.duty(valor * 1023 // 65535)
+
+    def deinit(self):
+        self.activo = False
+        self._duty = 0
+
+# ---- UART ----
+
+class UART:
+    """
+    UART con un periférico opcional del otro lado
+
+    Lo que escribe el programa va a dispositivo.recibir(datos); el
+    periférico contesta con entregar(), que respeta el tiempo de los bytes
+    según el baudrate.
+    """
+
+    def __init__(self, id, baudrate=9600, bits=8, parity=None, stop=1, tx=None, rx=None, **kwargs):
+        self.id = id
+        self.baudrate = baudrate
+        self.tx = tx
+        self.rx = rx
+        self._rx = bytearray()
+        self._avisos = []       # Funciones a llamar cuando llegan datos
+        self.escritos = 0
+        self.dispositivo = None
+        uarts[id] = self
+        if id in dispositivos:
+            dispositivos[id].conectar(self)
+
+    def init(self, baudrate=None, **kwargs):
+        if baudrate:
+            self.baudrate = baudrate
+
+    def deinit(self):
+        pass
+
+    # Lado del programa
+    def any(self):
+        return len(self._rx)
+
+    def read(self, n=None):
+        if not self._rx:
+            return None
+        n = len(self._rx) if n is None else min(n, len(self._rx))
+        datos = bytes(self._rx[:n])
+        del self._rx[:n]
+        return datos
+
+    def readinto(self, buf, n=None):
+        if not self._rx:
+            return None
+        n = min(len(buf) if n is None else n, len(buf), len(self._rx))
+        buf[:n] = self._rx[:n]
+        del self._rx[:n]
+        return n
+
+    def readline(self):
+        i = self._rx.find(b"\n")
+        return self.read(i + 1 if i >= 0 else None)
+
+    def write(self, datos):
+        if isinstance(datos, str):
+            datos = datos.encode()
+        datos = bytes(datos)
+        self.escritos += len(datos)
+        if self.dispositivo is not None:
+            self.dispositivo.recibir(datos)
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    # Lado del periférico
+    def tiempo_us(self, n):
+        """Tiempo de n bytes en el cable (8N1: 10 bits por byte)"""
+        return n * 10 * 1000000 // self.baudrate
+
+    def entregar(self, datos, retardo_us=0, fragmento=0):
+        """
+        Hacer llegar datos al programa
+
+        Parámetros:
+        - retardo_us: Antes del primer byte
+        - fragmento: Bytes por entrega (0 = todo junto al final)
+        """
+        datos = bytes(datos)
+        if not fragmento:
+            fragmento = len(datos) or 1
+        t = retardo_us
+        for i in range(0, len(datos), fragmento):
+            parte = datos[i:i + fragmento]
+            t += self.tiempo_us(len(parte))
+            reloj.programar(t, self._llegada, parte)
+
+    def _llegada(self, datos):
+        self._rx += datos
+        for aviso in self._avisos:
+            aviso()
+
+    def avisar(self, funcion):
+        """Registrar funcion() para cuando lleguen bytes (lo usa asyncio simulado)"""
+        self._avisos.append(funcion)
+
+def conectar_uart(id, dispositivo):
+    """Conectar un periférico a la UART id (ya creada o por crear)"""
+    dispositivos[id] = dispositivo
+    if id in uarts:
+        dispositivo.conectar(uarts[id])
+
+# ---- ADC ----
+
+class ADC:
+    ATTN_0DB = 0
+    ATTN_2_5DB = 1
+    ATTN_6DB = 2
+    ATTN_11DB = 3
+    WIDTH_9BIT = 0
+    WIDTH_10BIT = 1
+    WIDTH_11BIT = 2
+    WIDTH_12BIT = 3
+
+    def __init__(self, dest, atten=None):
+        self.pin = dest.id if isinstance(dest, Pin) else dest
+        self.lecturas = 0
+
+    def atten(self, valor):
+        pass
+
+    def width(self, valor):
+        pass
+
+    def read(self):
+        self.lecturas += 1
+        senal = senales_adc.get(self.pin, 0)
+        valor = senal(reloj.us) if callable(senal) else senal
+        return max(0, min(4095, int(valor)))
+
+    def read_u16(self):
+        return self.read() << 4
+
+    def read_uv(self):
+        return self.read() * 3300000 // 4095
+
+# ---- Timer ----
+
+class Timer:
+    ONE_SHOT = 0
+    PERIODIC = 1
+
+    def __init__(self, id=-1, **kwargs):
+        self.id = id
+        self._evento = None
+        if kwargs:
+            self.init(**kwargs)
+
+    def init(self, mode=PERIODIC, period=-1, freq=-1, callback=None):
+        self.deinit()
+        self._modo = mode
+        self._periodo_us = int(1000000 // freq) if freq > 0 else period * 1000
+        self._callback = callback
+        self._evento = reloj.programar(self._periodo_us, self._disparar)
+
+    def _disparar(self):
+        if self._modo == Timer.PERIODIC:
+            self._evento = reloj.programar(self._periodo_us, self._disparar)
+        else:
+            self._evento = None
+        if self._callback:
+            self._callback(self)
+
+    def deinit(self):
+        reloj.cancelar(self._evento)
+        self._evento = None
+
+# ---- Sistema ----
+
+TICK_IDLE_US = 10000  # FreeRTOS a 100 Hz: idle vuelve como mucho en 10 ms
+
+def idle():
+    """Dormir hasta la próxima interrupción (evento) o el tick del sistema"""
+    proximo = reloj.proximo()
+    espera = TICK_IDLE_US if proximo is None else min(TICK_IDLE_US, proximo - reloj.us)
+    reloj.avanzar(espera)
+
+def lightsleep(ms=None):
+    reloj.avanzar((ms or 0) * 1000)
+
+def freq(hz=None):
+    return 240000000
+
+def unique_id():
+    return b"\x24\x0a\xc4\x00\x00\x01"
+
+def disable_irq():
+    return 0
+
+def enable_irq(estado=0):
+    pass
+
+def reset():
+    raise SystemExit("machine.reset()")
@@ -0,0 +1,99 @@
+# ========================================
+# PERIFÉRICOS SIMULADOS PROGRAMABLES
+# ========================================
+#
+# Cosas del mundo exterior que manejan los pines y las UART simuladas:
+# botones con rebote, señales para el ADC y un módulo AT que contesta
+# según una tabla.
+
+import random
+
+from simulacion.reloj import reloj
+from simulacion import machine
+
+class Boton:
+    """
+    Botón a GND con pull-up: presionar() programa la pulsación con rebotes
+    al apretar y al soltar
+
+    Queda conectado al pin de la placa activa al crearlo.
+    """
+
+    def __init__(self, numero, rebotes=3, rebote_us=300, semilla=None):
+        self.numero = numero
+        self._estado = machine.pin(numero)
+        self.rebotes = rebotes
+        self.rebote_us = rebote_us
+        self._azar = random.Random(semilla)
+        self.presiones = 0
+
+    def presionar(self, en_ms=0, duracion_ms=80):
+        """Programar una pulsación a en_ms desde ahora"""
+        inicio = en_ms * 1000
+        estado = self._estado
+        self._rebotar(inicio, 0)
+        self._rebotar(inicio + duracion_ms * 1000, 1)
+        self.presiones += 1
+
+    def _rebotar(self, t, nivel):
+        """Programar el cambio a nivel en t (µs) precedido de rebotes"""
+        estado = self._estado
+        for _ in range(self.rebotes):
+            reloj.programar(t, estado.poner, nivel)
+            t += self._azar.randint(self.rebote_us // 2, self.rebote_us)
+            reloj.programar(t, estado.poner, 1 - nivel)
+            t += self._azar.randint(self.rebote_us // 2, self.rebote_us)
+        reloj.programar(t, estado.poner, nivel)
+
+def senal_adc(numero, valor):
+    """Fijar lo que lee el ADC del pin: un entero o una función(us) -> cuentas"""
+    machine.senales_adc[numero] = valor
+
+def senal_ruidosa(centro, ruido, semilla=None):
+    """Señal constante con ruido uniforme de ±ruido cuentas"""
+    azar = random.Random(semilla)
+    return lambda us: centro + azar.randint(-ruido, ruido)
+
+class RespondedorAT:
+    """
+    Módulo AT mínimo: contesta cada línea según una tabla
+
+    respuestas es una lista de (prefijo, respuesta); la primera que
+    coincide gana. La respuesta puede ser una función(linea) -> bytes.
+    Por defecto todo es "+OK". latencia_us simula el tiempo de proceso del
+    módulo.
+    """
+
+    def __init__(self, respuestas=(), latencia_us=2000):
+        self.respuestas = list(respuestas) + [(b"", b"+OK")]
+        self.latencia_us = latencia_us
+        self.uart = None
+        self._linea = bytearray()
+        self.recibidas = []
+
+    def conectar(self, uart):
+        self.uart = uart
+        uart.dispositivo = self
+
+    def recibir(self, datos):
+        for byte in datos:
+            if byte == 10:
+                linea = bytes(self._linea).rstrip(b"\r")
+                self._linea = bytearray()
+                self._responder(linea)
+            else:
+                self._linea.append(byte)
+
+    def _responder(self, linea):
+        self.recibidas.append(linea)
+        for prefijo, respuesta in self.respuestas:
+            if linea.startswith(prefijo):
+                if callable(respuesta):
+                    respuesta = respuesta(linea)
+                if respuesta is not None:
+                    self.uart.entregar(respuesta + b"\r\n", self.latencia_us)
+                return
+
+    def inyectar(self, linea, en_us=0):
+        """Hacer llegar una línea no pedida (p. ej. un +RCV)"""
+        self.uart.entregar(linea + b"\r\n", en_us)
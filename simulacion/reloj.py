@@ -0,0 +1,69 @@
+# ========================================
+# RELOJ VIRTUAL
+# ========================================
+#
+# El tiempo de la simulación sólo avanza cuando el código duerme
+# (time.sleep_ms, asyncio.sleep_ms, machine.idle) o cuando el banco de
+# pruebas lo pide. Los eventos programados (timers, bytes que llegan por
+# la UART, pulsaciones) se disparan en orden al pasar su instante.
+
+import heapq
+
+class Reloj:
+    """Tiempo virtual en µs con una cola de eventos"""
+
+    def __init__(self):
+        self.us = 0
+        self._eventos = []
+        self._orden = 0     # Desempate para eventos del mismo instante
+        self.disparados = 0
+
+    def ms(self):
+        return self.us // 1000
+
+    def programar(self, retardo_us, accion, *args):
+        """
+        Ejecutar accion(*args) dentro de retardo_us
+
+        Retorna: el evento (lista mutable), para cancelar()
+        """
+        evento = [self.us + max(0, retardo_us), self._orden, accion, args]
+        self._orden += 1
+        heapq.heappush(self._eventos, evento)
+        return evento
+
+    def cancelar(self, evento):
+        if evento is not None:
+            evento[2] = None
+
+    def proximo(self):
+        """Instante (µs) del próximo evento pendiente, o None"""
+        eventos = self._eventos
+        while eventos and eventos[0][2] is None:
+            heapq.heappop(eventos)
+        return eventos[0][0] if eventos else None
+
+    def avanzar(self, us):
+        """Avanzar us microsegundos disparando los eventos que venzan"""
+        fin = self.us + max(0, us)
+        eventos = self._eventos
+        while eventos and eventos[0][0] <= fin:
+            instante, _, accion, args = heapq.heappop(eventos)
+            if accion is None:
+                continue
+            if instante > self.us:
+                self.us = instante
+            self.disparados += 1
+            accion(*args)
+        if fin > self.us:
+            self.us = fin
+
+    def avanzar_hasta(self, us):
+        self.avanzar(us - self.us)
+
+    def reiniciar(self):
+        """Descartar los eventos pendientes (el tiempo no retrocede)"""
+        self._eventos.clear()
+
+# Reloj único de la simulación
+reloj = Reloj()
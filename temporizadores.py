@@ -0,0 +1,166 @@
+# ========================================
+# RUEDA DE TEMPORIZADORES COMPARTIDA
+# ========================================
+#
+# Muchas acciones diferidas (fin de pulsos, apagados) sobre un solo
+# Timer o una sola tarea asyncio. Las ranuras son fijas: programar y
+# vencer no crean objetos.
+
+if __name__ == "__main__":
+    try:
+        import simulacion   # Host: machine y time simulados
+        simulacion.instalar()
+    except ImportError:
+        pass
+
+import asyncio
+from array import array
+from time import ticks_ms, ticks_diff, ticks_add
+
+class RuedaTemporizadores:
+    """
+    Acciones programadas a un tiempo, vencidas por tick()
+
+    tick() se llama desde un machine.Timer (iniciar_timer()) o desde una
+    tarea asyncio (tarea()); la precisión es la del período del tick.
+    Con el Timer, tick() interrumpe a programar()/cancelar(): el único
+    estado compartido es cada ranura de _acciones (una asignación atómica),
+    sin contadores que actualizar desde los dos lados.
+    """
+
+    def __init__(self, capacidad=16, reloj=ticks_ms):
+        """
+        Parámetros:
+        - capacidad: Acciones pendientes como máximo
+        - reloj: Función que da los ms actuales (para simular)
+        """
+        self.reloj = reloj
+        self._vence = array('L', [0] * capacidad)
+        self._acciones = [None] * capacidad
+
+        # Estadísticas
+        self.vencidas = 0
+        self.llenas = 0
+        self.retraso_max_ms = 0
+
+    def programar(self, retardo_ms, accion):
+        """
+        Ejecutar accion() dentro de retardo_ms
+
+        Retorna: id de la ranura (para cancelar), o -1 si no hay lugar
+        """
+        acciones = self._acciones
+        for i in range(len(acciones)):
+            if acciones[i] is None:
+                self._vence[i] = ticks_add(self.reloj(), retardo_ms)
+                acciones[i] = accion
+                return i
+        self.llenas += 1
+        return -1
+
+    def cancelar(self, ranura):
+        if ranura >= 0:
+            self._acciones[ranura] = None
+
+    def pendientes(self):
+        return sum(1 for accion in self._acciones if accion is not None)
+
+    def tick(self, _timer=None):
+        """Ejecutar las acciones vencidas; retorna cuántas se ejecutaron"""
+        ahora = self.reloj()
+        acciones = self._acciones
+        ejecutadas = 0
+        for i in range(len(acciones)):
+            accion = acciones[i]
+            if accion is None:
+                continue
+            retraso = ticks_diff(ahora, self._vence[i])
+            if retraso >= 0:
+                acciones[i] = None
+                if retraso > self.retraso_max_ms:
+                    self.retraso_max_ms = retraso
+                accion()
+                ejecutadas += 1
+        self.vencidas += ejecutadas
+        return ejecutadas
+
+    def iniciar_timer(self, periodo_ms=1, timer_id=1):
+        """Vencer las acciones desde un machine.Timer periódico"""
+        from machine import Timer
+        self._timer = Timer(timer_id)
+        self._timer.init(period=periodo_ms, mode=Timer.PERIODIC, callback=self.tick)
+        return self._timer
+
+    async def tarea(self, periodo_ms=5):
+        """Vencer las acciones desde asyncio"""
+        while True:
+            self.tick()
+            await asyncio.sleep_ms(periodo_ms)
+
+# Rueda compartida por los módulos que programan pulsos
+rueda = RuedaTemporizadores()
+
+# Prueba en el host con relés ReleInvertido sobre pines simulados:
+# python temporizadores.py
+if __name__ == "__main__":
+    import time
+    from reles import ReleInvertido
+
+    prueba = RuedaTemporizadores()
+    reles = [ReleInvertido(pin, prueba) for pin in (12, 13, 14, 15, 32)]
+    inicio = [None] * len(reles)
+    fin = [None] * len(reles)
+    t0 = ticks_ms()
+
+    def ahora():
+        return ticks_diff(ticks_ms(), t0)
+
+    def correr(hasta_ms):
+        """Tick de 1 ms (como iniciar_timer(1)) anotando cuándo cambia cada pin"""
+        while ahora() < hasta_ms:
+            time.sleep_ms(1)
+            prueba.tick()
+            for i, rele in enumerate(reles):
+                if fin[i] is None and inicio[i] is not None and rele.pin.value():
+                    fin[i] = ahora()
+
+    def niveles():
+        return [rele.pin.value() for rele in reles]
+
+    # Antes: todos desactivados (pin HIGH)
+    assert niveles() == [1] * 5, niveles()
+
+    # Tres pulsos de 2 s lanzados casi juntos deben terminar en paralelo
+    for i in range(3):
+        correr(i * 10)
+        reles[i].pulso(2)
+        inicio[i] = ahora()
+        assert reles[i].pin.value() == 0 and reles[i].en_pulso()
+
+    # Cancelaciones: desactivar() suelta ya; cancelar_pulso() deja el relé activado
+    reles[3].pulso(2)
+    reles[4].pulso(2)
+    correr(500)
+    assert niveles() == [0] * 5, niveles()
+    reles[3].desactivar()
+    reles[4].cancelar_pulso()
+    assert niveles() == [0, 0, 0, 1, 0], niveles()
+
+    # Durante: los tres siguen activados
+    correr(1000)
+    assert niveles() == [0, 0, 0, 1, 0], niveles()
+
+    # Después: los pulsos vencieron y las ranuras canceladas no hicieron nada
+    correr(3000)
+    assert niveles() == [1, 1, 1, 1, 0], niveles()
+    assert prueba.pendientes() == 0 and not any(r.en_pulso() for r in reles)
+
+    for i in range(3):
+        duracion = fin[i] - inicio[i]
+        print(f"   relé {i + 1} ({reles[i].pin}): {inicio[i]} → {fin[i]} ms ({duracion} ms)")
+        assert abs(duracion - 2000) <= 1, duracion
+    total = max(fin[:3]) - min(inicio[:3])
+    assert total <= 2021, total
+    print(f"✅ 3 pulsos de 2000 ms en {total} ms (secuencial: 6000 ms), "
+          f"retraso máx {prueba.retraso_max_ms} ms")
+    print("✅ Cancelación: desactivar() suelta el relé, cancelar_pulso() lo deja activado")
@@ -3,47 +3,97 @@
 # ========================================
 
 from machine import UART, Pin
-from time import sleep
+from array import array
+from time import sleep, ticks_ms, ticks_diff
+import asyncio
+import protocolo
+from metricas import Latencias
+from lora_at import ParserAT
+from botones import BancoBotones
+from acuses import Acuses
+from calidad_enlace import MonitorEnlace, PERFIL_ROBUSTO, COMANDOS, NOMBRES, KEEPALIVE_MS, rto_inicial_ms, con_signo
+from protocolo import CMD_DERECHA, CMD_ADELANTE, CMD_IZQUIERDA, CMD_ATRAS, CMD_POWER, CMD_ACK, CMD_PERFIL
 
 # ⚡ CONFIGURACIÓN CORRECTA (CORREGIDA)
 RXD2 = 17  # CORREGIDO: era 16
 TXD2 = 16  # CORREGIDO: era 17
 uart2 = UART(2, baudrate=115200, bits=8, parity=None, stop=1, rx=Pin(RXD2), tx=Pin(TXD2))
 
+# Perfil de radio (SF/BW) según la calidad del enlace: ver calidad_enlace.py
+adaptativo = True
+perfil = PERFIL_ROBUSTO
+monitor = MonitorEnlace()
+perfil_buf = bytearray(1)   # Payload de CMD_PERFIL
+
+# Acuses de recibo del receptor (secuencia, retransmisión y RTO)
+acuses = Acuses(rto_inicial_ms=rto_inicial_ms(PERFIL_ROBUSTO))
+
+# Buffer para decodificar tramas recibidas (se reutiliza)
+trama_rx = bytearray(protocolo.TAM_TRAMA)
+
+def recibir_linea(linea, largo):
+    """Líneas +RCV: sólo interesan los acuses del receptor"""
+    largo_payload = protocolo.buscar_rcv(linea, trama_rx, largo)
+    if largo_payload < 0 or trama_rx[protocolo.POS_CMD] != CMD_ACK:
+        return
+    if acuses.confirmar(trama_rx[protocolo.POS_SEQ]):
+        # Calidad del acuse (receptor → transmisor) y, en su payload, la de
+        # la trama acusada (transmisor → receptor)
+        monitor.registrar_linea(linea, largo, perfil)
+        if largo_payload == 2:
+            i = protocolo.POS_PAYLOAD
+            monitor.registrar(con_signo(trama_rx[i]), con_signo(trama_rx[i + 1]), perfil)
+
+# Parser AT incremental (respuestas completas por línea y acuses)
+parser_at = ParserAT(uart2, al_recibir=recibir_linea)
+
 # LED de estado para mostrar éxito/error
 led_status = Pin(2, Pin.OUT)
 led_tx = Pin(4, Pin.OUT)
 
-# Estadísticas
+# Estadísticas de comandos AT (+OK del módulo local, no del receptor)
 envios_exitosos = 0
 envios_fallidos = 0
 
+# Buffer del comando AT+SEND
+tx_buf = bytearray(64)
+tx_mv = memoryview(tx_buf)
+
 # Función que SÍ verifica si se envió
 def send_cmd(cmd):
-    global envios_exitosos, envios_fallidos
+    if isinstance(cmd, str):
+        print(f"-> {cmd}")
     
-    print(f"-> {cmd}")
+    # Enviar comando y esperar la respuesta completa (sin pausa fija)
+    resultado = parser_at.comando(cmd, timeout_ms=1500)
     
-    # Limpiar buffer antes de enviar
-    while uart2.any():
-        uart2.read()
+    if registrar_resultado(resultado):
+        led_status.on()
+        sleep(0.1)
+        led_status.off()
+        return True
     
-    # Enviar comando
-    uart2.write(cmd + '\r\n')
-    sleep(1.5)  # Esperar respuesta
+    if resultado is None:
+        # Parpadeo de error
+        for _ in range(3):
+            led_status.on()
+            sleep(0.1)
+            led_status.off()
+            sleep(0.1)
+    return False
+
+def registrar_resultado(resultado):
+    """Mostrar y contar la respuesta de un comando; True si fue +OK"""
+    global envios_exitosos, envios_fallidos
     
     # Verificar respuesta
-    if uart2.any():
-        response = uart2.read()
+    if resultado is not None:
         try:
-            decoded = response.decode('utf-8')
-            print(f"✓ Respuesta: {decoded.strip()}")
+            decoded = parser_at.respuesta()
+            print(f"✓ Respuesta: {decoded}")
             
-            if "+OK" in decoded:
+            if resultado:
                 print("✅ COMANDO EXITOSO")
-                led_status.on()
-                sleep(0.1)
-                led_status.off()
                 envios_exitosos += 1
                 return True
             else:
@@ -53,17 +103,11 @@ def send_cmd(cmd):
                 
         except Exception as e:
             print(f"❌ Error decodificando: {e}")
-            print(f"RAW: {response}")
+            print(f"RAW: {parser_at.respuesta_raw()}")
             envios_fallidos += 1
             return False
     else:
         print("❌ SIN RESPUESTA - Módulo no conectado")
-        # Parpadeo de error
-        for _ in range(3):
-            led_status.on()
-            sleep(0.1)
-            led_status.off()
-            sleep(0.1)
         envios_fallidos += 1
         return False
 
@@ -87,6 +131,7 @@ def setup_lora():
     success = True
     success &= send_cmd("AT+ADDRESS=1")      # Transmisor
     success &= send_cmd("AT+NETWORKID=5")    # Red
+    success &= send_cmd(COMANDOS[PERFIL_ROBUSTO])  # Se arranca en el perfil robusto
     
     # Verificar configuración aplicada
     print("\n📋 Verificando configuración...")
@@ -108,133 +153,292 @@ def setup_lora():
         return False
 
 # Enviar código CON VERIFICACIÓN
+def armar_codigo(codigo, seq, payload=b""):
+    """Armar AT+SEND con la trama del código; retorna la vista del comando"""
+    # Trama binaria con número de secuencia (ver protocolo.py)
+    n = protocolo.armar_send(tx_buf, 2, seq, codigo, payload)
+    return tx_mv[:n]
+
 def send_code(codigo):
-    global envios_exitosos, envios_fallidos
-    
-    codigo = str(codigo)
-    cmd = f"AT+SEND=2,{len(codigo)},{codigo}"
-    
+    """Enviar un código y esperar el acuse del receptor (con reintentos)"""
     print(f"\n📤 Enviando código: {codigo}")
     
     # Indicador visual de transmisión
     led_tx.on()
     
-    success = send_cmd(cmd)
+    # Las retransmisiones repiten el número de secuencia
+    seq = acuses.nueva()
+    success = False
+    for intento in range(acuses.intentos):
+        if not send_cmd(armar_codigo(codigo, seq)):
+            continue
+        if acuses.esperar_bloqueante(parser_at):
+            acuses.entregada(intento)
+            success = True
+            break
+        print(f"🔁 Sin acuse de seq {seq} (RTO {acuses.rto_ms} ms)")
+        acuses.retroceder()
+    else:
+        acuses.sin_acuse += 1
     
     led_tx.off()
     
     if success:
-        print(f"🎯 Código {codigo} enviado AL RECEPTOR")
+        print(f"🎯 Código {codigo} confirmado POR EL RECEPTOR")
         return True
     else:
-        print(f"💥 ERROR enviando código {codigo}")
+        print(f"💥 ERROR: código {codigo} sin acuse")
         return False
 
-# ========================================
-# PROGRAMA PRINCIPAL MEJORADO
-# ========================================
+async def enviar_confiable(codigo, payload=b""):
+    """Enviar una trama y esperar su acuse (con reintentos); True si llegó"""
+    seq = acuses.nueva()
+    inicio = ticks_ms()
+    for intento in range(acuses.intentos):
+        resultado = await parser_at.comando_async(armar_codigo(codigo, seq, payload), timeout_ms=1500)
+        if not registrar_resultado(resultado):
+            continue
+        if await acuses.esperar(parser_at):
+            acuses.entregada(intento)
+            monitor.registrar_intento(True)
+            # Latencia del comando (envío → acuse) en el perfil actual
+            monitor.latencias[perfil].registrar(ticks_diff(ticks_ms(), inicio))
+            return True
+        monitor.registrar_intento(False)
+        print(f"🔁 Sin acuse de seq {seq} (RTO {acuses.rto_ms} ms)")
+        acuses.retroceder()
+    acuses.sin_acuse += 1
+    return False
 
-print("🚀 === CONTROL REMOTO LORA VERIFICADO ===")
-print(f"📡 Configuración: RX=Pin{RXD2}, TX=Pin{TXD2}")
-
-# Inicializar LEDs
-led_status.off()
-led_tx.off()
-
-# Configurar LoRa con verificación
-if not setup_lora():
-    print("💥 FALLO CRÍTICO: No se pudo configurar LoRa")
-    print("🛑 Programa detenido")
-    exit()
-
-# Pines de botones
-n1 = Pin(14, Pin.IN, Pin.PULL_UP)  # derecha
-n3 = Pin(19, Pin.IN, Pin.PULL_UP)  # atras
-n4 = Pin(21, Pin.IN, Pin.PULL_UP)  # izquierda
-n5 = Pin(22, Pin.IN, Pin.PULL_UP)  # adelante
-n6 = Pin(23, Pin.IN, Pin.PULL_UP)  # encender/apagar
-
-# Estados anteriores
-last_n1 = last_n3 = last_n4 = last_n5 = last_n6 = 1
-
-print("\n🎮 BOTONES CONFIGURADOS:")
-print("Pin 14 = 🡢 DERECHA   (código 1)")
-print("Pin 19 = 🡣 ABAJO     (código 2)")
-print("Pin 21 = 🡠 IZQUIERDA (código 3)")
-print("Pin 22 = 🡡 ARRIBA    (código 4)")
-print("Pin 23 = ⚡ POWER     (código 5)")
-print("\n💡 INDICADORES:")
-print("Pin 2 = LED STATUS (parpadea al enviar)")
-print("Pin 4 = LED TX (encendido durante transmisión)")
-print("=====================================")
+async def aplicar_perfil(nuevo):
+    """Pasar el módulo local a otro perfil (sin avisar al receptor)"""
+    global perfil
+    if await parser_at.comando_async(COMANDOS[nuevo], timeout_ms=1500) is not True:
+        print(f"❌ El módulo no aceptó {NOMBRES[nuevo]}")
+        return False
+    perfil = nuevo
+    # El RTT medido era de otro tiempo en el aire
+    acuses.reiniciar(rto_inicial_ms(nuevo))
+    monitor.reiniciar()
+    monitor.cambios += 1
+    print(f"📶 Perfil {NOMBRES[nuevo]}")
+    return True
 
-button_count = 0
+async def cambiar_perfil(nuevo):
+    """
+    Cambio coordinado: aviso con el perfil actual, cambio local y
+    confirmación con el nuevo. Si la confirmación no llega se vuelve al
+    anterior (el receptor también vuelve solo).
+    """
+    anterior = perfil
+    print(f"📶 Cambio de perfil: {NOMBRES[anterior]} → {NOMBRES[nuevo]}")
+    perfil_buf[0] = nuevo
+    # Un aviso sin acuse no dice nada: pudo perderse el acuse y el receptor
+    # ya estar en el perfil nuevo. La confirmación lo aclara en los dos casos
+    await enviar_confiable(CMD_PERFIL, perfil_buf)
+    if not await aplicar_perfil(nuevo):
+        return False
+    if await enviar_confiable(CMD_PERFIL, perfil_buf):
+        return True
+    print("↩️ Sin confirmación del nuevo perfil, se vuelve al anterior")
+    await aplicar_perfil(anterior)
+    return False
 
-try:
-    while True:
-        # Leer botones
-        c1, c3, c4, c5, c6 = n1.value(), n3.value(), n4.value(), n5.value(), n6.value()
-        
-        # Detectar presiones (flanco descendente)
-        if last_n1 == 1 and c1 == 0:
-            button_count += 1
-            print(f"\n🎮 BOTÓN #{button_count}: 🡢 DERECHA")
-            send_code("1")
-        
-        if last_n3 == 1 and c3 == 0:
-            button_count += 1
-            print(f"\n🎮 BOTÓN #{button_count}: 🡣 ABAJO")
-            send_code("2")
-        
-        if last_n4 == 1 and c4 == 0:
-            button_count += 1
-            print(f"\n🎮 BOTÓN #{button_count}: 🡠 IZQUIERDA")
-            send_code("3")
-        
-        if last_n5 == 1 and c5 == 0:
-            button_count += 1
-            print(f"\n🎮 BOTÓN #{button_count}: 🡡 ARRIBA")
-            send_code("4")
+async def send_code_async(codigo):
+    """Enviar un código y esperar su acuse, cediendo el control mientras tanto"""
+    print(f"\n📤 Enviando código: {codigo}")
+    led_tx.on()
+    
+    success = await enviar_confiable(codigo)
+    if adaptativo:
+        if not success and perfil != PERFIL_ROBUSTO:
+            # Enlace caído en un perfil rápido: el receptor también vuelve
+            # al robusto cuando deja de oír tramas
+            print("📶 Sin acuse: se vuelve al perfil robusto")
+            if await aplicar_perfil(PERFIL_ROBUSTO):
+                success = await enviar_confiable(codigo)
+        elif success:
+            nuevo = monitor.evaluar(perfil)
+            if nuevo != perfil:
+                await cambiar_perfil(nuevo)
+    
+    led_tx.off()
+    led_status.value(1 if success else 0)  # Último envío confirmado
+    return success
+
+async def mantener_perfil():
+    """Sin tráfico fuera del perfil robusto: repetir CMD_PERFIL (keepalive)"""
+    perfil_buf[0] = perfil
+    if not await enviar_confiable(CMD_PERFIL, perfil_buf) and perfil != PERFIL_ROBUSTO:
+        print("📶 Keepalive sin acuse: se vuelve al perfil robusto")
+        await aplicar_perfil(PERFIL_ROBUSTO)
+
+class ColaEnvio:
+    """
+    Cola de transmisión asíncrona
+    
+    Los botones encolan al instante y una sola tarea vacía la cola con un
+    comando en vuelo como máximo, esperando el +OK de cada uno. Un comando
+    de motor igual al último que sigue en cola se fusiona con él; POWER
+    nunca se fusiona porque cada pulsación alterna el sistema.
+    """
+    
+    def __init__(self, capacidad=8):
+        self._codigos = bytearray(capacidad)
+        self._marcas = array('L', [0] * capacidad)
+        self._inicio = 0
+        self.profundidad = 0
+        self.en_vuelo = 0
+        self._hay_datos = asyncio.Event()
         
-        if last_n6 == 1 and c6 == 0:
-            button_count += 1
-            print(f"\n🎮 BOTÓN #{button_count}: ⚡ POWER")
-            send_code("5")
+        # Estadísticas
+        self.encolados = 0
+        self.fusionados = 0
+        self.descartados = 0
+        self.latencias = Latencias()  # ms desde la pulsación hasta el acuse
+    
+    def encolar(self, codigo):
+        """Encolar un código; retorna False si la cola estaba llena"""
+        capacidad = len(self._codigos)
+        if self.profundidad:
+            ultimo = (self._inicio + self.profundidad - 1) % capacidad
+            if codigo != CMD_POWER and self._codigos[ultimo] == codigo:
+                self.fusionados += 1
+                return True
+        if self.profundidad == capacidad:
+            self.descartados += 1
+            return False
         
-        # Actualizar estados
-        last_n1, last_n3, last_n4, last_n5, last_n6 = c1, c3, c4, c5, c6
+        i = (self._inicio + self.profundidad) % capacidad
+        self._codigos[i] = codigo
+        self._marcas[i] = ticks_ms()
+        self.profundidad += 1
+        self.encolados += 1
+        self._hay_datos.set()
+        return True
+    
+    async def tarea_envio(self):
+        """Única tarea que transmite: un comando en vuelo a la vez"""
+        while True:
+            if not self.profundidad:
+                self._hay_datos.clear()
+                if not adaptativo or perfil == PERFIL_ROBUSTO:
+                    await self._hay_datos.wait()
+                    continue
+                try:
+                    await asyncio.wait_for_ms(self._hay_datos.wait(), KEEPALIVE_MS)
+                except asyncio.TimeoutError:
+                    self.en_vuelo = 1
+                    await mantener_perfil()
+                    self.en_vuelo = 0
+                continue
+            
+            codigo = self._codigos[self._inicio]
+            marca = self._marcas[self._inicio]
+            self._inicio = (self._inicio + 1) % len(self._codigos)
+            self.profundidad -= 1
+            
+            self.en_vuelo = 1
+            if await send_code_async(codigo):
+                self.latencias.registrar(ticks_diff(ticks_ms(), marca))
+            self.en_vuelo = 0
+    
+    def mostrar_estadisticas(self):
+        """Profundidad, descartes y latencia pulsación → acuse"""
+        p50, p90, p99 = self.latencias.percentiles()
+        print(f"   Cola: {self.profundidad} (en vuelo: {self.en_vuelo})")
+        print(f"   Encolados: {self.encolados} | Fusionados: {self.fusionados} | Descartados: {self.descartados}")
+        print(f"   Latencia pulsación→acuse: p50={p50} ms p90={p90} ms p99={p99} ms máx={self.latencias.maximo} ms")
+
+# Botones: (pin, código, nombre) - con interrupción y antirrebote
+BOTONES = (
+    (14, CMD_DERECHA, "🡢 DERECHA"),
+    (19, CMD_ADELANTE, "🡣 ABAJO"),
+    (21, CMD_IZQUIERDA, "🡠 IZQUIERDA"),
+    (22, CMD_ATRAS, "🡡 ARRIBA"),
+    (23, CMD_POWER, "⚡ POWER"),
+)
+banco = BancoBotones([b[0] for b in BOTONES])
+
+button_count = 0
+cola = ColaEnvio()
+
+def mostrar_estadisticas(titulo):
+    """Estadísticas de punta a punta (acuses); retorna la tasa de entrega"""
+    tasa = acuses.tasa()
+    print(f"\n📊 {titulo}:")
+    print(f"   Botones presionados: {button_count}")
+    acuses.mostrar()
+    print(f"   Comandos AT: {envios_exitosos} con +OK, {envios_fallidos} fallidos (módulo local)")
+    cola.mostrar_estadisticas()
+    monitor.reporte(perfil)
+    p50, p90, p99 = banco.latencias.percentiles()
+    print(f"   Botones: rebotes={banco.rebotes} perdidos={banco.perdidos} latencia p50={p50} µs p99={p99} µs")
+    return tasa
+
+async def tarea_botones():
+    """Esperar pulsaciones (interrupciones) y encolar; nunca espera a la radio"""
+    global button_count
+    
+    while True:
+        i = await banco.esperar()
+        pin, codigo, nombre = BOTONES[i]
+        button_count += 1
+        print(f"\n🎮 BOTÓN #{button_count}: {nombre}")
+        cola.encolar(codigo)
         
         # Mostrar estadísticas cada 10 botones
-        if button_count > 0 and button_count % 10 == 0:
-            total = envios_exitosos + envios_fallidos
-            tasa = (envios_exitosos / total * 100) if total > 0 else 0
-            print(f"\n📊 ESTADÍSTICAS:")
-            print(f"   Botones presionados: {button_count}")
-            print(f"   Envíos exitosos: {envios_exitosos}")
-            print(f"   Envíos fallidos: {envios_fallidos}")
-            print(f"   Tasa de éxito: {tasa:.1f}%")
-        
-        sleep(0.05)  # Anti-rebote
+        if button_count % 10 == 0:
+            mostrar_estadisticas("ESTADÍSTICAS")
 
-except KeyboardInterrupt:
-    print(f"\n🛑 Control remoto detenido")
-    total = envios_exitosos + envios_fallidos
-    tasa = (envios_exitosos / total * 100) if total > 0 else 0
-    
-    print(f"\n📊 ESTADÍSTICAS FINALES:")
-    print(f"   Botones presionados: {button_count}")
-    print(f"   Envíos exitosos: {envios_exitosos}")
-    print(f"   Envíos fallidos: {envios_fallidos}")
-    print(f"   Tasa de éxito: {tasa:.1f}%")
+async def main():
+    asyncio.create_task(cola.tarea_envio())
+    await tarea_botones()
+
+# ========================================
+# PROGRAMA PRINCIPAL MEJORADO
+# ========================================
+
+if __name__ == "__main__":
+    print("🚀 === CONTROL REMOTO LORA VERIFICADO ===")
+    print(f"📡 Configuración: RX=Pin{RXD2}, TX=Pin{TXD2}")
+
+    # Inicializar LEDs
+    led_status.off()
+    led_tx.off()
+
+    # Configurar LoRa con verificación
+    if not setup_lora():
+        print("💥 FALLO CRÍTICO: No se pudo configurar LoRa")
+        print("🛑 Programa detenido")
+        exit()
+
+    print("\n🎮 BOTONES CONFIGURADOS:")
+    print("Pin 14 = 🡢 DERECHA   (código 1)")
+    print("Pin 19 = 🡣 ABAJO     (código 2)")
+    print("Pin 21 = 🡠 IZQUIERDA (código 3)")
+    print("Pin 22 = 🡡 ARRIBA    (código 4)")
+    print("Pin 23 = ⚡ POWER     (código 5)")
+    print("\n💡 INDICADORES:")
+    print("Pin 2 = LED STATUS (parpadea al enviar)")
+    print("Pin 4 = LED TX (encendido durante transmisión)")
+    print("=====================================")
+
+    try:
+        asyncio.run(main())
+
+    except KeyboardInterrupt:
+        print(f"\n🛑 Control remoto detenido")
+        tasa = mostrar_estadisticas("ESTADÍSTICAS FINALES")
     
-    if tasa < 80:
-        print("⚠️  BAJA TASA DE ÉXITO:")
-        print("   - Verifica alimentación del módulo")
-        print("   - Acerca módulos para pruebas")
-        print("   - Revisa configuración del receptor")
+        if tasa < 80:
+            print("⚠️  BAJA TASA DE ÉXITO:")
+            print("   - Verifica alimentación del módulo")
+            print("   - Acerca módulos para pruebas")
+            print("   - Revisa configuración del receptor (¿envía acuses?)")
 
-# Limpiar LEDs al salir
-led_status.off()
-led_tx.off()
+    # Limpiar LEDs al salir
+    led_status.off()
+    led_tx.off()
 
-print("✅ Programa terminado")
\ No newline at end of file
+    print("✅ Programa terminado")
\ No newline at end of file